@@ -1,8 +1,24 @@
+import os
+
 from setuptools import setup, find_packages
 
+# Optional: XVIOLET_MYPYC=1 pip install -e . compiles the LLM fallback dispatch and the vector store's
+# per-document preparation loop with mypyc (requires `pip install mypy`). base_llm stays pure Python so
+# providers can still be subclassed.
+ext_modules = []
+if os.environ.get('XVIOLET_MYPYC') == '1':
+    from mypyc.build import mypycify
+    # Optional dependencies (opentelemetry, provider SDKs) are imported lazily and may not be installed.
+    ext_modules = mypycify([
+        '--ignore-missing-imports',
+        'xviolet/llm/fallback_manager.py',
+        'xviolet/vector/_docprep.py',
+    ])
+
 setup(
     name='xviolet',
     version='0.1.0',
     packages=find_packages(include=['xviolet', 'xviolet.*']),
+    ext_modules=ext_modules,
     # Dependencies already in requirements.txt
 )
@@ -118,3 +118,31 @@ def test_agent_text_vs_media(monkeypatch, tmp_path, prob_text, expected_post, ex
         assert len(dummy_llm.analyze_calls) == expected_media
     else:
         assert len(dummy_llm.generate_calls) == expected_post
+
+
+class ClosableLLM(DummyLLM):
+    def __init__(self):
+        super().__init__()
+        self.closed = 0
+    async def aclose(self):
+        self.closed += 1
+
+def test_agent_run_closes_llm_when_loop_raises(monkeypatch):
+    config.enable_action_processing = True
+    config.enable_twitter_post_generation = False
+    config.action_interval = 0
+    agent = Agent()
+    async def failing_run_once():
+        raise RuntimeError("boom")
+    agent.run_once = failing_run_once
+    agent.llm = ClosableLLM()
+    monkeypatch.setattr(time, 'sleep', lambda x: None)
+
+    with pytest.raises(RuntimeError):
+        agent.run(max_cycles=3)
+    assert agent.llm.closed == 1
+
+    # A normal max_cycles exit closes it exactly once as well
+    config.enable_action_processing = False
+    agent.run(max_cycles=2)
+    assert agent.llm.closed == 2
@@ -0,0 +1,264 @@
+import types
+
+import pytest
+
+import xviolet.llm.gemini_provider as gemini_provider
+from xviolet.llm.gemini_provider import GeminiLLMProvider
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+        self.candidates = []
+        self.prompt_feedback = None
+
+
+class FakeModel:
+    def __init__(self, name, cached_content=None):
+        self.name = name
+        self.cached_content = cached_content
+        self.calls = []
+        self.configs = []
+
+    async def generate_content_async(self, contents, generation_config=None, stream=False):
+        self.calls.append(contents)
+        self.configs.append(generation_config)
+        return FakeResponse(f"reply from {self.name}")
+
+
+class FakePersona:
+    def get_full_context_for_llm(self, context_type="chat"):
+        return f"PERSONA[{context_type}]"
+
+
+@pytest.fixture
+def fake_genai(monkeypatch):
+    created = []
+
+    def create(model, system_instruction, ttl):
+        created.append((model, system_instruction))
+        return types.SimpleNamespace(model=model, system_instruction=system_instruction)
+
+    genai = types.SimpleNamespace(
+        configure=lambda api_key: None,
+        GenerativeModel=FakeModel,
+        caching=types.SimpleNamespace(CachedContent=types.SimpleNamespace(create=create)),
+    )
+    genai.GenerativeModel.from_cached_content = staticmethod(
+        lambda cached_content: FakeModel(f"cached:{cached_content.model}", cached_content))
+    genai_types = types.SimpleNamespace(GenerationConfig=lambda **params: params)
+    monkeypatch.setattr(gemini_provider, "genai", genai)
+    monkeypatch.setattr(gemini_provider, "genai_types", genai_types)
+    return created
+
+
+@pytest.mark.asyncio
+async def test_persona_context_is_cached_once_and_prompt_sent_bare(fake_genai):
+    provider = GeminiLLMProvider({'api_key': 'k', 'text_model_name': 'm', 'persona_object': FakePersona(),
+                                  'response_cache': False})
+    assert await provider.generate_text("hello", context_type="post") == "reply from cached:m"
+    assert await provider.generate_text("again", context_type="post") == "reply from cached:m"
+    assert fake_genai == [('m', 'PERSONA[post]')]
+    cached_model = provider._cached_models[('m', id(provider.persona), 'post')][1]
+    assert cached_model.calls == [["hello"], ["again"]]
+    assert provider.text_model.calls == []
+
+
+@pytest.mark.asyncio
+async def test_context_cache_failure_falls_back_to_inline_persona(fake_genai, monkeypatch):
+    def refuse(**kwargs):
+        raise ValueError("content too small to cache")
+
+    monkeypatch.setattr(gemini_provider.genai.caching.CachedContent, "create", refuse)
+    provider = GeminiLLMProvider({'api_key': 'k', 'text_model_name': 'm', 'persona_object': FakePersona(),
+                                  'response_cache': False})
+    assert await provider.generate_text("hello", context_type="chat") == "reply from m"
+    assert provider.text_model.calls[0] == ["PERSONA[chat]", gemini_provider._PERSONA_SEP, "hello"]
+
+
+@pytest.mark.asyncio
+async def test_run_batch_polls_until_done_and_keeps_order(fake_genai, monkeypatch):
+    submitted = {}
+    states = iter(["JOB_STATE_PENDING", "JOB_STATE_RUNNING", "JOB_STATE_SUCCEEDED"])
+
+    class FakeBatches:
+        def create(self, model, src, config):
+            submitted.update(model=model, src=src)
+            return types.SimpleNamespace(name="batches/1")
+
+        def get(self, name):
+            item = lambda text: types.SimpleNamespace(response=FakeResponse(text) if text else None, error="bad")
+            return types.SimpleNamespace(
+                state=types.SimpleNamespace(name=next(states)),
+                dest=types.SimpleNamespace(inlined_responses=[item(" one "), item(None)]))
+
+    monkeypatch.setattr(gemini_provider.genai, "Client", lambda api_key: types.SimpleNamespace(batches=FakeBatches()),
+                        raising=False)
+    provider = GeminiLLMProvider({'api_key': 'k', 'text_model_name': 'm', 'persona_object': FakePersona()})
+    assert await provider.run_batch(["a", "b"], context_type="post", poll_interval=0) == ["one", None]
+    assert submitted['model'] == 'm'
+    assert submitted['src'][0]['config']['system_instruction'] == 'PERSONA[post]'
+    assert submitted['src'][1]['contents'][0]['parts'][0]['text'] == 'b'
+
+
+@pytest.mark.asyncio
+async def test_semantic_cache_serves_near_duplicate_prompts(fake_genai, monkeypatch):
+    from xviolet.llm.cache import LLMCache
+
+    vectors = {"what's up?": [1.0, 0.0], "whats up": [0.98, 0.02], "tell me a joke": [0.0, 1.0]}
+    monkeypatch.setattr(gemini_provider.genai, "embed_content",
+                        lambda model, content: {"embedding": vectors[content]}, raising=False)
+    provider = GeminiLLMProvider({'api_key': 'k', 'text_model_name': 'm', 'semantic_cache': True})
+    provider.response_cache = LLMCache()
+    options = {'generation_config': {'temperature': 0}}
+    assert await provider.generate_text("what's up?", **options) == "reply from m"
+    assert await provider.generate_text("whats up", **options) == "reply from m"
+    assert await provider.generate_text("tell me a joke", **options) == "reply from m"
+    assert provider.text_model.calls == [["what's up?"], ["tell me a joke"]]
+
+
+@pytest.mark.asyncio
+async def test_json_mode_requests_native_json_output(fake_genai):
+    provider = GeminiLLMProvider({'api_key': 'k', 'text_model_name': 'm', 'response_cache': False})
+    schema = {'type': 'object', 'properties': {'action': {'type': 'string'}}}
+    await provider.generate_text("pick", json_mode=True)
+    await provider.generate_text("pick", response_schema=schema)
+    await provider.generate_text("chat")
+    json_config, schema_config, plain_config = provider.text_model.configs
+    assert json_config['response_mime_type'] == 'application/json' and 'response_schema' not in json_config
+    assert schema_config['response_schema'] is schema
+    assert 'response_mime_type' not in plain_config
+
+
+def test_persona_prefix_is_reused_until_the_persona_changes(fake_genai):
+    calls = []
+
+    def make_persona(label):
+        persona = FakePersona()
+        persona.get_full_context_for_llm = lambda context_type="chat": calls.append(context_type) or label
+        return persona
+
+    provider = GeminiLLMProvider({'api_key': 'k', 'text_model_name': 'm', 'persona_object': make_persona("p1")})
+    assert provider._persona_parts("a", "post")[0] == "p1"
+    assert provider._persona_parts("b", "post")[::2] == ["p1", "b"] and calls == ["post"]
+    provider.persona = make_persona("p2")
+    assert provider._persona_parts("c", "post")[0] == "p2" and calls == ["post", "post"]
+
+
+@pytest.mark.asyncio
+async def test_embed_texts_batches_requests_and_keeps_order(fake_genai, monkeypatch):
+    requests = []
+
+    def embed_content(model, content, **options):
+        requests.append((len(content), options))
+        return {"embedding": [[float(text)] for text in content]}
+
+    monkeypatch.setattr(gemini_provider.genai, "embed_content", embed_content, raising=False)
+    provider = GeminiLLMProvider({'api_key': 'k', 'text_model_name': 'm'})
+    texts = [str(i) for i in range(250)]
+    assert [list(row) for row in await provider.embed_texts(texts, dimensions=256)] == [[float(i)] for i in range(250)]
+    assert sorted(n for n, _ in requests) == [50, 100, 100]
+    assert requests[0][1] == {'task_type': 'retrieval_document', 'output_dimensionality': 256}
+    assert await provider.embed_text("7") == [7.0]
+
+
+@pytest.mark.asyncio
+async def test_embed_texts_int8_quantizes_per_row(fake_genai, monkeypatch):
+    monkeypatch.setattr(gemini_provider.genai, "embed_content",
+                        lambda model, content, **options: {"embedding": [[0.5, -1.0, 0.25], [0.0, 0.0, 0.0]]}, raising=False)
+    provider = GeminiLLMProvider({'api_key': 'k', 'text_model_name': 'm'})
+    quantized, scales = await provider.embed_texts_int8(["a", "b"])
+    assert list(quantized[0]) == [64, -127, 32] and list(quantized[1]) == [0, 0, 0]
+    assert [round(float(v) * float(scales[0]), 2) for v in quantized[0]] == [0.5, -1.0, 0.25]
+
+
+@pytest.mark.asyncio
+async def test_transient_errors_are_retried_then_trip_the_breaker(fake_genai, monkeypatch):
+    monkeypatch.setattr(GeminiLLMProvider, "_breaker", gemini_provider._CircuitBreaker(threshold=3, reset_after=60))
+    provider = GeminiLLMProvider({'api_key': 'k', 'text_model_name': 'm', 'response_cache': False,
+                                  'max_attempts': 3, 'retry_base_delay': 0})
+    outcomes = [ConnectionError("reset"), ConnectionError("reset")]
+
+    async def flaky(contents, generation_config=None, stream=False):
+        if outcomes:
+            raise outcomes.pop(0)
+        return FakeResponse("ok")
+
+    provider.text_model.generate_content_async = flaky
+    assert await provider.generate_text("hi") == "ok"
+    assert GeminiLLMProvider._breaker.state == "closed"
+
+    outcomes.extend([ConnectionError("down")] * 3)
+    assert await provider.generate_text("hi") is None
+    assert GeminiLLMProvider._breaker.state == "open"
+    with pytest.raises(gemini_provider.CircuitOpenError):
+        await provider._with_retry(lambda: flaky("x"))
+
+
+@pytest.mark.asyncio
+async def test_half_open_trial_is_released_after_non_transient_error_or_cancel(fake_genai, monkeypatch):
+    import asyncio
+
+    breaker = gemini_provider._CircuitBreaker(threshold=1, reset_after=0)
+    monkeypatch.setattr(GeminiLLMProvider, "_breaker", breaker)
+    provider = GeminiLLMProvider({'api_key': 'k', 'text_model_name': 'm', 'response_cache': False, 'max_attempts': 1})
+
+    async def cancelled():
+        raise asyncio.CancelledError()
+
+    async def rejected():
+        raise ValueError("bad request")
+
+    async def ok():
+        return "ok"
+
+    breaker.record_failure()
+    assert breaker.state == "half-open"
+    with pytest.raises(asyncio.CancelledError):
+        await provider._with_retry(cancelled)
+    assert breaker.state == "half-open" and not breaker._trial_running
+    with pytest.raises(ValueError):
+        await provider._with_retry(rejected)
+    assert breaker.state == "closed"
+    assert await provider._with_retry(ok) == "ok"
+
+
+def test_rate_limiter_queues_bursts_beyond_capacity():
+    limiter = gemini_provider._RateLimiter(2, period=1.0)
+    delays = [limiter.reserve() for _ in range(4)]
+    assert delays[:2] == [0.0, 0.0]
+    assert delays[2] == pytest.approx(0.5, abs=0.01) and delays[3] == pytest.approx(1.0, abs=0.01)
+    assert gemini_provider._rate_limiter('m', 0) is None
+    assert gemini_provider._rate_limiter('m', 60) is gemini_provider._rate_limiter('m', 60)
+
+
+@pytest.mark.asyncio
+async def test_dry_run_skips_persona_and_network(fake_genai, monkeypatch):
+    persona = FakePersona()
+    persona.get_full_context_for_llm = lambda context_type="chat": pytest.fail("persona built in dry run")
+    monkeypatch.setattr(gemini_provider.genai, "embed_content", lambda **kw: pytest.fail("network"), raising=False)
+    provider = GeminiLLMProvider({'api_key': 'k', 'text_model_name': 'm', 'persona_object': persona, 'dry_run': True})
+    assert await provider.generate_text("hi") == "[DRY_RUN_GEMINI] hi"
+    assert await provider.run_batch(["a"]) == ["[DRY_RUN_GEMINI] a"]
+    assert list(await provider.embed_text("q", dimensions=3)) == [0.0, 0.0, 0.0]
+    assert provider.text_model.calls == []
+
+
+@pytest.mark.asyncio
+async def test_generation_config_overrides_are_built_once(fake_genai):
+    provider = GeminiLLMProvider({'api_key': 'k', 'text_model_name': 'm', 'response_cache': False})
+    for _ in range(2):
+        await provider.generate_text("a", generation_config={'temperature': 0.3})
+        await provider.generate_text("b", response_schema={'type': 'object'})
+    first, second, third, fourth = provider.text_model.configs
+    assert first is third and second is fourth
+
+
+def test_proxy_url_is_honoured_or_init_fails(fake_genai, monkeypatch):
+    monkeypatch.setenv("HTTPS_PROXY", "http://agent-proxy:1")
+    monkeypatch.setenv("HTTP_PROXY", "http://agent-proxy:1")
+    GeminiLLMProvider({'api_key': 'k', 'text_model_name': 'm', 'proxy_url': 'http://gemini-proxy:2'})
+    assert gemini_provider.os.environ["HTTPS_PROXY"] == 'http://gemini-proxy:2'
+
+    with pytest.raises(ValueError):
+        GeminiLLMProvider({'api_key': 'k', 'text_model_name': 'm', 'proxy_url': 'http://other:3', 'proxy_via_env': False})
@@ -0,0 +1,73 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+litellm = pytest.importorskip("litellm")
+
+from xviolet.llm import lite_llm_provider
+from xviolet.llm.lite_llm_provider import LiteLLMProvider
+
+
+def _response(text):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+
+
+@pytest.fixture(autouse=True)
+def no_proxy_env(monkeypatch):
+    # AgentConfig exports the .env proxy process-wide; the clients built here must not pick it up
+    for name in ("HTTP_PROXY", "HTTPS_PROXY", "ALL_PROXY", "http_proxy", "https_proxy", "all_proxy"):
+        monkeypatch.delenv(name, raising=False)
+
+
+@pytest.fixture
+def sessions(monkeypatch):
+    seen = []
+
+    async def acompletion(**params):
+        seen.append(litellm.aclient_session)
+        return _response("ok")
+
+    monkeypatch.setattr(litellm, "acompletion", acompletion)
+    monkeypatch.setattr(litellm, "aclient_session", None)
+    return seen
+
+
+def test_each_event_loop_gets_its_own_client(sessions):
+    provider = LiteLLMProvider({'model': 'gpt-4o-mini', 'response_cache': False})
+    assert asyncio.run(provider.generate_text("a")) == "ok"
+    assert asyncio.run(provider.generate_text("b")) == "ok"
+    # generate_many-style callers run each batch in a fresh loop; a client is never reused across them
+    assert sessions[0] is not sessions[1]
+
+
+@pytest.mark.asyncio
+async def test_aclose_only_closes_the_providers_own_clients(sessions):
+    first = LiteLLMProvider({'model': 'gpt-4o-mini', 'response_cache': False})
+    second = LiteLLMProvider({'model': 'gpt-4o-mini', 'response_cache': False})
+    await first.generate_text("a")
+    await second.generate_text("b")
+    first_client, second_client = sessions
+    await first.aclose()
+    assert first_client.is_closed and not second_client.is_closed
+    assert await second.generate_text("c") == "ok" and sessions[-1] is second_client
+    await second.aclose()
+    assert second_client.is_closed
+
+
+@pytest.mark.asyncio
+async def test_analyze_image_uses_the_passed_bytes(tmp_path, monkeypatch):
+    sent = []
+
+    async def acompletion(**params):
+        sent.append(params["messages"][0]["content"][1]["image_url"]["url"])
+        return _response("a cat")
+
+    monkeypatch.setattr(litellm, "acompletion", acompletion)
+    monkeypatch.setattr(litellm, "aclient_session", None)
+    image = tmp_path / "cat.png"
+    image.write_bytes(b"on disk")
+    provider = LiteLLMProvider({'model': 'gpt-4o-vision', 'response_cache': False})
+    assert await provider.analyze_image(str(image), image_data=b"in memory") == "a cat"
+    assert sent == [lite_llm_provider._encode_data_url("image/png", b"in memory")]
+    await provider.aclose()
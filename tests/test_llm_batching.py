@@ -0,0 +1,114 @@
+import asyncio
+
+import pytest
+
+from xviolet.llm.base_llm import BaseLLMProvider
+from xviolet.llm.batching import BatchedLLMProvider
+from xviolet.llm.fallback_manager import LLMFallbackManager, register_provider
+
+
+@register_provider('echo_batch')
+class EchoProvider(BaseLLMProvider):
+    def __init__(self, config_dict):
+        super().__init__(config_dict)
+        self.batches = []
+
+    async def generate_text(self, prompt, context_type="general", **kwargs):
+        if prompt == "bad":
+            raise RuntimeError("bad prompt")
+        return prompt.upper()
+
+    async def generate_text_batch(self, prompts, context_type="general", **kwargs):
+        self.batches.append(list(prompts))
+        return [p.upper() for p in prompts]
+
+    async def analyze_image(self, image_path, context_type="image_analysis", prompt_override=None, **kwargs):
+        return "image"
+
+    async def analyze_video(self, video_path, context_type="video_analysis", prompt_override=None, **kwargs):
+        return None
+
+
+@pytest.mark.asyncio
+async def test_concurrent_prompts_are_coalesced_into_one_batch():
+    inner = EchoProvider({})
+    batched = BatchedLLMProvider(inner, max_batch=8, window_ms=20)
+    results = await asyncio.gather(*(batched.generate_text(p) for p in ["a", "b", "c"]))
+    assert results == ["A", "B", "C"]
+    assert inner.batches == [["a", "b", "c"]]
+    assert await batched.analyze_image("x.png") == "image"
+    await batched.aclose()
+
+
+@pytest.mark.asyncio
+async def test_mixed_kwargs_fall_back_to_individual_calls_and_isolate_errors():
+    inner = EchoProvider({})
+    batched = BatchedLLMProvider(inner, window_ms=10)
+    ok, bad = await asyncio.gather(
+        batched.generate_text("fine", temperature=0),
+        batched.generate_text("bad"),
+        return_exceptions=True,
+    )
+    assert ok == "FINE"
+    assert isinstance(bad, RuntimeError)
+    assert inner.batches == []
+    await batched.aclose()
+
+
+def test_manager_wraps_providers_with_micro_batch_config():
+    manager = LLMFallbackManager([
+        {'type': 'echo_batch', 'name': 'batched', 'config': {'micro_batch': {'window_ms': 5}}},
+    ])
+    entry = manager.providers[0]
+    assert isinstance(entry.instance, BatchedLLMProvider)
+    assert entry.instance.window == 0.005
+
+
+@pytest.mark.asyncio
+async def test_aclose_sends_taken_prompts_and_fails_unsent_ones():
+    inner = EchoProvider({})
+    batched = BatchedLLMProvider(inner, max_batch=2, window_ms=1000)
+    calls = [asyncio.ensure_future(batched.generate_text(p)) for p in ["a", "b", "c"]]
+    await asyncio.sleep(0.01) # "a" and "b" are flushing; "c" sits in the next, still open window
+    await batched.aclose()
+    assert await asyncio.wait_for(asyncio.gather(*calls), 1) == ["A", "B", "C"]
+    assert inner.batches == [["a", "b"], ["c"]]
+
+    # A prompt queued behind the shutdown is failed rather than left pending
+    batched = BatchedLLMProvider(inner, window_ms=1000)
+    queue = batched._ensure_worker()
+    queue.put_nowait(None)
+    late = asyncio.get_running_loop().create_future()
+    queue.put_nowait(("late", "general", {}, late))
+    await batched.aclose()
+    with pytest.raises(RuntimeError):
+        await asyncio.wait_for(late, 1)
+
+
+@pytest.mark.asyncio
+async def test_short_batch_result_fails_the_leftover_callers():
+    class ShortBatch(EchoProvider):
+        async def generate_text_batch(self, prompts, context_type="general", **kwargs):
+            return [p.upper() for p in prompts][:-1]
+
+    batched = BatchedLLMProvider(ShortBatch({}), window_ms=10)
+    results = await asyncio.wait_for(asyncio.gather(
+        batched.generate_text("a"), batched.generate_text("b"), return_exceptions=True), 1)
+    assert all(isinstance(r, RuntimeError) for r in results)
+    await batched.aclose()
+
+
+@pytest.mark.asyncio
+async def test_cancelled_flush_cancels_its_callers():
+    class Hanging(EchoProvider):
+        async def generate_text_batch(self, prompts, context_type="general", **kwargs):
+            await asyncio.Event().wait()
+
+    batched = BatchedLLMProvider(Hanging({}), window_ms=1)
+    call = asyncio.ensure_future(batched.generate_text("a"))
+    await asyncio.sleep(0.02)
+    for task in list(batched._inflight):
+        task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await asyncio.wait_for(call, 1)
+    await batched.aclose()
@@ -0,0 +1,47 @@
+import time
+
+from xviolet.llm.cache import LLMCache, SemanticLLMCache
+
+
+def test_cache_key_only_for_deterministic_or_opted_in_requests():
+    messages = [{"role": "user", "content": "hi"}]
+    assert LLMCache.cache_key("m", messages, temperature=0.7) is None
+    key = LLMCache.cache_key("m", messages, temperature=0)
+    assert key == LLMCache.cache_key("m", messages, temperature=0.0)
+    assert key != LLMCache.cache_key("other-model", messages, temperature=0)
+    assert LLMCache.cache_key("m", messages, temperature=0.7, opt_in=True) is not None
+    assert LLMCache.cache_key("m", messages, temperature=0.1) is not None
+    assert LLMCache.cache_key("m", messages) is None
+
+
+def test_lru_eviction_and_ttl_expiry():
+    cache = LLMCache(maxsize=2, ttl=60)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    assert cache.get("a") == "1" # 'a' is now most recently used
+    cache.set("c", "3")
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == ("1", "3")
+
+    short = LLMCache(ttl=0.01)
+    short.set("k", "v")
+    time.sleep(0.02)
+    assert short.get("k") is None
+    assert len(short) == 0
+
+
+def test_none_keys_and_values_are_ignored():
+    cache = LLMCache()
+    cache.set(None, "x")
+    cache.set("k", None)
+    assert len(cache) == 0
+    assert cache.get(None) is None
+
+
+def test_semantic_cache_matches_near_duplicates_within_namespace():
+    cache = SemanticLLMCache(threshold=0.95)
+    cache.set("ns", [1.0, 0.0, 0.0], "cached reply")
+    assert cache.get("ns", [0.99, 0.05, 0.0]) == "cached reply"
+    assert cache.get("ns", [0.0, 1.0, 0.0]) is None
+    assert cache.get("other", [1.0, 0.0, 0.0]) is None
+    assert cache.get("ns", [0.0, 0.0, 0.0]) is None
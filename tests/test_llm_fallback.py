@@ -0,0 +1,291 @@
+import pytest
+
+from xviolet.llm.base_llm import BaseLLMProvider
+from xviolet.llm.fallback_manager import LLMFallbackManager, PROVIDER_REGISTRY, register_provider
+
+
+@register_provider('dummy')
+class DummyProvider(BaseLLMProvider):
+    def __init__(self, config_dict):
+        super().__init__(config_dict)
+        self.reply = config_dict.get('reply')
+        self.fail = config_dict.get('fail', False)
+        self.calls = 0
+
+    async def generate_text(self, prompt, context_type="general", **kwargs):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("boom")
+        return self.reply
+
+    async def analyze_image(self, image_path, context_type="image_analysis", prompt_override=None, **kwargs):
+        return self.reply
+
+    async def analyze_video(self, video_path, context_type="video_analysis", prompt_override=None, **kwargs):
+        return self.reply
+
+
+def test_registry_contains_builtin_and_registered_types():
+    assert {'gemini', 'litellm', 'local_gguf', 'dummy'} <= set(PROVIDER_REGISTRY)
+    manager = LLMFallbackManager([])
+    assert manager._get_llm_provider_class('dummy') is DummyProvider
+    assert manager._get_llm_provider_class('does_not_exist') is None
+
+
+def test_unknown_and_disabled_providers_are_skipped():
+    manager = LLMFallbackManager([
+        {'type': 'does_not_exist', 'name': 'bogus'},
+        {'type': 'dummy', 'name': 'off', 'enabled': False, 'config': {'reply': 'x'}},
+        {'type': 'dummy', 'name': 'on', 'config': {'reply': 'y'}},
+    ])
+    assert [p.name for p in manager.providers] == ['on']
+
+
+@pytest.mark.asyncio
+async def test_generate_text_falls_back_in_configured_order():
+    manager = LLMFallbackManager([
+        {'type': 'dummy', 'name': 'broken', 'config': {'fail': True}},
+        {'type': 'dummy', 'name': 'empty', 'config': {'reply': None}},
+        {'type': 'dummy', 'name': 'good', 'config': {'reply': 'hello'}},
+    ])
+    assert await manager.generate_text("hi") == 'hello'
+    broken, empty, good = manager.providers
+    assert (broken.stats.failures, empty.stats.empty_results, good.stats.successes) == (1, 1, 1)
+
+
+@pytest.mark.asyncio
+async def test_media_methods_share_the_fallback_dispatch():
+    manager = LLMFallbackManager([
+        {'type': 'dummy', 'name': 'empty', 'config': {'reply': None}},
+        {'type': 'dummy', 'name': 'good', 'config': {'reply': 'caption'}},
+    ])
+    assert await manager.analyze_image("img.png", prompt_override="describe") == 'caption'
+    assert await manager.analyze_video("clip.mp4") == 'caption'
+    assert manager.providers[0].stats.empty_results == 2
+
+
+def test_providers_initialize_concurrently_and_keep_config_order():
+    import threading
+    import time
+
+    barrier = threading.Barrier(2, timeout=2)
+
+    @register_provider('slow_dummy')
+    class SlowProvider(DummyProvider):
+        def __init__(self, config_dict):
+            super().__init__(config_dict)
+            time.sleep(config_dict.get('delay', 0))
+            barrier.wait()  # Deadlocks (and times out) if construction were sequential
+
+    manager = LLMFallbackManager([
+        {'type': 'slow_dummy', 'name': 'first', 'config': {'delay': 0.05}},
+        {'type': 'slow_dummy', 'name': 'second', 'config': {}},
+    ])
+    assert [p.name for p in manager.providers] == ['first', 'second']
+
+
+def test_failing_constructor_is_skipped():
+    @register_provider('broken_ctor')
+    class BrokenCtor(DummyProvider):
+        def __init__(self, config_dict):
+            raise ValueError("bad config")
+
+    manager = LLMFallbackManager([
+        {'type': 'broken_ctor', 'name': 'bad'},
+        {'type': 'dummy', 'name': 'good', 'config': {'reply': 'ok'}},
+    ])
+    assert [p.name for p in manager.providers] == ['good']
+
+
+def test_identical_configs_share_one_instance():
+    config = {'reply': 'same', 'nested': {'a': [1, 2]}}
+    manager = LLMFallbackManager([
+        {'type': 'dummy', 'name': 'one', 'config': dict(config)},
+        {'type': 'dummy', 'name': 'two', 'config': dict(config)},
+        {'type': 'dummy', 'name': 'other', 'config': {'reply': 'different'}},
+    ])
+    one, two, other = (p.instance for p in manager.providers)
+    assert one is two
+    assert one is not other
+    # Sharing is per manager: closing one manager must not close providers another one still uses
+    again = LLMFallbackManager([{'type': 'dummy', 'name': 'three', 'config': dict(config)}])
+    assert again.providers[0].instance is not one
+
+
+@register_provider('stream_dummy')
+class StreamProvider(DummyProvider):
+    async def generate_text_stream(self, prompt, context_type="general", **kwargs):
+        chunks = self.config_dict.get('chunks', [])
+        fail_after = self.config_dict.get('fail_after')
+        for i, chunk in enumerate(chunks):
+            if i == fail_after:
+                raise RuntimeError("stream dropped")
+            yield chunk
+        if fail_after is not None and fail_after >= len(chunks):
+            raise RuntimeError("stream dropped")
+
+
+async def _collect(stream):
+    return [chunk async for chunk in stream]
+
+
+@pytest.mark.asyncio
+async def test_stream_falls_back_before_first_chunk():
+    manager = LLMFallbackManager([
+        {'type': 'stream_dummy', 'name': 'dead', 'config': {'chunks': ['x'], 'fail_after': 0}},
+        {'type': 'stream_dummy', 'name': 'silent', 'config': {'chunks': []}},
+        {'type': 'dummy', 'name': 'plain', 'config': {'reply': 'whole reply'}},
+    ])
+    # 'plain' has no native streaming, so the base class yields its full reply once
+    assert await _collect(manager.generate_text_stream("hi")) == ['whole reply']
+
+
+@pytest.mark.asyncio
+async def test_stream_failure_after_output_surfaces_partial():
+    from xviolet.llm.fallback_manager import StreamInterruptedError
+
+    manager = LLMFallbackManager([
+        {'type': 'stream_dummy', 'name': 'flaky', 'config': {'chunks': ['Hel', 'lo', '!'], 'fail_after': 2}},
+        {'type': 'dummy', 'name': 'backup', 'config': {'reply': 'unused'}},
+    ])
+    received = []
+    with pytest.raises(StreamInterruptedError) as excinfo:
+        async for chunk in manager.generate_text_stream("hi"):
+            received.append(chunk)
+    assert received == ['Hel', 'lo']
+    assert excinfo.value.partial == 'Hello'
+    assert manager.providers[1].instance.calls == 0
+
+
+@pytest.mark.asyncio
+async def test_request_object_is_built_once_and_shared():
+    from xviolet.llm.base_llm import LLMRequest
+
+    seen = []
+
+    @register_provider('request_dummy')
+    class RequestProvider(DummyProvider):
+        async def generate(self, request):
+            seen.append(request)
+            return self.reply
+
+    manager = LLMFallbackManager([
+        {'type': 'request_dummy', 'name': 'empty', 'config': {'reply': None}},
+        {'type': 'request_dummy', 'name': 'good', 'config': {'reply': 'done'}},
+    ])
+    assert await manager.generate_text("hi", context_type="reply", temperature=0.2) == 'done'
+    assert seen[0] is seen[1]
+    assert seen[0] == LLMRequest("hi", "reply", {'temperature': 0.2})
+
+
+@pytest.mark.asyncio
+async def test_media_is_read_once_and_shared_across_providers(tmp_path):
+    received = []
+
+    @register_provider('media_dummy')
+    class MediaProvider(DummyProvider):
+        async def analyze_image(self, image_path, context_type="image_analysis", prompt_override=None, **kwargs):
+            received.append(kwargs.get('image_data'))
+            return self.reply
+
+        async def analyze_video(self, video_path, context_type="video_analysis", prompt_override=None, **kwargs):
+            received.append(kwargs['video_data'][:4])
+            return self.reply
+
+    image = tmp_path / "pic.png"
+    image.write_bytes(b"\x89PNG-data")
+    video = tmp_path / "clip.mp4"
+    video.write_bytes(b"MP4!" * 16)
+    manager = LLMFallbackManager([
+        {'type': 'media_dummy', 'name': 'empty', 'config': {'reply': None}},
+        {'type': 'media_dummy', 'name': 'good', 'config': {'reply': 'seen'}},
+    ])
+    assert await manager.analyze_image(str(image)) == 'seen'
+    assert received[0] is received[1] and received[0] == b"\x89PNG-data"
+    assert await manager.analyze_video(str(video)) == 'seen'
+    assert received[2:] == [b"MP4!", b"MP4!"]
+
+
+@pytest.mark.asyncio
+async def test_single_provider_uses_specialized_dispatch():
+    configs = [{'type': 'dummy', 'name': 'only', 'config': {'reply': 'solo', 'tag': 'single'}}]
+    manager = LLMFallbackManager(configs)
+    assert manager._dispatch_fn == manager._dispatch_single
+    assert await manager.generate_text("hi") == 'solo'
+    assert manager.providers[0].stats.successes == 1
+
+    general = LLMFallbackManager(configs, specialize=False)
+    assert general._dispatch_fn == general._dispatch
+    assert await general.generate_text("hi") == 'solo'
+
+
+@pytest.mark.asyncio
+async def test_generate_batch_runs_prompts_concurrently_in_order():
+    import asyncio
+
+    running = []
+    peak = []
+
+    @register_provider('echo_dummy')
+    class EchoProvider(DummyProvider):
+        async def generate_text(self, prompt, context_type="general", **kwargs):
+            running.append(prompt)
+            peak.append(len(running))
+            await asyncio.sleep(0.01)
+            running.remove(prompt)
+            return None if prompt == 'skip' else prompt.upper()
+
+    manager = LLMFallbackManager([{'type': 'echo_dummy', 'name': 'echo'}])
+    results = await manager.generate_batch(['a', 'skip', 'c', 'd'], concurrency=2)
+    assert results == ['A', None, 'C', 'D']
+    assert max(peak) == 2
+
+
+@pytest.mark.asyncio
+async def test_run_graph_overlaps_independent_steps():
+    import asyncio
+    from xviolet.llm.fallback_manager import LLMTask
+
+    log = []
+
+    @register_provider('graph_dummy')
+    class GraphProvider(DummyProvider):
+        async def generate_text(self, prompt, context_type="general", **kwargs):
+            log.append(('start', prompt))
+            await asyncio.sleep(0.01)
+            log.append(('end', prompt))
+            return prompt.upper()
+
+    manager = LLMFallbackManager([{'type': 'graph_dummy', 'name': 'g'}])
+    results = await manager.run_graph({
+        'combine': LLMTask.from_llm('generate_text', prompt='{intents}+{rewrite}', deps=('intents', 'rewrite')),
+        'intents': LLMTask.from_llm('generate_text', prompt='intents'),
+        'rewrite': LLMTask.from_llm('generate_text', prompt='rewrite'),
+    })
+    assert results == {'intents': 'INTENTS', 'rewrite': 'REWRITE', 'combine': 'INTENTS+REWRITE'}
+    assert set(log[:2]) == {('start', 'intents'), ('start', 'rewrite')}
+
+    with pytest.raises(ValueError):
+        await manager.run_graph({'a': LLMTask.from_llm('generate_text', prompt='a', deps=('missing',))})
+
+
+@pytest.mark.asyncio
+async def test_generate_batch_maps_failures_to_none_and_propagates_cancellation():
+    import asyncio
+
+    class Abort(BaseException):  # Not an Exception, so the fallback loop doesn't catch it
+        pass
+
+    @register_provider('raising_dummy')
+    class RaisingProvider(DummyProvider):
+        async def generate(self, request):
+            if request.prompt == 'cancel':
+                raise asyncio.CancelledError()
+            if request.prompt == 'abort':
+                raise Abort()
+            return request.prompt
+
+    manager = LLMFallbackManager([{'type': 'raising_dummy', 'name': 'r'}])
+    assert await manager.generate_batch(['a', 'abort', 'b']) == ['a', None, 'b']
+    with pytest.raises(asyncio.CancelledError):
+        await manager.generate_batch(['a', 'cancel'])
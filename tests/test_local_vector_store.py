@@ -0,0 +1,141 @@
+import sqlite3
+
+import pytest
+
+pytest.importorskip("sqlite_vec")
+if not hasattr(sqlite3.Connection, "enable_load_extension"):
+    pytest.skip("this Python's sqlite3 cannot load extensions", allow_module_level=True)
+
+from xviolet.config import config
+from xviolet.vector import local_store
+from xviolet.vector._docprep import content_hash, pack_f32
+from xviolet.vector.local_store import LocalVectorStore, SCHEMA_VERSION
+
+DIM = 3
+
+# Text lengths 1, 3, 6 and 10: with the toy embedding below every query has a unique nearest neighbour
+DOCS = [{'id': '1', 'text': 'a'}, {'id': '2', 'text': 'bbb'}, {'id': '3', 'text': 'cccccc'}, {'id': '4', 'text': 'dddddddddd'}]
+
+
+async def embed(texts):
+    # Deterministic toy embedding: the distance between two texts is the difference of their lengths
+    return [[float(len(text)), 1.0, 0.0] for text in texts]
+
+
+@pytest.fixture
+def make_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "embedding_dim", DIM)
+    stores = []
+
+    def make(**options):
+        store = LocalVectorStore({'db_path': str(tmp_path / "vectors.db"), 'embedder': embed, **options})
+        stores.append(store)
+        return store
+
+    yield make
+    for store in stores:
+        store.close()
+
+
+@pytest.mark.asyncio
+async def test_embedder_only_store_adds_without_rembed(make_store):
+    store = make_store(ann_index=None)
+    assert await store.add_documents([{'id': '1', 'text': 'a'}, {'id': '2', 'text': 'bbbb'}]) == ['1', '2']
+    results = await store.search("bbb", top_k=1)
+    assert [r['id'] for r in results] == ['2']
+
+
+def _ids(results):
+    return [r['id'] for r in results]
+
+
+@pytest.mark.asyncio
+async def test_v0_layout_is_migrated(tmp_path, make_store):
+    # Layout written before schema versioning: JSON text vectors, text inline in interactions_meta, no hashes
+    db = sqlite3.connect(str(tmp_path / "vectors.db"))
+    db.execute("CREATE TABLE interactions_vectors (embedding TEXT)")
+    db.execute("CREATE TABLE interactions_meta (id INTEGER PRIMARY KEY, original_id TEXT UNIQUE, content TEXT NOT NULL) STRICT")
+    db.executemany("INSERT INTO interactions_vectors(rowid, embedding) VALUES(?, ?)",
+                   [(1, '[1.0, 1.0, 0.0]'), (2, '[4.0, 1.0, 0.0]')])
+    db.executemany("INSERT INTO interactions_meta(id, original_id, content) VALUES(?, ?, ?)", [(1, '1', 'a'), (2, '2', 'bbbb')])
+    db.commit()
+    db.close()
+
+    store = make_store(ann_index=None)
+
+    assert store.db.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+    assert 'float[3]' in store.db.execute("SELECT sql FROM sqlite_master WHERE name = 'interactions_vectors'").fetchone()[0]
+    assert store.db.execute("SELECT embedding FROM interactions_vectors WHERE rowid = 2").fetchone()[0] == pack_f32([4.0, 1.0, 0.0])
+    assert 'content' not in {row[1] for row in store.db.execute("PRAGMA table_info(interactions_meta)")}
+    assert store.db.execute("SELECT id, content FROM interactions_content ORDER BY id").fetchall() == [(1, 'a'), (2, 'bbbb')]
+    assert store.db.execute("SELECT id, content_hash FROM interactions_meta ORDER BY id").fetchall() == [
+        (1, content_hash('a')), (2, content_hash('bbbb'))]
+
+    results = await store.search("bbb", top_k=2)
+    assert _ids(results) == ['2', '1']
+    assert results[0]['text'] == 'bbbb'
+    assert results[0]['score'] == pytest.approx(1.0)
+    assert (await store.get_document_by_id('1'))['text'] == 'a'
+    # Migrated hashes still deduplicate: the same text under a new id is not stored again
+    assert await store.add_documents([{'id': '3', 'text': 'a'}]) == []
+
+
+MODES = [
+    pytest.param({'ann_index': None, 'memory_mirror': False}, id="vec0"),
+    pytest.param({'ann_index': None}, id="memory-mirror"),
+    pytest.param({'ann_index': 'hnsw'}, id="hnsw"),
+    pytest.param({'ann_index': 'fp16'}, id="fp16"),
+    pytest.param({'ann_index': None, 'memory_mirror': False, 'quantize': 'int8'}, id="int8"),
+    pytest.param({'ann_index': None, 'quantize': 'int8'}, id="int8-memory-mirror"),
+]
+
+
+def _check_mode(store, options):
+    if options['ann_index'] == 'hnsw':
+        if local_store.hnswlib is None or local_store.np is None:
+            pytest.skip("hnswlib and numpy are needed for the HNSW index")
+        assert store._hnsw is not None
+    elif options['ann_index'] == 'fp16':
+        if local_store.np is None:
+            pytest.skip("numpy is needed for the fp16 index")
+        assert store._fp16 is not None
+    else:
+        assert store._hnsw is None and store._fp16 is None
+        assert store._mirrored == options.get('memory_mirror', True)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("options", MODES)
+async def test_add_search_delete(make_store, options):
+    store = make_store(**options)
+    _check_mode(store, options)
+
+    assert await store.add_documents(DOCS) == ['1', '2', '3', '4']
+    results = await store.search("eeeee", top_k=2)
+    assert _ids(results) == ['3', '2']
+    assert results[0]['text'] == 'cccccc'
+    assert [r['score'] for r in results] == pytest.approx([1.0, 2.0], abs=1e-2) # fp16 rounds the stored vectors
+
+    assert await store.delete_documents(['3'])
+    assert await store.get_document_by_id('3') is None
+    assert _ids(await store.search("eeeee", top_k=2)) == ['2', '1']
+
+    # Deleted text can be stored again, and is searchable again
+    assert await store.add_documents([{'id': '5', 'text': 'cccccc'}]) == ['5']
+    assert _ids(await store.search("eeeee", top_k=1)) == ['5']
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("options", MODES)
+async def test_search_many_matches_search(make_store, options):
+    store = make_store(read_connections=2, **options)
+    _check_mode(store, options)
+    await store.add_documents(DOCS)
+    await store.delete_documents(['4'])
+
+    queries = ["a", "bbbb", "eeeee", "fffffffff"]
+    expected = [_ids(await store.search(query, top_k=2)) for query in queries]
+    assert expected == [['1', '2'], ['2', '3'], ['3', '2'], ['3', '2']]
+    assert [_ids(results) for results in await store.search_many(queries, top_k=2)] == expected
+    # Without an in-memory index the batch fans out over read-only connections
+    assert (store._ro_pool is not None) == (store._hnsw is None and store._fp16 is None)
@@ -1 +1,22 @@
+from xviolet import media_tracker
 
+
+def test_used_media_is_tracked_in_sqlite(tmp_path, monkeypatch):
+    legacy_log = tmp_path / "used_media.txt"
+    legacy_log.write_text("old.jpg\n")
+    monkeypatch.setattr(media_tracker, "USED_MEDIA_LOG_FILE", str(legacy_log))
+    monkeypatch.setattr(media_tracker, "USED_MEDIA_DB_FILE", str(tmp_path / "used_media.db"))
+
+    used = media_tracker.load_used_media()
+    assert "old.jpg" in used # Imported from the legacy text log
+    assert not media_tracker.is_media_used("a.jpg", used)
+
+    media_tracker.mark_media_as_used("a.jpg")
+    media_tracker.mark_media_as_used("a.jpg") # Idempotent
+    used.add("b.png")
+    assert media_tracker.is_media_used("a.jpg", used)
+    assert media_tracker.is_media_used("b.png") # No set: direct indexed lookup
+    assert len(used) == 3
+    assert media_tracker.load_all() == {"old.jpg", "a.jpg", "b.png"}
+    # Plain sets still work with is_media_used
+    assert media_tracker.is_media_used("x", {"x"})
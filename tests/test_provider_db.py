@@ -0,0 +1,52 @@
+import array
+import sqlite3
+import struct
+
+import pytest
+
+import xviolet.provider.db as db
+
+
+def test_pack_embedding_is_little_endian_float32():
+    blob = db.pack_embedding([1.0, -2.0])
+    assert blob == struct.pack('<2f', 1.0, -2.0)
+    assert len(db.SEED_EMBEDDINGS[0][2]) == db.EMBEDDING_DIM * 4
+
+
+def test_pack_embedding_q8_roundtrip():
+    vec = [0.5, -1.0, 0.25]
+    blob = db.pack_embedding_q8(vec)
+    values, (scale,) = array.array('b', blob[:-4]), struct.unpack('<f', blob[-4:])
+    assert values.tolist() == [64, -127, 32]
+    assert [round(v * scale, 2) for v in values] == [0.5, -1.0, 0.25]
+
+
+def test_batch_upserts_share_one_connection(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, 'DATA_DIR', str(tmp_path))
+    monkeypatch.setattr(db, 'DB_PATH', str(tmp_path / 'memory.sqlite'))
+    monkeypatch.setattr(db, '_CONN', None)
+    conn = db._get_conn_cached()
+    try:
+        conn.execute("CREATE TABLE conversations (conversation_id TEXT PRIMARY KEY, root_tweet_id TEXT, last_updated TIMESTAMP)")
+        db.upsert_conversations([("c1", "t1", "2025-01-01"), ("c2", "t2", "2025-01-02")])
+        db.upsert_conversation(("c1", "t1", "2025-02-01"))
+        assert db._get_conn_cached() is conn
+        rows = conn.execute("SELECT conversation_id, last_updated FROM conversations ORDER BY 1").fetchall()
+        assert rows == [("c1", "2025-02-01"), ("c2", "2025-01-02")]
+    finally:
+        db.close_connection()
+
+
+def test_failed_commit_leaves_no_transaction_open():
+    conn = sqlite3.connect(":memory:", isolation_level=None)
+    conn.execute("PRAGMA foreign_keys=ON")
+    conn.execute("CREATE TABLE parent (id INTEGER PRIMARY KEY)")
+    conn.execute("CREATE TABLE child (parent_id INTEGER REFERENCES parent(id) DEFERRABLE INITIALLY DEFERRED)")
+    # The deferred foreign key is only checked at COMMIT, which then fails with the transaction still open
+    with pytest.raises(sqlite3.IntegrityError):
+        with db._tx(conn):
+            conn.execute("INSERT INTO child VALUES (1)")
+    assert not conn.in_transaction
+    with db._tx(conn): # The connection is usable again
+        conn.execute("INSERT INTO parent VALUES (1)")
+    assert conn.execute("SELECT COUNT(*) FROM child").fetchone() == (0,)
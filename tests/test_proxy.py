@@ -1 +1,27 @@
+import pytest
 
+import xviolet.provider.proxy as proxy
+
+
+def test_host_port_user_pass_is_reconstructed_and_cached(monkeypatch):
+    monkeypatch.setenv('TEST_PROXY', 'socks5h://host:1080:user:pw')
+    first = proxy.ProxyManager('TEST_PROXY')
+    second = proxy.ProxyManager('TEST_PROXY')
+    assert first.get_proxy_url() == 'socks5h://user:pw@host:1080'
+    assert first._state is second._state
+    assert dict(first.get_proxy_dict_for_requests()) == {'http': first.get_proxy_url(), 'https': first.get_proxy_url()}
+    with pytest.raises(TypeError):
+        first.get_proxy_dict_for_httpx()['http://'] = 'other'
+
+
+@pytest.mark.parametrize('value', [None, 'http://host:8080', 'socks5://'])
+def test_missing_or_invalid_proxy_is_disabled(monkeypatch, value):
+    if value is None:
+        monkeypatch.delenv('TEST_PROXY', raising=False)
+    else:
+        monkeypatch.setenv('TEST_PROXY', value)
+    manager = proxy.ProxyManager('TEST_PROXY')
+    assert not manager.is_enabled
+    assert manager.get_proxy_url() is None
+    assert manager.get_proxy_dict_for_httpx() is None
+    assert manager.get_httpx_proxy_mount() is None
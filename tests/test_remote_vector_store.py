@@ -0,0 +1,23 @@
+import pytest
+
+from xviolet.vector.remote_store import RemoteVectorStore
+
+
+class FakeIndex:
+    def __init__(self):
+        self.batches = []
+
+    async def upsert(self, vectors):
+        if vectors[0]['id'] == 'bad':
+            raise RuntimeError("rejected")
+        self.batches.append([v['id'] for v in vectors])
+
+
+@pytest.mark.asyncio
+async def test_add_documents_upserts_in_batches_and_drops_failed_ones():
+    index = FakeIndex()
+    store = RemoteVectorStore({'client': index, 'batch_size': 2})
+    docs = [{'id': doc_id, 'text': 't'} for doc_id in ('1', '2', 'bad', '4', '5')]
+    added = await store.add_documents(docs, [[0.1, 0.2]] * len(docs))
+    assert sorted(index.batches) == [['1', '2'], ['5']]
+    assert added == ['1', '2', '5']
@@ -15,3 +15,29 @@ def test_interaction_store(tmp_path):
     store.add_interaction("789")
     store2 = InteractionStore(path)
     assert store2.has_interacted("789")
+
+
+def test_interaction_store_migrates_json_and_appends(tmp_path, monkeypatch):
+    import json
+    import xviolet.storage as storage
+
+    path = tmp_path / "interactions.json"
+    path.write_text(json.dumps({"interacted_tweets": ["1", "2"]}))
+    store = InteractionStore(path)
+    assert store.has_interacted("1") and store.has_interacted("2")
+    store.add_interaction("3")
+    store.remove_interaction("1")
+    assert (tmp_path / "interactions.log").read_text().splitlines() == ["1", "2", "3", "-1"]
+    assert set(InteractionStore(path).data["interacted_tweets"]) == {"2", "3"}
+
+    monkeypatch.setattr(storage, "COMPACT_TOMBSTONES", 0)
+    store.remove_interaction("2")
+    assert (tmp_path / "interactions.log").read_text().splitlines() == ["3"]
+
+
+def test_compaction_replaces_log_atomically(tmp_path):
+    store = InteractionStore(tmp_path / "interactions.json")
+    store.add_interaction("1")
+    store.clear()
+    assert (tmp_path / "interactions.log").read_text() == ""
+    assert not (tmp_path / "interactions.log.tmp").exists()
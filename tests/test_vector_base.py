@@ -0,0 +1,30 @@
+import pytest
+
+from xviolet.vector.base import VectorStore
+
+
+class DictStore(VectorStore):
+    def __init__(self, config):
+        self.docs = config
+        self.lookups = []
+
+    async def add_documents(self, documents, embeddings=None):
+        return []
+
+    async def search(self, query_embedding, top_k=5, metadata_filter=None):
+        return []
+
+    async def get_document_by_id(self, document_id):
+        self.lookups.append(document_id)
+        return self.docs.get(document_id)
+
+    async def delete_documents(self, document_ids):
+        return True
+
+
+@pytest.mark.asyncio
+async def test_get_documents_by_ids_default_skips_missing_and_duplicates():
+    store = DictStore({'1': {'id': '1', 'text': 'a'}, '2': {'id': '2', 'text': 'b'}})
+    found = await store.get_documents_by_ids(['2', '9', '2', '1'])
+    assert found == {'2': {'id': '2', 'text': 'b'}, '1': {'id': '1', 'text': 'a'}}
+    assert store.lookups == ['2', '9', '1']
@@ -0,0 +1,19 @@
+import array
+import hashlib
+
+from xviolet.vector._docprep import prepare_documents
+
+
+def test_prepare_documents_skips_invalid_and_duplicate_docs():
+    docs = [
+        {'id': '1', 'text': 'a'},
+        {'id': 'x', 'text': 'b'},     # Not an integer id
+        {'id': '2', 'text': ''},      # No text
+        {'id': '1', 'text': 'other'}, # Repeated id
+        {'id': '3', 'text': 'a'},     # Repeated text
+        {'id': '4', 'text': 'c'},
+    ]
+    rows, hashes, blobs = prepare_documents(docs, [[1.0, 2.0], None, None, None, None, None])
+    assert rows == [(1, '1', 'a'), (4, '4', 'c')]
+    assert hashes == {1: hashlib.sha256(b'a').digest(), 4: hashlib.sha256(b'c').digest()}
+    assert blobs == {1: array.array('f', [1.0, 2.0]).tobytes()}
@@ -0,0 +1,172 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("sqlite_vec") # Imported by the manager through LocalVectorStore
+
+from xviolet.vector import fallback_manager
+from xviolet.vector.fallback_manager import StoreEntry, VectorStoreFallbackManager
+
+
+class FakeStore:
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.fail = False
+        self.gate = None # asyncio.Event a call waits on
+
+    async def _call(self, result):
+        self.calls += 1
+        if self.gate is not None:
+            await self.gate.wait()
+        if self.fail:
+            raise RuntimeError(f"{self.name} down")
+        return result
+
+    async def get_document_by_id(self, document_id):
+        return await self._call({'id': document_id, 'text': self.name})
+
+    async def search(self, query_embedding=None, top_k=5, metadata_filter=None, query_text=None):
+        return await self._call([{'id': self.name}])
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    # Only the manager's clock: asyncio's own timers keep using the real one
+    monkeypatch.setattr(fallback_manager, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def make_manager(*stores, store_type='remote', **kwargs):
+    manager = VectorStoreFallbackManager([], search_cache_ttl=0, **kwargs)
+    manager.stores = tuple(StoreEntry(store.name, store, store_type) for store in stores)
+    return manager
+
+
+async def settle():
+    for _ in range(3): # Let cancelled tasks run their done callbacks
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_breaker_opens_half_opens_and_closes(clock):
+    store = FakeStore("a")
+    manager = make_manager(store)
+    entry = manager.stores[0]
+
+    store.fail = True
+    for _ in range(fallback_manager.STORE_FAILURE_THRESHOLD):
+        assert await manager.get_document_by_id("1") is None
+    assert entry.opened_at == clock[0]
+
+    # Open: the store is skipped until the recovery window has passed
+    assert await manager.get_document_by_id("1") is None
+    assert store.calls == fallback_manager.STORE_FAILURE_THRESHOLD
+
+    # Half-open trial fails: the circuit re-opens for another full window
+    clock[0] += fallback_manager.STORE_RECOVERY_SECONDS
+    assert await manager.get_document_by_id("1") is None
+    assert entry.opened_at == clock[0] and not entry.trial_running
+    calls = store.calls
+    assert await manager.get_document_by_id("1") is None
+    assert store.calls == calls
+
+    # Half-open trial succeeds: the circuit closes
+    clock[0] += fallback_manager.STORE_RECOVERY_SECONDS
+    store.fail = False
+    assert await manager.get_document_by_id("1") == {'id': '1', 'text': 'a'}
+    assert entry.opened_at is None and entry.failures == 0 and not entry.trial_running
+
+
+@pytest.mark.asyncio
+async def test_half_open_lets_a_single_trial_through(clock):
+    store = FakeStore("a")
+    manager = make_manager(store)
+    entry = manager.stores[0]
+    entry.failures = fallback_manager.STORE_FAILURE_THRESHOLD
+    entry.opened_at = clock[0] - fallback_manager.STORE_RECOVERY_SECONDS
+
+    store.gate = asyncio.Event()
+    trial = asyncio.ensure_future(manager.get_document_by_id("1"))
+    await settle()
+    assert entry.trial_running and store.calls == 1
+    # Concurrent callers are refused while the trial is in flight
+    assert await asyncio.gather(*(manager.get_document_by_id(str(i)) for i in range(5))) == [None] * 5
+    assert store.calls == 1
+
+    store.gate.set()
+    assert await trial == {'id': '1', 'text': 'a'}
+    assert entry.opened_at is None and not entry.trial_running
+    assert await manager.get_document_by_id("2") == {'id': '2', 'text': 'a'}
+
+
+@pytest.mark.asyncio
+async def test_hedge_loser_releases_the_trial(clock):
+    slow, fast = FakeStore("slow"), FakeStore("fast")
+    slow.gate = asyncio.Event() # Never set: the hedged store always wins
+    manager = make_manager(slow, fast, hedge_delay_ms=1)
+    entry = manager.stores[0]
+    entry.failures = fallback_manager.STORE_FAILURE_THRESHOLD
+    entry.opened_at = clock[0] - fallback_manager.STORE_RECOVERY_SECONDS
+
+    assert await manager.search([0.1, 0.2]) == [{'id': 'fast'}]
+    await settle()
+    # The cancelled trial proves nothing either way: the circuit stays open, and the next call gets a new trial
+    assert not entry.trial_running and entry.opened_at is not None
+    assert await manager.search([0.1, 0.2]) == [{'id': 'fast'}]
+    assert slow.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_cancelled_search_releases_the_trial(clock):
+    store = FakeStore("a")
+    store.gate = asyncio.Event()
+    manager = make_manager(store, hedge_delay_ms=None)
+    entry = manager.stores[0]
+    entry.failures = fallback_manager.STORE_FAILURE_THRESHOLD
+    entry.opened_at = clock[0] - fallback_manager.STORE_RECOVERY_SECONDS
+
+    search = asyncio.ensure_future(manager.search([0.1, 0.2]))
+    await settle()
+    assert entry.trial_running
+    search.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await search
+    await settle()
+    assert not entry.trial_running
+
+
+@pytest.mark.asyncio
+async def test_trial_is_released_when_the_store_rejects_the_query(clock):
+    store = FakeStore("a")
+    manager = make_manager(store, store_type='local') # A local store only takes text queries
+    entry = manager.stores[0]
+    entry.failures = fallback_manager.STORE_FAILURE_THRESHOLD
+    entry.opened_at = clock[0] - fallback_manager.STORE_RECOVERY_SECONDS
+
+    assert await manager.search([0.1, 0.2]) == []
+    await settle()
+    assert not entry.trial_running and store.calls == 0
+    assert await manager.search("hello") == [{'id': 'a'}]
+    assert entry.opened_at is None
+
+
+@pytest.mark.asyncio
+async def test_query_embeddings_are_not_shared_between_managers():
+    class Embedding(FakeStore):
+        def __init__(self, name, vector):
+            super().__init__(name)
+            self.vector = vector
+
+        async def embed_text(self, text):
+            return self.vector
+
+        async def search(self, query_embedding=None, top_k=5, metadata_filter=None, query_text=None):
+            return [{'id': self.name, 'query': query_embedding}]
+
+    small = make_manager(Embedding("small", [1.0, 2.0]))
+    large = make_manager(Embedding("large", [1.0, 2.0, 3.0]))
+    assert (await small.search("hello"))[0]['query'] == [1.0, 2.0]
+    assert (await large.search("hello"))[0]['query'] == [1.0, 2.0, 3.0]
@@ -3,22 +3,41 @@ Main agent loop for x_violet: integrates LLM, persona, ActionManager, and Twitte
 - Handles polling, LLM-driven action selection, and dispatch.
 - Avoids duplicate interactions using interactions.json
 """
+import json
 import logging
 import asyncio
+import re
 import time
 import random
+import sys
 from pathlib import Path
 import os
 from typing import Optional
 from xviolet.config import config
 from xviolet.actions import ActionManager
 from xviolet.client.twitter_client import TwitterClient
-from xviolet.media_tracker import load_used_media, mark_media_as_used, is_media_used
-from xviolet.vector.fallback_manager import VectorStoreFallbackManager
+from xviolet.media_tracker import load_used_media, mark_media_as_used
+from xviolet.vector.fallback_manager import VectorStoreFallbackManager, normalize_query
 from xviolet.persona import Persona # ADDED Persona import
 
+try:
+    from orjson import loads as _json_loads # Optional C parser; its JSONDecodeError subclasses json's
+except ImportError:
+    from json import loads as _json_loads
+
+try:
+    import uvloop # Optional: libuv-based loop with cheaper callback scheduling
+except ImportError:
+    uvloop = None
+
+# Parses the first JSON object in an LLM reply and stops where it ends, so trailing prose or
+# stray braces after it don't matter
+_JSON_DECODER = json.JSONDecoder()
+
 logger = logging.getLogger("xviolet.agent")
 
+_MEDIA_SUFFIXES = ('.jpg', '.jpeg', '.png', '.gif')
+
 class XVioletAgent:
     def __init__(self):
         self.config = config
@@ -27,6 +46,12 @@ class XVioletAgent:
         self.actions = ActionManager(self.twitter)
         self.used_media_set = load_used_media()
         self.current_new_tweet_context_docs = [] # Initialize context attribute
+        # Media index: rebuilt only when the media directory's mtime changes (files added/removed/renamed)
+        self._media_index_key = None # (directory, st_mtime_ns) of the last scan
+        self._media_files: dict = {} # filename -> Path
+        self._unused_media: set = set()
+        self._unused_media_list: Optional[list] = None # Sorted snapshot for random.choice, rebuilt lazily
+        self._reserved_media: set = set() # Picked by an in-flight tweet slot, not yet scheduled
 
         # Load Persona
         self.persona: Optional[Persona] = None
@@ -82,9 +107,123 @@ class XVioletAgent:
             logger.error(f"Failed to initialize VectorStoreFallbackManager: {e}", exc_info=True)
             self.vector_store_manager = None
 
-        self.loop = asyncio.new_event_loop()
+        self.loop = uvloop.new_event_loop() if uvloop is not None else asyncio.new_event_loop()
+        if sys.version_info >= (3, 12):
+            # Tasks that finish without suspending (cache hits, dry runs) complete inline instead of
+            # taking a trip through the ready queue
+            self.loop.set_task_factory(asyncio.eager_task_factory)
         asyncio.set_event_loop(self.loop)
 
+    def _scan_media_dir_sync(self, media_dir: Path) -> tuple:
+        """Blocking part of a media index rebuild: directory listing, per-file stat and the used-media read."""
+        with os.scandir(media_dir) as entries:
+            # DirEntry.is_file uses the readdir d_type when the filesystem reports it, so no stat per file
+            files = {
+                entry.name: Path(entry.path) for entry in entries
+                if entry.name.lower().endswith(_MEDIA_SUFFIXES) and entry.is_file()
+            }
+        used = set(self.used_media_set) # One read of the used-media table per rescan
+        return files, files.keys() - used
+
+    async def _refresh_media_index(self, media_dir: Path) -> None:
+        key = (str(media_dir), media_dir.stat().st_mtime_ns)
+        if key == self._media_index_key:
+            return
+        # Off the event loop, so tasks already scheduled on it keep running during a cold-cache scan
+        self._media_files, self._unused_media = await asyncio.to_thread(self._scan_media_dir_sync, media_dir)
+        self._unused_media_list = None
+        self._media_index_key = key
+        logger.debug("Media index rebuilt: %d file(s), %d unused", len(self._media_files), len(self._unused_media))
+
+    async def _pick_unused_media(self, media_dir: Path) -> Optional[str]:
+        """Random unused image from media_dir, or None. Only rescans the directory when it changed."""
+        await self._refresh_media_index(media_dir)
+        if self._unused_media_list is None:
+            self._unused_media_list = sorted(self._unused_media)
+        candidates = self._unused_media_list
+        if self._reserved_media:
+            candidates = [name for name in candidates if name not in self._reserved_media]
+        if not candidates:
+            return None
+        name = random.choice(candidates)
+        self._reserved_media.add(name) # No await since the choice, so concurrent slots never share a file
+        return str(self._media_files[name])
+
+    async def _pick_media_batch(self, count: int) -> list:
+        """Up to `count` distinct unused media paths, reserved for this cycle."""
+        if count <= 0:
+            return []
+        media_dir = Path(self.config.media_dir)
+        if not media_dir.is_dir():
+            logger.warning(f"Media directory {self.config.media_dir} not found or not a directory. Skipping media tweet attempt.")
+            return []
+        chosen = []
+        for _ in range(count):
+            selected_media_path = await self._pick_unused_media(media_dir)
+            if not selected_media_path:
+                logger.info("No unused image media found for a media tweet attempt.")
+                break
+            logger.info(f"Selected unused media: {selected_media_path}")
+            chosen.append(selected_media_path)
+        return chosen
+
+    async def _caption_media(self, semaphore: asyncio.Semaphore, selected_media_path: str, formatted_context: str) -> Optional[tuple]:
+        """(caption, media_path) for one media slot, or None when captioning failed."""
+        base_caption_prompt = "Analyze the following image and generate a tweet caption for it, reflecting your persona."
+        prompt_for_image_analysis = f"{formatted_context}Based on the context above (if any) and your persona, analyze the image and generate a suitable tweet caption:" if formatted_context else base_caption_prompt
+        async with semaphore:
+            try:
+                text_content = await self.llm.analyze_image(
+                    image_path=selected_media_path,
+                    context_type="post",
+                    prompt_override=prompt_for_image_analysis
+                )
+            except Exception as e:
+                logger.error(f"Error during LLM image analysis for {selected_media_path}: {e}", exc_info=True)
+                text_content = None
+        if not text_content:
+            logger.error(f"LLM failed to generate caption for media {selected_media_path}. Skipping this media tweet slot.")
+            self._reserved_media.discard(os.path.basename(selected_media_path))
+            return None
+        return text_content, selected_media_path
+
+    async def _generate_text_tweet(self, semaphore: asyncio.Semaphore, topic: str, formatted_context: str) -> Optional[tuple]:
+        """(text, None) for one text-only slot, or None when generation failed."""
+        prompt_for_text_generation = f"Based on your persona, generate a tweet about: {topic}."
+        if formatted_context:
+            prompt_for_text_generation = f"{formatted_context}Based on the context above (if any) and your persona, generate a tweet about: {topic}."
+        async with semaphore:
+            try:
+                text_content = await self.llm.generate_text(prompt=prompt_for_text_generation, context_type="post")
+            except Exception as e:
+                logger.error(f"Error during text generation for topic '{topic}': {e}", exc_info=True)
+                return None
+        if not text_content:
+            logger.warning(f"Text generation failed for topic: {topic}. Skipping this slot.")
+            return None
+        return text_content, None
+
+    async def _produce_tweets(self, total: int, media_slots: int, topic: str, formatted_context: str) -> list:
+        """Content for one post cycle: captions for the pre-picked media first, then text-only tweets.
+
+        Media slots that find no unused media become text slots. All LLM calls of both batches run
+        together, at most tweet_generation_concurrency at a time.
+        """
+        chosen_media = await self._pick_media_batch(media_slots)
+        logger.info(f"Generating {len(chosen_media)} media tweet(s) and {total - len(chosen_media)} text-only tweet(s).")
+        semaphore = asyncio.Semaphore(self.config.tweet_generation_concurrency)
+        return await asyncio.gather(
+            *(self._caption_media(semaphore, path, formatted_context) for path in chosen_media),
+            *(self._generate_text_tweet(semaphore, topic, formatted_context) for _ in range(total - len(chosen_media)))
+        )
+
+    def _mark_media_used(self, media_filename: str) -> None:
+        mark_media_as_used(media_filename)
+        self.used_media_set.add(media_filename)
+        if media_filename in self._unused_media:
+            self._unused_media.discard(media_filename)
+            self._unused_media_list = None
+
     def _build_action_prompt(self, tweet: str, user: dict, available_actions: list, context: dict = None) -> str:
         """
         Build a prompt for the LLM to decide on an action and generate a response.
@@ -147,9 +286,6 @@ class XVioletAgent:
         Returns:
             tuple: (action, text) where action is the selected action and text is the generated text
         """
-        import json
-        import re
-        
         # Default values
         action = None
         text = ""
@@ -160,9 +296,14 @@ class XVioletAgent:
             
         try:
             # Try to find JSON in the response
-            json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-            if json_match:
-                result = json.loads(json_match.group(0))
+            start = response_text.find('{')
+            if start != -1:
+                try:
+                    # JSON-mode replies are a bare object: parse the whole text in one pass
+                    result = _json_loads(response_text)
+                except json.JSONDecodeError:
+                    # Otherwise (code fences, prose around it) take the first object
+                    result, _ = _JSON_DECODER.raw_decode(response_text, start)
                 action = result.get("action")
                 text = result.get("text", "")
             else:
@@ -291,7 +432,8 @@ class XVioletAgent:
                 # 3. Generate response using the new LLM interface
                 llm_response = await self.llm.generate_text(
                     prompt=prompt,
-                    context_type="action_selection"
+                    context_type="action_selection",
+                    json_mode=True # Providers with a native JSON mode return the bare object
                 )
                 
                 # Parse the LLM response to extract action and text
@@ -389,6 +531,18 @@ class XVioletAgent:
 
 
     def run(self, max_cycles: int = None):
+        try:
+            self._run_loop(max_cycles)
+        finally:
+            # Release pooled provider connections however the loop ends (max_cycles, an error, Ctrl+C)
+            llm_aclose = getattr(self.llm, 'aclose', None)
+            if llm_aclose:
+                try:
+                    self.loop.run_until_complete(llm_aclose())
+                except Exception as e:
+                    logger.warning(f"Error closing LLM providers: {e}")
+
+    def _run_loop(self, max_cycles: Optional[int]):
         logger.info("Starting unified agent scheduler...")
         # Initialize next run times
         now = time.time()
@@ -426,7 +580,8 @@ class XVioletAgent:
                     if self.persona and hasattr(self.persona, 'interests') and self.persona.interests:
                         # Ensure random is imported if not already at top of file
                         # import random # Should be at top of file
-                        query_text_for_new_tweet = random.choice(self.persona.interests)
+                        # Normalized so "AI ", "ai" etc. from the character file share search cache entries
+                        query_text_for_new_tweet = normalize_query(random.choice(self.persona.interests))
                         logger.info(f"New tweet context: Using persona interest '{query_text_for_new_tweet}' for vector search.")
                     else:
                         logger.info(f"New tweet context: Persona interests not available or empty, using default query '{query_text_for_new_tweet}'.")
@@ -456,109 +611,41 @@ class XVioletAgent:
                 
                 # query_text_for_new_tweet is defined above this block and holds the topic used for VS search
 
-                for _ in range(self.config.max_scheduled_tweets_total): # Iterate up to total allowed, not from scheduled_in_cycle_count
-                    if scheduled_in_cycle_count >= self.config.max_scheduled_tweets_total:
-                        logger.info(f"Reached max_scheduled_tweets_total ({self.config.max_scheduled_tweets_total}) for this cycle.")
-                        break
+                # Prepare context string from docs retrieved earlier
+                formatted_context = ""
+                if hasattr(self, 'current_new_tweet_context_docs') and self.current_new_tweet_context_docs:
+                    context_snippets = [doc.get('text', '') for doc in self.current_new_tweet_context_docs if doc.get('text', '').strip()]
+                    if context_snippets:
+                        formatted_context = "Contextual Information:\n" + "\n---\n".join(context_snippets) + "\n\n"
+                        logger.debug(f"Using formatted context for LLM prompt: {formatted_context[:200]}...")
+                    else:
+                        logger.debug("current_new_tweet_context_docs was present but yielded no usable snippets.")
+                else:
+                    logger.debug("No current_new_tweet_context_docs to use for LLM prompt.")
 
-                    selected_media_path = None
-                    text_content = None # Reset for each potential tweet
-                    is_media_attempt = False
+                # Pre-sample how many slots try media, capped by the per-cycle media limit
+                total_slots = self.config.max_scheduled_tweets_total
+                media_slots = min(
+                    self.config.max_scheduled_media_tweets,
+                    sum(random.random() < self.config.media_tweet_probability for _ in range(total_slots))
+                )
 
-                    # Prepare context string from docs retrieved earlier
-                    formatted_context = ""
-                    if hasattr(self, 'current_new_tweet_context_docs') and self.current_new_tweet_context_docs:
-                        context_snippets = [doc.get('text', '') for doc in self.current_new_tweet_context_docs if doc.get('text', '').strip()]
-                        if context_snippets:
-                            formatted_context = "Contextual Information:\n" + "\n---\n".join(context_snippets) + "\n\n"
-                            logger.debug(f"Using formatted context for LLM prompt: {formatted_context[:200]}...")
-                        else:
-                            logger.debug("current_new_tweet_context_docs was present but yielded no usable snippets.")
-                    else:
-                        logger.debug("No current_new_tweet_context_docs to use for LLM prompt.")
-
-
-                    # Determine if a media tweet should be generated
-                    if media_scheduled_in_cycle_count < self.config.max_scheduled_media_tweets and \
-                       random.random() < self.config.media_tweet_probability:
-                        is_media_attempt = True
-                        logger.info("Attempting to schedule a media tweet.")
-                        media_dir = Path(self.config.media_dir)
-                        if media_dir.exists() and media_dir.is_dir():
-                            available_media_files = [
-                                p for p in media_dir.iterdir() 
-                                if p.is_file() and p.suffix.lower() in ('.jpg', '.jpeg', '.png', '.gif')
-                            ]
-                            
-                            unused_media_files = [
-                                p for p in available_media_files 
-                                if not is_media_used(os.path.basename(str(p)), self.used_media_set)
-                            ]
-
-                            if unused_media_files:
-                                selected_media_path = str(random.choice(unused_media_files))
-                                logger.info(f"Selected unused media: {selected_media_path}")
-                                try:
-                                    base_caption_prompt = "Analyze the following image and generate a tweet caption for it, reflecting your persona."
-                                    prompt_for_image_analysis = f"{formatted_context}Based on the context above (if any) and your persona, analyze the image and generate a suitable tweet caption:" if formatted_context else base_caption_prompt
-                                    
-                                    try:
-                                        text_content = self.loop.run_until_complete(
-                                            self.llm.analyze_image(
-                                                image_path=selected_media_path, 
-                                                context_type="post",
-                                                prompt_override=prompt_for_image_analysis
-                                            )
-                                        )
-                                        if not text_content:
-                                            logger.error(f"LLM failed to generate caption for media {selected_media_path}. Skipping this media tweet slot.")
-                                            continue  # Skip to next iteration if no content generated
-                                    except Exception as e:
-                                        logger.error(f"Error during LLM image analysis for {selected_media_path}: {e}", exc_info=True)
-                                        continue  # Skip to next iteration on error
-                                except Exception as e:
-                                    logger.error(f"Error during LLM caption generation for media {selected_media_path}: {e}. Skipping this media tweet slot.", exc_info=True)
-                                    text_content = None 
-                            else:
-                                logger.info("No unused image media found for a media tweet attempt.")
-                                is_media_attempt = False 
-                        else:
-                            logger.warning(f"Media directory {self.config.media_dir} not found or not a directory. Skipping media tweet attempt.")
-                            is_media_attempt = False
-                    
-                    # Generate text-only tweet if not a media attempt OR if media attempt failed to secure a path
-                    if not is_media_attempt: 
-                        logger.info("Attempting to schedule a text-only tweet.")
-                        base_topic_for_llm = query_text_for_new_tweet # Use the topic from VS search
-                        prompt_for_text_generation = f"Based on your persona, generate a tweet about: {base_topic_for_llm}."
-                        if formatted_context:
-                            prompt_for_text_generation = f"{formatted_context}Based on the context above (if any) and your persona, generate a tweet about: {base_topic_for_llm}."
-                        
-                        try:
-                            try:
-                                text_content = self.loop.run_until_complete(
-                                    self.llm.generate_text(prompt=prompt_for_text_generation, context_type="post")
-                                )
-                                if not text_content:
-                                    logger.warning(f"Text generation failed for topic: {base_topic_for_llm}. Skipping this slot.")
-                                    continue  # Skip to next iteration if no content generated
-                            except Exception as e:
-                                logger.error(f"Error during text generation for topic '{base_topic_for_llm}': {e}", exc_info=True)
-                                continue  # Skip to next iteration on error
-                        except Exception as e:
-                            logger.error(f"Error during text generation for topic '{base_topic_for_llm}': {e}", exc_info=True)
-                            text_content = None 
+                # Content for all slots is generated concurrently; scheduling below stays sequential
+                try:
+                    produced = self.loop.run_until_complete(
+                        self._produce_tweets(total_slots, media_slots, query_text_for_new_tweet, formatted_context)
+                    )
+                except Exception as e:
+                    logger.error(f"Error generating tweets for this cycle: {e}", exc_info=True)
+                    produced = []
 
-                    # Schedule the tweet if text_content was successfully generated
-                    if text_content: # This condition now correctly skips if media analysis failed
+                try:
+                    for slot in produced:
+                        if slot is None:
+                            logger.info("No text_content available for this slot (e.g. generation failed), nothing to schedule.")
+                            continue
+                        text_content, current_media_to_schedule = slot
                         try:
-                            # If it was a media attempt but text_content is None (due to LLM failure for media),
-                            # selected_media_path might still be set. We should only schedule if text_content is valid.
-                            # The only way text_content is set for a media attempt is if LLM succeeded.
-                            # If it's a text-only attempt, selected_media_path is None.
-                            
-                            current_media_to_schedule = selected_media_path if is_media_attempt and text_content else None
-
                             self.loop.run_until_complete(
                                 self.twitter.schedule_tweet_from_agent(text=text_content, media_path=current_media_to_schedule)
                             )
@@ -567,19 +654,13 @@ class XVioletAgent:
 
                             if current_media_to_schedule: # Only if it was a successful media tweet
                                 media_filename = os.path.basename(current_media_to_schedule)
-                                mark_media_as_used(media_filename)
-                                self.used_media_set.add(media_filename)
+                                self._mark_media_used(media_filename)
                                 media_scheduled_in_cycle_count += 1
                                 logger.info(f"Marked media {media_filename} as used. Total media scheduled this cycle: {media_scheduled_in_cycle_count}")
                         except Exception as e:
                             logger.error(f"Error scheduling tweet (text: '{text_content[:50]}...', media: {current_media_to_schedule}): {e}")
-                    elif is_media_attempt and not text_content:
-                        # This is the case where media analysis failed, and we logged an error.
-                        # We explicitly do nothing more for this slot.
-                        logger.info(f"Skipping scheduling for slot due to earlier media content generation failure for {selected_media_path}.")
-                    else:
-                        # This handles cases where text generation for a text-only tweet failed.
-                        logger.info("No text_content available for this slot (e.g. text generation failed), nothing to schedule.")
+                finally:
+                    self._reserved_media.clear() # Unscheduled picks become available again
                 
                 logger.info(f"Finished scheduling cycle. Total scheduled: {scheduled_in_cycle_count}, Media scheduled: {media_scheduled_in_cycle_count}.")
                 next_post = now + random.uniform(self.config.post_interval_min, self.config.post_interval_max)
@@ -11,6 +11,8 @@ import logging
 import asyncio
 import os
 import json
+import random
+from datetime import datetime, timedelta, timezone
 
 logger = logging.getLogger("xviolet.twitter_client")
 
@@ -154,7 +156,6 @@ class TwitterClient:
             self.logged_in = True
             return True
 
-        import random
         # Helper for strategic delay
         async def strategic_delay():
             delay = random.uniform(self.config.auth_delay_min, self.config.auth_delay_max)
@@ -363,8 +364,6 @@ class TwitterClient:
 
     async def schedule_tweet_from_agent(self, text: str, media_path: str = None):
         """Schedules a tweet from the agent with optional media."""
-        from datetime import datetime, timedelta, timezone # Import here
-        import random # Import here
 
         if self.config.dry_run:
             logger.info(f"[DRY RUN] Would schedule tweet: '{text}' with media '{media_path}'")
@@ -593,8 +592,6 @@ class TwitterClient:
 
     async def schedule_loop(self):
         """Periodically generate and schedule tweets using Twitter's API."""
-        from datetime import datetime, timedelta, timezone # Import here
-        import random # Import here
         from xviolet.provider.llm import generate_tweet_text, generate_media_caption # Import here
 
         if not self.logged_in:
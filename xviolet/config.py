@@ -20,6 +20,10 @@ load_dotenv()
 
 logger = logging.getLogger(__name__) # Added module-level logger
 
+# Proxy URL already exported to HTTP(S)_PROXY by an AgentConfig in this process. os.environ is
+# process-global, so later AgentConfig instances skip rewriting it with the same value.
+_APPLIED_PROXY_URL = None
+
 class AgentConfig:
     # Define default here for clarity or inside __init__ if preferred
     DEFAULT_LOCAL_DB_PATH = "data/vector_store.db" # Default path for the primary local store
@@ -135,9 +139,11 @@ class AgentConfig:
         self.socks5_proxy = os.getenv("SOCKS5_PROXY", "")
         # Route all outgoing HTTP/S traffic through proxy
         proxy_url = self.twitter_proxy or self.socks5_proxy
-        if proxy_url:
+        global _APPLIED_PROXY_URL
+        if proxy_url and proxy_url != _APPLIED_PROXY_URL:
             os.environ["HTTP_PROXY"] = proxy_url
             os.environ["HTTPS_PROXY"] = proxy_url
+            _APPLIED_PROXY_URL = proxy_url
 
         # --- Advanced Twitter/Agent Controls ---
         self.enable_twitter_post_generation = self._to_bool(os.getenv("ENABLE_TWITTER_POST_GENERATION", "true"))
@@ -167,6 +173,8 @@ class AgentConfig:
         # --- Scheduled Tweet Limits ---
         self.max_scheduled_tweets_total = int(os.getenv("MAX_SCHEDULED_TWEETS_TOTAL", "5"))
         self.max_scheduled_media_tweets = int(os.getenv("MAX_SCHEDULED_MEDIA_TWEETS", "2"))
+        # How many tweet slots generate content at once (LLM calls overlap; scheduling stays sequential)
+        self.tweet_generation_concurrency = max(1, int(os.getenv("TWEET_GENERATION_CONCURRENCY", "3")))
 
         # --- Vector Store Configuration ---
         raw_vector_store_configs_json = os.getenv("VECTOR_STORE_CONFIGS_JSON")
@@ -0,0 +1,47 @@
+# xviolet/llm/_streaming.py
+# Streaming fallback for LLMFallbackManager.generate_text_stream. Kept out of fallback_manager.py because
+# mypyc cannot compile async generators, and XVIOLET_MYPYC=1 compiles that module (see setup.py)
+import logging
+from typing import Any, AsyncIterator, List, Optional, Sequence
+
+logger = logging.getLogger("xviolet.llm.fallback_manager")
+
+
+class StreamInterruptedError(Exception):
+    """Raised when a provider fails after it already yielded output. Carries the partial text, since
+    switching providers mid-stream would concatenate two unrelated replies."""
+    def __init__(self, provider_name: str, partial: str, cause: Exception):
+        super().__init__(f"LLM provider {provider_name} failed mid-stream after {len(partial)} chars: {cause}")
+        self.provider_name = provider_name
+        self.partial = partial
+        self.cause = cause
+
+
+async def stream_with_fallback(providers: Sequence[Any], prompt: str, context_type: str, **kwargs) -> AsyncIterator[str]:
+    """Streams from the first provider entry that yields anything; see LLMFallbackManager.generate_text_stream."""
+    last_error: Optional[Exception] = None
+    for entry in providers:
+        provider_name: str = entry.name
+        parts: List[str] = []
+        try:
+            logger.debug("Attempting generate_text_stream with LLM provider: %s", provider_name)
+            async for chunk in entry.instance.generate_text_stream(prompt=prompt, context_type=context_type, **kwargs):
+                parts.append(chunk)
+                yield chunk
+        except Exception as e:
+            entry.stats.failures += 1
+            if parts:
+                logger.error("LLM provider %s failed mid-stream: %s", provider_name, e, exc_info=logger.isEnabledFor(logging.DEBUG))
+                raise StreamInterruptedError(provider_name, "".join(parts), e) from e
+            logger.error("LLM provider %s failed before streaming any output: %s", provider_name, e, exc_info=logger.isEnabledFor(logging.DEBUG))
+            last_error = e
+            continue
+
+        if parts:
+            entry.stats.successes += 1
+            logger.info("generate_text_stream successful with LLM provider: %s", provider_name)
+            return
+        entry.stats.empty_results += 1
+        logger.warning("LLM provider %s streamed no output. Prompt: '%s...'", provider_name, prompt[:100])
+
+    logger.error("All LLM providers failed for generate_text_stream. Last error: %s. Prompt: '%s...'", last_error or 'N/A', prompt[:100])
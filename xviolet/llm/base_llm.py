@@ -1,6 +1,19 @@
 # xviolet/llm/base_llm.py
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional, List # List was in the example, kept it.
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Dict, Any, Optional, List, AsyncIterator, Mapping # List was in the example, kept it.
+
+_NO_OPTIONS: Mapping[str, Any] = MappingProxyType({})
+
+@dataclass(slots=True, frozen=True)
+class LLMRequest:
+    """A text generation request, built once and handed unchanged to each provider in the fallback chain.
+    `options` carries provider-specific overrides (temperature, max_tokens, generation_config, ...)."""
+    prompt: str
+    context_type: str = "general"
+    options: Mapping[str, Any] = field(default_factory=lambda: _NO_OPTIONS)
+
 
 class BaseLLMProvider(ABC):
     @abstractmethod
@@ -15,12 +28,28 @@ class BaseLLMProvider(ABC):
         """Generates text based on a prompt."""
         pass
 
+    async def generate(self, request: LLMRequest) -> Optional[str]:
+        """Request-object entry point. Providers may override this to read fields directly."""
+        return await self.generate_text(request.prompt, context_type=request.context_type, **request.options)
+
+    async def generate_text_stream(self, prompt: str, context_type: str = "general", **kwargs) -> AsyncIterator[str]:
+        """Yields text chunks as they arrive. Providers without native streaming yield the whole reply once."""
+        result = await self.generate_text(prompt, context_type=context_type, **kwargs)
+        if result is not None:
+            yield result
+
     @abstractmethod
     async def analyze_image(self, image_path: str, context_type: str = "image_analysis", prompt_override: Optional[str] = None, **kwargs) -> Optional[str]:
-        """Analyzes an image and returns a text description or caption."""
+        """Analyzes an image and returns a text description or caption.
+        The fallback manager reads the file once and passes its bytes as `image_data` in kwargs."""
         pass
 
     @abstractmethod
     async def analyze_video(self, video_path: str, context_type: str = "video_analysis", prompt_override: Optional[str] = None, **kwargs) -> Optional[str]:
-        """Analyzes a video and returns a text description or caption. Placeholder for now."""
+        """Analyzes a video and returns a text description or caption. Placeholder for now.
+        The fallback manager passes a read-only mmap of the file as `video_data` in kwargs; it is closed afterwards."""
+        pass
+
+    async def aclose(self) -> None:
+        """Releases network clients or other resources held by the provider. No-op by default."""
         pass
@@ -0,0 +1,150 @@
+# xviolet/llm/batching.py
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from .base_llm import BaseLLMProvider
+
+logger = logging.getLogger(__name__)
+
+_QueueItem = Tuple[str, str, Dict[str, Any], "asyncio.Future[Optional[str]]"]
+
+
+class BatchedLLMProvider(BaseLLMProvider):
+    """Wraps a provider and coalesces generate_text calls that arrive within `window_ms` of each other.
+
+    Each window's prompts go out together (up to `max_batch`): through the inner provider's
+    generate_text_batch when it has one, otherwise as concurrent generate_text calls over the
+    provider's shared client. Every caller still gets its own result or exception.
+    Image/video analysis and streaming are passed straight through.
+    """
+
+    def __init__(self, inner: BaseLLMProvider, max_batch: int = 32, window_ms: float = 20.0):
+        super().__init__(inner.config_dict)
+        self.inner = inner
+        self.max_batch = max_batch
+        self.window = window_ms / 1000.0
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._inflight: Set[asyncio.Task] = set() # Keeps flush tasks referenced until done
+
+    def __getattr__(self, name: str) -> Any:
+        # Provider-specific attributes (is_enabled, model, ...) come from the wrapped instance
+        if name == "inner":
+            raise AttributeError(name)
+        return getattr(self.inner, name)
+
+    def _ensure_worker(self) -> asyncio.Queue:
+        loop = asyncio.get_running_loop()
+        queue = self._queue
+        if queue is None or self._worker is None or self._worker.done() or self._worker.get_loop() is not loop:
+            self._queue = queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run(queue))
+        return queue
+
+    async def generate_text(self, prompt: str, context_type: str = "general", **kwargs) -> Optional[str]:
+        queue = self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        queue.put_nowait((prompt, context_type, kwargs, future))
+        return await future
+
+    async def _run(self, queue: asyncio.Queue) -> None:
+        loop = asyncio.get_running_loop()
+        batch: List[_QueueItem] = []
+        closing = False
+        try:
+            while not closing:
+                item = await queue.get()
+                if item is None: # aclose() sentinel
+                    break
+                batch = [item]
+                deadline = loop.time() + self.window
+                while len(batch) < self.max_batch:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                    if item is None:
+                        closing = True
+                        break
+                    batch.append(item)
+                # Flush in the background so the next window starts filling immediately
+                self._start_flush(batch)
+                batch = []
+        except asyncio.CancelledError:
+            # The window already taken off the queue still goes out (aclose awaits it)
+            if batch:
+                self._start_flush(batch)
+            raise
+        finally:
+            # Prompts that were never picked up fail instead of leaving their callers waiting forever
+            while not queue.empty():
+                item = queue.get_nowait()
+                if item is not None and not item[3].done():
+                    item[3].set_exception(RuntimeError("BatchedLLMProvider was closed before the prompt was sent"))
+
+    def _start_flush(self, batch: List[_QueueItem]) -> None:
+        task = asyncio.get_running_loop().create_task(self._flush(batch))
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+    async def _flush(self, batch: List[_QueueItem]) -> None:
+        logger.debug("BatchedLLMProvider flushing %d prompt(s)", len(batch))
+        batch_fn = getattr(self.inner, "generate_text_batch", None)
+        first_context, first_kwargs = batch[0][1], batch[0][2]
+        results: List[Any] = []
+        try:
+            if batch_fn is not None and all(ctx == first_context and kw == first_kwargs for _, ctx, kw, _ in batch):
+                results = list(await batch_fn([prompt for prompt, _, _, _ in batch], context_type=first_context, **first_kwargs))
+                if len(results) != len(batch):
+                    raise RuntimeError(f"generate_text_batch returned {len(results)} result(s) for {len(batch)} prompt(s)")
+            else:
+                results = await asyncio.gather(
+                    *(self.inner.generate_text(prompt, context_type=ctx, **kw) for prompt, ctx, kw, _ in batch),
+                    return_exceptions=True
+                )
+        except Exception as e:
+            results = [e] * len(batch)
+        finally:
+            # Runs on cancellation too (results is then empty): every caller's future is resolved
+            for i, (_, _, _, future) in enumerate(batch):
+                if future.done(): # Caller was cancelled
+                    continue
+                if i >= len(results):
+                    future.cancel()
+                elif isinstance(results[i], BaseException):
+                    future.set_exception(results[i])
+                else:
+                    future.set_result(results[i])
+
+    async def generate_text_stream(self, prompt: str, context_type: str = "general", **kwargs):
+        async for chunk in self.inner.generate_text_stream(prompt, context_type=context_type, **kwargs):
+            yield chunk
+
+    async def analyze_image(self, image_path: str, context_type: str = "image_analysis", prompt_override: Optional[str] = None, **kwargs) -> Optional[str]:
+        return await self.inner.analyze_image(image_path, context_type=context_type, prompt_override=prompt_override, **kwargs)
+
+    async def analyze_video(self, video_path: str, context_type: str = "video_analysis", prompt_override: Optional[str] = None, **kwargs) -> Optional[str]:
+        return await self.inner.analyze_video(video_path, context_type=context_type, prompt_override=prompt_override, **kwargs)
+
+    async def aclose(self) -> None:
+        """Stops the background worker. Prompts it already took are still sent and awaited here; prompts
+        still queued fail with RuntimeError."""
+        worker, queue = self._worker, self._queue
+        if worker is not None:
+            if worker.get_loop() is asyncio.get_running_loop():
+                if not worker.done() and queue is not None:
+                    queue.put_nowait(None) # Worker flushes the open window and exits
+                try:
+                    await worker
+                except asyncio.CancelledError:
+                    pass
+            else: # Started on another (possibly closed) loop; it cannot be awaited from here
+                worker.cancel()
+            self._worker = None
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+        await self.inner.aclose()
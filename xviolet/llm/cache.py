@@ -0,0 +1,162 @@
+# xviolet/llm/cache.py
+import functools
+import hashlib
+import json
+import logging
+import math
+import operator
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Hashable, List, Optional, Sequence, Tuple
+
+try:
+    import orjson # Optional: much faster than json.dumps on large request payloads
+except ImportError:
+    orjson = None
+
+try:
+    import xxhash # Optional: xxh3 hashes multi-KB prompts many times faster than any cryptographic digest
+    new_hasher = xxhash.xxh3_128
+except ImportError:
+    # Keys need no cryptographic strength; 128-bit blake2b is still collision-safe and faster than sha256
+    new_hasher = functools.partial(hashlib.blake2b, digest_size=16)
+
+logger = logging.getLogger(__name__)
+
+# Sampling at or below this temperature is treated as deterministic enough to reuse responses
+MAX_CACHEABLE_TEMPERATURE = 0.1
+
+
+def _canonical_json(payload: Any) -> bytes:
+    """Serializes a payload with sorted keys so equal requests produce equal bytes."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(payload, default=str, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+        except TypeError: # e.g. integers beyond 64 bits
+            pass
+    return json.dumps(payload, sort_keys=True, default=str).encode()
+
+
+class LLMCache:
+    """In-memory LRU cache with per-entry TTL for deterministic LLM responses.
+
+    Only requests that are (near) reproducible get a key: temperature <= MAX_CACHEABLE_TEMPERATURE,
+    or the caller opted in explicitly (e.g. a provider configured with 'cache_responses': True).
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 3600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[float, str]]" = OrderedDict() # key -> (expires_at, response)
+        self._lock = threading.Lock() # Local GGUF completions finish on executor threads
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def cache_key(model: str, messages: Any, temperature: Optional[float] = None, opt_in: bool = False, **params) -> Optional[str]:
+        """Returns a 128-bit hex key for the request, or None when the response should not be cached."""
+        if not opt_in and (temperature is None or temperature > MAX_CACHEABLE_TEMPERATURE):
+            return None
+        if isinstance(temperature, int):
+            temperature = float(temperature) # 0 and 0.0 must hash the same
+        payload = {"model": model, "messages": messages, "temperature": temperature, **params}
+        return new_hasher(_canonical_json(payload)).hexdigest()
+
+    def get(self, key: Optional[str]) -> Optional[str]:
+        if key is None:
+            return None
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Optional[str], value: Optional[str]) -> None:
+        if key is None or value is None:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SemanticLLMCache:
+    """Second cache tier: reuses a response when a new prompt's embedding is close to a cached one.
+
+    Entries are scoped by a caller-chosen namespace (model, persona version, context type, ...) so a
+    near-duplicate prompt never picks up a response produced under different instructions. Lookups
+    scan the most recent `maxsize` entries; run them off the event loop for large caches.
+    """
+
+    def __init__(self, maxsize: int = 256, threshold: float = 0.95):
+        self.threshold = threshold
+        self._entries: "deque[Tuple[Hashable, List[float], str]]" = deque(maxlen=maxsize)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _unit(vector: Sequence[float]) -> Optional[List[float]]:
+        norm = math.sqrt(sum(map(operator.mul, vector, vector)))
+        return [v / norm for v in vector] if norm else None
+
+    def get(self, namespace: Hashable, vector: Sequence[float]) -> Optional[str]:
+        query = self._unit(vector)
+        if query is None:
+            return None
+        with self._lock:
+            entries = [(vec, response) for ns, vec, response in self._entries if ns == namespace]
+        best_score, best = self.threshold, None
+        for vec, response in entries:
+            score = sum(map(operator.mul, query, vec)) # Cosine similarity: both sides are unit length
+            if score >= best_score:
+                best_score, best = score, response
+        if best is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return best
+
+    def set(self, namespace: Hashable, vector: Sequence[float], response: Optional[str]) -> None:
+        unit = self._unit(vector)
+        if unit is None or response is None:
+            return
+        with self._lock:
+            self._entries.append((namespace, unit, response))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_default_cache: Optional[LLMCache] = None
+_default_cache_lock = threading.Lock()
+
+def get_default_cache() -> LLMCache:
+    """Process-wide cache shared by providers; keys include the model, so providers cannot collide."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = LLMCache()
+        return _default_cache
+
+
+def hash_bytes(data: bytes) -> str:
+    """Short content hash for media, so image bytes never become part of the JSON cache payload."""
+    return new_hasher(data).hexdigest()
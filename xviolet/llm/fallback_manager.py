@@ -1,27 +1,153 @@
 # xviolet/llm/fallback_manager.py
+import asyncio
+import contextlib
+import graphlib
+import importlib
 import logging
-from typing import Dict, Any, Optional, List, Type 
+import mmap
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Any, Optional, List, Type, Callable, Tuple, AsyncIterator, Awaitable
 
-# Import base and specific providers for type hinting and instantiation
-from .base_llm import BaseLLMProvider
-from .gemini_provider import GeminiLLMProvider 
-from .lite_llm_provider import LiteLLMProvider # ADDED
-from .local_llm_provider import LocalGGUFProvider # ADDED
-# Import other providers like Anthropic, OpenAI etc. when they are created
-# from .anthropic_provider import AnthropicLLMProvider 
-# from .openai_provider import OpenAILLMProvider
+# Only the base interface is imported eagerly. Concrete providers are resolved lazily
+# through PROVIDER_REGISTRY so that e.g. llama-cpp is never imported unless 'local_gguf' is used.
+from .base_llm import BaseLLMProvider, LLMRequest
+from ._streaming import StreamInterruptedError, stream_with_fallback
+
+try:
+    from opentelemetry import trace as otel_trace
+    _tracer = otel_trace.get_tracer(__name__)
+except ImportError: # Tracing is optional; spans become no-ops without opentelemetry
+    otel_trace = None
+    _tracer = None
 
 logger = logging.getLogger(__name__)
 
+
+def _lazy_provider(module_name: str, class_name: str) -> Callable[[], Type[BaseLLMProvider]]:
+    """Returns a factory that imports `class_name` from `module_name` on first call."""
+    def factory() -> Type[BaseLLMProvider]:
+        module = importlib.import_module(module_name, package=__package__)
+        return getattr(module, class_name)
+    return factory
+
+
+# Maps provider type name (the 'type' key in llm_provider_configs) to a factory returning the class.
+PROVIDER_REGISTRY: Dict[str, Callable[[], Type[BaseLLMProvider]]] = {
+    'gemini': _lazy_provider('.gemini_provider', 'GeminiLLMProvider'),
+    'litellm': _lazy_provider('.lite_llm_provider', 'LiteLLMProvider'),
+    'local_gguf': _lazy_provider('.local_llm', 'LocalGGUFProvider'),
+}
+
+
+def register_provider(name: str):
+    """
+    Class decorator registering an additional LLM provider type, e.g.:
+
+        @register_provider('anthropic')
+        class AnthropicLLMProvider(BaseLLMProvider): ...
+    """
+    def deco(cls: Type[BaseLLMProvider]) -> Type[BaseLLMProvider]:
+        PROVIDER_REGISTRY[name] = lambda: cls
+        return cls
+    return deco
+
+@dataclass(slots=True)
+class ProviderStats:
+    """Per-provider call counters, updated by the fallback loops."""
+    successes: int = 0
+    failures: int = 0 # Calls that raised
+    empty_results: int = 0 # Calls that returned None
+
+
+@dataclass(slots=True)
+class ProviderEntry:
+    """An initialized provider in fallback order. Slotted for cheap attribute access in the dispatch loops."""
+    name: str
+    instance: BaseLLMProvider
+    type: str
+    stats: ProviderStats = field(default_factory=ProviderStats)
+
+
+def _provider_span(method: str, provider_name: str):
+    """Span around one provider attempt; exceptions are recorded on the span without eager formatting."""
+    if _tracer is None:
+        return contextlib.nullcontext()
+    return _tracer.start_as_current_span(f"llm.{method}", attributes={"llm.provider": provider_name},
+                                         record_exception=True, set_status_on_exception=True)
+
+
+def _annotate_span(span, log_label: str, log_value: Any) -> None:
+    # Only stringify the (lazy) preview when an exporter will actually see it
+    if span is not None and span.is_recording():
+        span.set_attribute(f"llm.{log_label.lower().replace(' ', '_')}", str(log_value))
+
+
+class _LazyStr:
+    """Defers building a log argument (e.g. a prompt preview slice) until the record is actually emitted."""
+    __slots__ = ('_fn',)
+
+    def __init__(self, fn: Callable[[], str]):
+        self._fn = fn
+
+    def __str__(self) -> str:
+        return self._fn()
+
+
+@dataclass(frozen=True)
+class LLMTask:
+    """One step for LLMFallbackManager.run_graph. `factory(manager, dep_results)` returns the awaitable for
+    the step; dep_results maps each name in `deps` to that step's result."""
+    factory: Callable[[Any, Dict[str, Any]], Awaitable[Any]]
+    deps: Tuple[str, ...] = ()
+
+    @classmethod
+    def from_llm(cls, method: str, deps: Tuple[str, ...] = (), **kwargs) -> "LLMTask":
+        """Step calling a manager method, e.g. LLMTask.from_llm("generate_text", prompt="Summarize: {caption}",
+        deps=("caption",)). With deps, the prompt is filled in with str.format_map(dep_results)."""
+        def factory(manager, dep_results: Dict[str, Any]):
+            call_kwargs = kwargs
+            if dep_results and isinstance(kwargs.get("prompt"), str):
+                call_kwargs = {**kwargs, "prompt": kwargs["prompt"].format_map(dep_results)}
+            return getattr(manager, method)(**call_kwargs)
+        return cls(factory, tuple(deps))
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _config_key(value: Any) -> Any:
+    """Builds a hashable, order-independent key from a (possibly nested) provider config value."""
+    if isinstance(value, dict):
+        return tuple(sorted((str(k), _config_key(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_config_key(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(_config_key(v) for v in value)
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        # Unhashable objects (e.g. a mutable persona helper) are only shared when it is the same object
+        return ('__id__', id(value))
+
+
 class LLMFallbackManager: 
-    def __init__(self, llm_provider_configs: List[Dict[str, Any]]):
+    def __init__(self, llm_provider_configs: List[Dict[str, Any]], specialize: bool = True):
         """
         Initializes the LLMFallbackManager with a list of LLM provider configurations.
         Each configuration in the list should specify 'type', 'config', 'name', and 'enabled'.
         Example: [{'type': 'gemini', 'name': 'gemini_primary', 'enabled': True, 'config': {'api_key': '...', ...}}]
+        With `specialize`, a single-provider setup skips the fallback loop and calls the provider directly.
         """
-        self.providers: List[Dict[str, Any]] = [] # Stores {'name': str, 'instance': BaseLLMProvider, 'type': str}
+        providers: List[ProviderEntry] = []
 
+        # Resolve classes first (cheap), then construct instances concurrently: provider ctors may
+        # block on network or on loading a multi-GB GGUF, so startup costs max() instead of sum().
+        pending: List[Tuple[str, str, Dict[str, Any], Type[BaseLLMProvider]]] = []
         for provider_config_item in llm_provider_configs:
             provider_type = provider_config_item.get('type')
             provider_name = provider_config_item.get('name', provider_type) # Default name to type
@@ -38,110 +164,231 @@ class LLMFallbackManager:
 
             ProviderClass = self._get_llm_provider_class(provider_type)
             if ProviderClass:
-                try:
-                    instance = ProviderClass(provider_specific_config)
-                    self.providers.append({'name': provider_name, 'instance': instance, 'type': provider_type})
-                    logger.info(f"Successfully initialized LLM provider: {provider_name} (type: {provider_type})")
-                except Exception as e:
-                    logger.error(f"Failed to initialize LLM provider {provider_name} (type: {provider_type}): {e}", exc_info=True)
+                pending.append((provider_name or provider_type, provider_type, provider_specific_config, ProviderClass))
             else:
                 # _get_llm_provider_class logs error for unknown type
                 logger.warning(f"Skipping LLM provider '{provider_name}' due to unknown type '{provider_type}'.")
-        
-        if not self.providers:
+
+        if pending:
+            # Identical (type, config) entries in this list share one instance. Sharing stops at the manager:
+            # aclose() closes every instance it holds, which must not reach another manager's providers.
+            # (Local GGUF weights are still shared process-wide by local_llm's model cache.)
+            keys = [(provider_type, _config_key(provider_config)) for _, provider_type, provider_config, _ in pending]
+            to_build: Dict[Tuple[str, Any], Tuple[str, str, Dict[str, Any], Type[BaseLLMProvider]]] = {}
+            for key, item in zip(keys, pending):
+                if key not in to_build:
+                    to_build[key] = item
+                else:
+                    logger.info(f"Reusing the LLM provider instance built for an identical config for '{item[0]}' (type: {item[1]})")
+
+            with ThreadPoolExecutor(max_workers=len(to_build), thread_name_prefix="llm-init") as executor:
+                built = list(executor.map(lambda item: self._safe_init(*item), to_build.values()))
+            instances_by_key: Dict[Tuple[str, Any], Optional[BaseLLMProvider]] = dict(zip(to_build, built))
+
+            # Re-assemble in config order so fallback priority is unchanged
+            for key, (provider_name, provider_type, provider_config, _) in zip(keys, pending):
+                instance = instances_by_key.get(key)
+                if instance is not None:
+                    micro_batch = provider_config.get('micro_batch')
+                    if micro_batch:
+                        # e.g. 'micro_batch': {'max_batch': 32, 'window_ms': 20}, or True for the defaults
+                        from .batching import BatchedLLMProvider
+                        instance = BatchedLLMProvider(instance, **(micro_batch if isinstance(micro_batch, dict) else {}))
+                    providers.append(ProviderEntry(name=provider_name, instance=instance, type=provider_type))
+
+        # Fixed after init: a tuple signals that, and the emptiness check is answered once here
+        self.providers: Tuple[ProviderEntry, ...] = tuple(providers)
+        self._has_providers: bool = bool(self.providers)
+        # The dispatch path every call goes through; a separate attribute rather than rebinding the _dispatch
+        # method, which mypy (and so the mypyc build) rejects
+        self._dispatch_fn: Callable[..., Awaitable[Optional[str]]] = self._dispatch
+
+        if not self._has_providers:
             logger.warning("LLMFallbackManager initialized with no valid (enabled) LLM providers. It will not be functional.")
+        elif specialize and len(self.providers) == 1:
+            # Nothing to fall back to, so bind the loop-free path once instead of re-deciding per call
+            self._dispatch_fn = self._dispatch_single
+
+    @staticmethod
+    def _safe_init(provider_name: str, provider_type: str, provider_specific_config: Dict[str, Any],
+                   ProviderClass: Type[BaseLLMProvider]) -> Optional[BaseLLMProvider]:
+        """Instantiates a provider, logging and returning None on failure."""
+        try:
+            instance = ProviderClass(provider_specific_config)
+            logger.info(f"Successfully initialized LLM provider: {provider_name} (type: {provider_type})")
+            return instance
+        except Exception as e:
+            logger.error(f"Failed to initialize LLM provider {provider_name} (type: {provider_type}): {e}", exc_info=True)
+            return None
 
     def _get_llm_provider_class(self, provider_type_name: str) -> Optional[Type[BaseLLMProvider]]:
-        if provider_type_name == 'gemini':
-            return GeminiLLMProvider
-        elif provider_type_name == 'litellm':
-            return LiteLLMProvider # UPDATED
-        elif provider_type_name == 'local_gguf':
-            return LocalGGUFProvider # UPDATED
-        # elif provider_type_name == 'anthropic':
-        #     return AnthropicLLMProvider # Example for future
-        # elif provider_type_name == 'openai':
-        #     return OpenAILLMProvider # Example for future
-        else:
+        factory = PROVIDER_REGISTRY.get(provider_type_name)
+        if factory is None:
             logger.error(f"Unknown LLM provider type: {provider_type_name}")
             return None
-
-    async def generate_text(self, prompt: str, context_type: str = "general", **kwargs) -> Optional[str]:
-        last_error = None
-        if not self.providers:
-            logger.error("No LLM providers configured/initialized in LLMFallbackManager.")
+        try:
+            return factory()
+        except ImportError as e:
+            logger.error(f"Could not import LLM provider type '{provider_type_name}': {e}")
             return None
 
-        for provider_wrapper in self.providers:
-            provider_instance = provider_wrapper['instance']
-            provider_name = provider_wrapper['name']
-            try:
-                logger.debug(f"Attempting generate_text with LLM provider: {provider_name}")
-                result = await provider_instance.generate_text(prompt=prompt, context_type=context_type, **kwargs)
-                if result is not None: 
-                    logger.info(f"generate_text successful with LLM provider: {provider_name}")
-                    return result
-                else:
-                    logger.warning(f"LLM provider {provider_name} returned None for generate_text. Prompt: '{prompt[:100]}...'")
-            except Exception as e:
-                logger.error(f"LLM provider {provider_name} failed during generate_text: {e}", exc_info=True)
-                last_error = e 
-        
-        logger.error(f"All LLM providers failed for generate_text. Last error: {last_error if last_error else 'N/A'}. Prompt: '{prompt[:100]}...'")
-        return None
-
-    async def analyze_image(self, image_path: str, context_type: str = "image_analysis", prompt_override: Optional[str] = None, **kwargs) -> Optional[str]:
-        last_error = None
-        if not self.providers:
+    async def _dispatch(self, method: str, log_label: str, log_value: Any, *call_args, **call_kwargs) -> Optional[str]:
+        """Runs `method` on each provider in order and returns the first non-None result.
+        Shared by generate_text / analyze_image / analyze_video so fallback behaviour lives in one place."""
+        last_error: Optional[Exception] = None
+        if not self._has_providers:
             logger.error("No LLM providers configured/initialized in LLMFallbackManager.")
             return None
 
-        for provider_wrapper in self.providers:
-            provider_instance = provider_wrapper['instance']
-            provider_name = provider_wrapper['name']
+        for entry in self.providers:
+            provider_name: str = entry.name
             try:
-                logger.debug(f"Attempting analyze_image with LLM provider: {provider_name}")
-                result = await provider_instance.analyze_image(image_path=image_path, context_type=context_type, prompt_override=prompt_override, **kwargs)
+                logger.debug("Attempting %s with LLM provider: %s", method, provider_name)
+                with _provider_span(method, provider_name) as span:
+                    _annotate_span(span, log_label, log_value)
+                    result: Optional[str] = await getattr(entry.instance, method)(*call_args, **call_kwargs)
                 if result is not None:
-                    logger.info(f"analyze_image successful with LLM provider: {provider_name}")
+                    entry.stats.successes += 1
+                    logger.info("%s successful with LLM provider: %s", method, provider_name)
                     return result
                 else:
-                    logger.warning(f"LLM provider {provider_name} returned None for analyze_image. Image path: '{image_path}'")
+                    entry.stats.empty_results += 1
+                    logger.warning("LLM provider %s returned None for %s. %s: '%s'", provider_name, method, log_label, log_value)
             except Exception as e:
-                logger.error(f"LLM provider {provider_name} failed during analyze_image: {e}", exc_info=True)
+                entry.stats.failures += 1
+                logger.error("LLM provider %s failed during %s: %s", provider_name, method, e, exc_info=logger.isEnabledFor(logging.DEBUG))
                 last_error = e
-        
-        logger.error(f"All LLM providers failed for analyze_image. Last error: {last_error if last_error else 'N/A'}. Image path: '{image_path}'")
+
+        logger.error("All LLM providers failed for %s. Last error: %s. %s: '%s'", method, last_error or 'N/A', log_label, log_value)
         return None
 
+    async def _dispatch_single(self, method: str, log_label: str, log_value: Any, *call_args, **call_kwargs) -> Optional[str]:
+        """_dispatch for exactly one provider: same stats and error handling, no loop or emptiness check."""
+        entry = self.providers[0]
+        try:
+            with _provider_span(method, entry.name) as span:
+                _annotate_span(span, log_label, log_value)
+                result: Optional[str] = await getattr(entry.instance, method)(*call_args, **call_kwargs)
+        except Exception as e:
+            entry.stats.failures += 1
+            logger.error("LLM provider %s failed during %s: %s", entry.name, method, e, exc_info=logger.isEnabledFor(logging.DEBUG))
+            return None
+        if result is None:
+            entry.stats.empty_results += 1
+            logger.warning("LLM provider %s returned None for %s. %s: '%s'", entry.name, method, log_label, log_value)
+            return None
+        entry.stats.successes += 1
+        return result
+
+    async def generate(self, request: LLMRequest) -> Optional[str]:
+        return await self._dispatch_fn("generate", "Prompt", _LazyStr(lambda: request.prompt[:100] + "..."), request)
+
+    async def generate_text(self, prompt: str, context_type: str = "general", **kwargs) -> Optional[str]:
+        # Kept for existing callers; the request is built once and shared by every provider attempt
+        return await self.generate(LLMRequest(prompt, context_type, kwargs))
+
+    async def generate_batch(self, prompts: List[str], context_type: str = "general", concurrency: int = 8, **kwargs) -> List[Optional[str]]:
+        """Runs independent prompts concurrently (at most `concurrency` in flight); results keep the input order.
+
+        Each prompt gets the full provider fallback; a prompt that still fails yields None.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run_one(prompt: str) -> Optional[str]:
+            async with semaphore:
+                return await self.generate(LLMRequest(prompt, context_type, kwargs))
+
+        results: List[Optional[str]] = []
+        for i, result in enumerate(await asyncio.gather(*(run_one(prompt) for prompt in prompts), return_exceptions=True)):
+            if isinstance(result, asyncio.CancelledError):
+                raise result # A cancelled prompt means the batch is being cancelled; don't mask it as None
+            if isinstance(result, BaseException):
+                logger.error("Batch prompt %d failed: %s", i, result)
+                result = None
+            results.append(result)
+        return results
+
+    def generate_many(self, prompts: List[str], context_type: str = "general", concurrency: int = 8, **kwargs) -> List[Optional[str]]:
+        """Blocking wrapper around generate_batch for callers without a running event loop."""
+        return asyncio.run(self.generate_batch(prompts, context_type=context_type, concurrency=concurrency, **kwargs))
+
+    async def run_graph(self, tasks: Dict[str, LLMTask]) -> Dict[str, Any]:
+        """Runs dependent LLM steps concurrently: each starts as soon as its own dependencies are done, so
+        independent steps overlap (a, b -> c takes max(a, b) + c). Returns {name: result}.
+
+        Raises graphlib.CycleError for cyclic graphs and ValueError for unknown dependencies. If a step raises,
+        the remaining steps are cancelled and the exception propagates.
+        """
+        order = list(graphlib.TopologicalSorter({name: task.deps for name, task in tasks.items()}).static_order())
+        unknown = set(order) - tasks.keys()
+        if unknown:
+            raise ValueError(f"Unknown task dependencies: {sorted(unknown)}")
+
+        running: Dict[str, asyncio.Future] = {}
+
+        async def run(name: str) -> Any:
+            task = tasks[name]
+            dep_results = {dep: await running[dep] for dep in task.deps}
+            return await task.factory(self, dep_results)
+
+        for name in order: # Dependencies are scheduled before their dependents
+            running[name] = asyncio.ensure_future(run(name))
+        try:
+            results = await asyncio.gather(*running.values())
+        except BaseException:
+            for future in running.values():
+                future.cancel()
+            raise
+        return dict(zip(running, results))
+
+    async def analyze_image(self, image_path: str, context_type: str = "image_analysis", prompt_override: Optional[str] = None, **kwargs) -> Optional[str]:
+        # Read the file once here instead of once per provider attempt; providers use image_data when given
+        if 'image_data' not in kwargs and os.path.isfile(image_path):
+            kwargs['image_data'] = await asyncio.to_thread(_read_file, image_path)
+        return await self._dispatch_fn("analyze_image", "Image path", image_path,
+                                    image_path=image_path, context_type=context_type, prompt_override=prompt_override, **kwargs)
+
     async def analyze_video(self, video_path: str, context_type: str = "video_analysis", prompt_override: Optional[str] = None, **kwargs) -> Optional[str]:
-        last_error = None
-        if not self.providers:
+        # Videos can be large, so providers get a read-only mmap rather than a full in-memory copy
+        video_map = None
+        if 'video_data' not in kwargs and os.path.isfile(video_path) and os.path.getsize(video_path) > 0:
+            with open(video_path, "rb") as f:
+                video_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            if hasattr(video_map, "madvise"):
+                # Providers read it front to back: start readahead now so disk I/O overlaps the request setup
+                video_map.madvise(mmap.MADV_SEQUENTIAL)
+                video_map.madvise(mmap.MADV_WILLNEED)
+            kwargs['video_data'] = video_map
+        try:
+            return await self._dispatch_fn("analyze_video", "Video path", video_path,
+                                        video_path=video_path, context_type=context_type, prompt_override=prompt_override, **kwargs)
+        finally:
+            if video_map is not None:
+                video_map.close()
+
+    def generate_text_stream(self, prompt: str, context_type: str = "general", **kwargs) -> AsyncIterator[str]:
+        """Streams text from the first provider that yields anything. Falls back only before the first chunk;
+        a failure after that raises StreamInterruptedError with the partial output."""
+        if not self._has_providers:
             logger.error("No LLM providers configured/initialized in LLMFallbackManager.")
-            return None
+        return stream_with_fallback(self.providers, prompt, context_type, **kwargs)
 
-        for provider_wrapper in self.providers:
-            provider_instance = provider_wrapper['instance']
-            provider_name = provider_wrapper['name']
+    async def aclose(self) -> None:
+        """Closes every provider once (identical configs share an instance)."""
+        seen = set()
+        for entry in self.providers:
+            if id(entry.instance) in seen:
+                continue
+            seen.add(id(entry.instance))
             try:
-                logger.debug(f"Attempting analyze_video with LLM provider: {provider_name}")
-                result = await provider_instance.analyze_video(video_path=video_path, context_type=context_type, prompt_override=prompt_override, **kwargs)
-                if result is not None:
-                    logger.info(f"analyze_video successful with LLM provider: {provider_name}")
-                    return result
-                else:
-                    logger.warning(f"LLM provider {provider_name} returned None for analyze_video. Video path: '{video_path}'")
+                await entry.instance.aclose()
             except Exception as e:
-                logger.error(f"LLM provider {provider_name} failed during analyze_video: {e}", exc_info=True)
-                last_error = e
-        
-        logger.error(f"All LLM providers failed for analyze_video. Last error: {last_error if last_error else 'N/A'}. Video path: '{video_path}'")
-        return None
+                logger.warning("Error closing LLM provider %s: %s", entry.name, e)
 
     @property
     def is_enabled(self) -> bool:
         """Returns True if there is at least one configured and enabled provider."""
-        return bool(self.providers)
+        return self._has_providers
 
 # The original LLMManager class also had specific methods like:
 # - build_action_prompt (this is Agent-specific logic, should not be here)
@@ -152,40 +399,4 @@ class LLMFallbackManager:
 # Persona handling is now managed within each concrete provider if needed (e.g., GeminiLLMProvider
 # can take a persona object via its config). This manager does not directly handle Persona.
 # The `context_type` and `**kwargs` in the interface methods can be used to pass additional
-# context or parameters that providers might use.I have successfully refactored the `LLMFallbackManager` class in `xviolet/llm/fallback_manager.py`.
-
-**Key Changes Implemented:**
-
-1.  **Removed Inheritance from `BaseLLMProvider`**:
-    *   The class signature was changed from `class LLMFallbackManager(BaseLLMProvider):` to `class LLMFallbackManager:`. The manager now uses `BaseLLMProvider` instances but does not inherit from the interface itself. Its public methods (`generate_text`, `analyze_image`, `analyze_video`) mirror those of `BaseLLMProvider` for consistent usage by the agent.
-
-2.  **Robust Provider Initialization in `__init__`**:
-    *   The `__init__(self, llm_provider_configs: List[Dict[str, Any]])` method was refined to properly initialize providers.
-    *   It iterates through `llm_provider_configs`. For each configuration:
-        *   It checks for an `'enabled'` flag (defaulting to `True`) and skips disabled providers.
-        *   It ensures `'type'` is present.
-        *   It uses the `_get_llm_provider_class` helper to get the appropriate provider class (e.g., `GeminiLLMProvider`).
-        *   If the class is found, it instantiates it with `provider_specific_config` (from `config_entry.get('config', {})`).
-        *   Successfully initialized instances are stored in `self.providers` as dictionaries containing their `name`, `instance`, and `type`.
-        *   Errors during instantiation are logged, and problematic providers are skipped.
-    *   A warning is logged if no providers are successfully initialized.
-    *   The `_get_llm_provider_class` method was already present and correctly maps `'gemini'` to `GeminiLLMProvider` and includes commented-out placeholders for future providers like `LiteLLMProvider` and `LocalGGUFProvider`.
-
-3.  **Full Fallback Logic Implemented**:
-    *   **`async def generate_text(...)`**:
-        *   Checks if `self.providers` is empty; returns `None` if so.
-        *   Iterates through `self.providers`.
-        *   For each provider, it calls `provider_instance.generate_text(...)`.
-        *   If a non-`None` result is returned, that result is immediately returned by the manager.
-        *   If a provider returns `None` (indicating no meaningful response, not necessarily an error), it logs a warning and tries the next provider.
-        *   If a provider raises an exception, the error is logged (with `exc_info=True` for traceback), and the manager tries the next provider. The last error encountered is stored.
-        *   If all providers fail or return `None`, a final error is logged (including the last exception if any), and `None` is returned.
-    *   **`async def analyze_image(...)`**: Implemented with the same fallback logic as `generate_text`, calling `provider_instance.analyze_image(...)`.
-    *   **`async def analyze_video(...)`**: Implemented with the same fallback logic, calling `provider_instance.analyze_video(...)`.
-
-4.  **`is_enabled` Property**:
-    *   An `is_enabled` property was added, returning `True` if `self.providers` is not empty, indicating the manager has at least one functional provider.
-
-The `LLMFallbackManager` is now correctly structured to manage multiple LLM providers and implement the specified fallback strategy for its core methods. It no longer incorrectly inherits from `BaseLLMProvider`.
-
-I will now submit the report.
+# context or parameters that providers might use.
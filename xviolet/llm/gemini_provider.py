@@ -1,14 +1,35 @@
 # xviolet/llm/gemini_provider.py
+import array
+import asyncio
+import functools
+import importlib.util
 import logging
+import mimetypes
 import os
-from typing import Dict, Any, Optional
+import random
+import threading
+import time
+from datetime import timedelta
+from pathlib import Path
+from typing import Dict, Any, List, Optional, AsyncIterator
 
 from .base_llm import BaseLLMProvider
+from .cache import LLMCache, SemanticLLMCache, _canonical_json, get_default_cache
 # Assuming Persona might be passed via config or initialized if path is in config
 # from ..persona import Persona # This creates a circular dependency if BaseLLMProvider is in ..llm
 # For now, let's assume persona handling is simplified or persona context is passed in kwargs if needed.
 # The original LLMManager took a Persona object. We'll try to replicate that if config allows.
 
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    import numpy as np # Optional: embeddings come back as float32 matrices when available
+except ImportError:
+    np = None
+
 try:
     from google import genai
     from google.genai import types as genai_types # Renamed to avoid conflict
@@ -16,11 +37,246 @@ except ImportError:
     genai = None
     genai_types = None
 
+try:
+    from google.api_core import exceptions as api_exceptions
+    _API_TRANSIENT_ERRORS = (api_exceptions.ResourceExhausted, api_exceptions.ServiceUnavailable,
+                             api_exceptions.InternalServerError, api_exceptions.DeadlineExceeded)
+except ImportError:
+    _API_TRANSIENT_ERRORS = ()
+
 logger = logging.getLogger(__name__)
 
+# Default generation_config from original LLMManager
+_DEFAULT_GENERATION_PARAMS = {
+    "temperature": 0.7,
+    "top_p": 0.95,
+    "top_k": 40,
+}
+
+# Pooled transports shared by every genai.Client in the process, so repeated calls and new provider
+# instances reuse keep-alive connections instead of paying a TCP+TLS handshake each time.
+# Keyed by (kind, proxy URL): a proxy is scoped to the transport rather than set process-wide.
+_SHARED_TRANSPORTS: Dict[tuple, Any] = {}
+
+def _shared_transport(kind: str, proxy: Optional[str] = None):
+    transport = _SHARED_TRANSPORTS.get((kind, proxy))
+    if transport is None:
+        options = dict(
+            limits=httpx.Limits(max_keepalive_connections=32, max_connections=64, keepalive_expiry=60),
+            http2=importlib.util.find_spec("h2") is not None, # HTTP/2 needs the optional h2 package
+            retries=2, # Connection-level retries only
+            proxy=proxy,
+        )
+        transport = httpx.AsyncHTTPTransport(**options) if kind == "async" else httpx.HTTPTransport(**options)
+        _SHARED_TRANSPORTS[(kind, proxy)] = transport
+    return transport
+
+def _client_http_options(proxy: Optional[str] = None):
+    """HttpOptions routing a genai.Client through the shared transports, or None if unsupported."""
+    if httpx is None or not hasattr(genai_types, "HttpOptions"):
+        return None
+    return genai_types.HttpOptions(
+        timeout=60_000, # milliseconds
+        client_args={"transport": _shared_transport("sync", proxy)},
+        async_client_args={"transport": _shared_transport("async", proxy)},
+    )
+
+# Terminal states of a Gemini batch job
+_BATCH_DONE_STATES = {"JOB_STATE_SUCCEEDED", "JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED"}
+
+_MIME_BY_EXT = {
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+    '.gif': 'image/gif',
+    '.webp': 'image/webp',
+}
+
+_VIDEO_MIME_BY_EXT = {
+    '.mp4': 'video/mp4',
+    '.mov': 'video/quicktime',
+    '.webm': 'video/webm',
+    '.mpeg': 'video/mpeg',
+    '.mpg': 'video/mpeg',
+}
+# Gemini rejects inline request payloads over ~20 MB; larger videos must go through the File API
+_INLINE_VIDEO_LIMIT = 20 * 1024 * 1024
+
+def _guess_mime(path: str, known: Dict[str, str], default: str) -> str:
+    """MIME type from the fixed table, then the system mimetypes database, else `default`."""
+    ext = os.path.splitext(path)[1].lower()
+    mime_type = known.get(ext)
+    if mime_type is None:
+        guessed = mimetypes.guess_type(path)[0]
+        mime_type = guessed if guessed and guessed.split('/')[0] == default.split('/')[0] else default
+    return mime_type
+
+# Rate limits (429), overload/5xx and network failures; anything else (bad request, safety block) fails at once
+_TRANSIENT_ERRORS = _API_TRANSIENT_ERRORS + (ConnectionError, TimeoutError, asyncio.TimeoutError)
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling Gemini while the circuit breaker is open."""
+
+class _CircuitBreaker:
+    """Opens after `threshold` consecutive transient failures and rejects calls for `reset_after` seconds.
+    Then one trial call is let through (half-open): success closes the circuit, failure reopens it."""
+
+    def __init__(self, threshold: int = 5, reset_after: float = 30.0):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.reset_after else "open"
+
+    def before_call(self) -> bool:
+        """Raises CircuitOpenError while open; returns True when this call is the half-open trial."""
+        state = self.state
+        if state == "open" or (state == "half-open" and self._trial_running):
+            raise CircuitOpenError("Gemini circuit breaker is open after repeated transient failures")
+        if state == "half-open":
+            self._trial_running = True
+            return True
+        return False
+
+    def end_trial(self) -> None:
+        # Called by the trial's owner whatever the outcome (including cancellation), so a trial that ended
+        # without record_success()/record_failure() can't leave the breaker rejecting calls forever
+        self._trial_running = False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._trial_running = False
+        if self.failures >= self.threshold:
+            if self.opened_at is None or self.state != "open":
+                logger.warning(f"Gemini circuit breaker opened for {self.reset_after}s after {self.failures} transient failures.")
+            self.opened_at = time.monotonic()
+
+class _RateLimiter:
+    """Token bucket allowing `rate` calls per `period` seconds, bursting up to `rate`. Each caller reserves the
+    next free slot and sleeps until it, so bursts are smoothed in arrival order instead of running into 429s."""
+
+    def __init__(self, rate: int, period: float = 60.0):
+        self.capacity = rate
+        self.interval = period / rate
+        self._tokens = float(rate)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock() # Reservations may come from several event loops or threads
+
+    def reserve(self) -> float:
+        """Takes a token and returns how long to wait before using it (a negative balance is queued debt)."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) / self.interval)
+            self._updated = now
+            self._tokens -= 1
+            return -self._tokens * self.interval if self._tokens < 0 else 0.0
+
+    async def acquire(self) -> None:
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+# One limiter per (model, rpm): Gemini quotas are per model, and every provider instance must draw from it
+_RATE_LIMITERS: Dict[tuple, _RateLimiter] = {}
+_RATE_LIMITERS_LOCK = threading.Lock()
+
+def _rate_limiter(model_name: str, rpm: int) -> Optional[_RateLimiter]:
+    if rpm <= 0:
+        return None
+    with _RATE_LIMITERS_LOCK:
+        return _RATE_LIMITERS.setdefault((model_name, rpm), _RateLimiter(rpm))
+
+# GenerationConfig objects keyed by their parameters, so repeated overrides (JSON mode, a fixed temperature,
+# ...) reuse one built config instead of converting a fresh dict on every call. Treat entries as read-only.
+_GENERATION_CONFIGS: Dict[Any, Any] = {}
+_GENERATION_CONFIGS_MAX = 64
+
+def _generation_config(params: Dict[str, Any]):
+    try:
+        key = tuple(sorted(params.items()))
+        hash(key)
+    except TypeError: # e.g. a response_schema dict
+        key = _canonical_json(params)
+    config = _GENERATION_CONFIGS.get(key)
+    if config is None:
+        if len(_GENERATION_CONFIGS) >= _GENERATION_CONFIGS_MAX:
+            _GENERATION_CONFIGS.clear()
+        config = _GENERATION_CONFIGS[key] = genai_types.GenerationConfig(**params)
+    return config
+
+# Separates the persona context from the task when both are sent inline as content parts
+_PERSONA_SEP = "\n\n---\n\n**Current Task/Prompt:**\n"
+
+# Most texts embed_content accepts in one batched request
+_EMBED_BATCH_LIMIT = 100
+# Vector size returned in dry-run mode when no output dimensionality is requested (text-embedding-004)
+_DRY_RUN_EMBEDDING_DIM = 768
+
+def _float32_rows(rows: List[List[float]]):
+    """(N, dim) float32 ndarray, or a list of array('f') rows without numpy; 4 bytes per value either way."""
+    if np is not None:
+        return np.asarray(rows, dtype=np.float32)
+    return [array.array('f', row) for row in rows]
+
+def _quantize_int8(vectors):
+    """Symmetric per-vector int8 quantization: returns (int8 rows, float32 scales); decode as q * scale."""
+    if np is not None:
+        scales = np.abs(vectors).max(axis=1) / 127
+        scales[scales == 0] = 1.0
+        quantized = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return quantized, scales.astype(np.float32)
+    scales = array.array('f', (max(map(abs, row), default=0.0) / 127 or 1.0 for row in vectors))
+    quantized = [array.array('b', (max(-127, min(127, round(v / scale))) for v in row))
+                 for row, scale in zip(vectors, scales)]
+    return quantized, scales
+
+# Files uploaded through the File API expire after 48h; rotating the cache key daily keeps every
+# reused handle well inside that window.
+_UPLOAD_BUCKET_SECONDS = 24 * 3600
+# Above this size, kernel readahead is started before the upload so disk reads overlap the network
+_PREFETCH_MIN_BYTES = 8 * 1024 * 1024
+
+def _prefetch(path: str) -> None:
+    """Asks the kernel to read the whole file into the page cache in the background (Linux/BSD only)."""
+    if not hasattr(os, "posix_fadvise"):
+        return
+    try:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        finally:
+            os.close(fd)
+    except OSError as e:
+        logger.debug("posix_fadvise failed for %s: %s", path, e)
+
+@functools.lru_cache(maxsize=256)
+def _upload_file_cached(path: str, mtime: float, size: int, mime_type: str, bucket: int):
+    """Uploads a file once per (path, mtime, size) and day; later calls reuse the returned File handle."""
+    logger.info(f"Uploading {path} to the Gemini File API")
+    if size >= _PREFETCH_MIN_BYTES:
+        _prefetch(path) # The SDK's resumable upload then streams mostly from memory
+    return genai.upload_file(path, mime_type=mime_type)
+
 class GeminiLLMProvider(BaseLLMProvider):
+    # Shared by all instances: they talk to the same API, so one degraded endpoint should fail fast for all
+    _breaker = _CircuitBreaker()
+
     def __init__(self, config_dict: Dict[str, Any]):
         super().__init__(config_dict) # Sets self.config_dict
+        # Read once: every public method checks it first, before any persona or request building
+        self.dry_run = bool(self.config_dict.get("dry_run", False))
 
         self.api_key = self.config_dict.get("api_key")
         self.text_model_name = self.config_dict.get("text_model_name", "gemini-1.5-flash-latest")
@@ -29,6 +285,34 @@ class GeminiLLMProvider(BaseLLMProvider):
         # Persona handling: For now, assume persona object is passed in config_dict if used
         # This is a simplification; a more robust solution might involve a PersonaManager.
         self.persona = self.config_dict.get("persona_object", None) # Example key
+        # Attempts per API call for transient errors, with jittered exponential backoff between them
+        self.max_attempts = max(1, int(self.config_dict.get("max_attempts", 4)))
+        self.retry_base_delay = float(self.config_dict.get("retry_base_delay", 0.5))
+        self.retry_max_delay = float(self.config_dict.get("retry_max_delay", 8.0))
+        # Client-side requests-per-minute cap per model (0 disables); the default suits the flash free tier
+        self.rpm = int(self.config_dict.get("rpm") or os.getenv("GEMINI_RPM") or 60)
+        # context_type -> (persona, persona context); see _persona_parts
+        self._persona_context_cache: Dict[str, tuple] = {}
+
+        # Deterministic (temperature 0) responses are cached by default; 'cache_responses' opts in for all calls
+        self.cache_responses = self.config_dict.get("cache_responses", False)
+        self.response_cache: Optional[LLMCache] = get_default_cache() if self.config_dict.get("response_cache", True) else None
+        # Opt-in near-duplicate tier for cacheable requests: costs one embedding call per exact-cache miss
+        self.semantic_cache: Optional[SemanticLLMCache] = None
+        if self.config_dict.get("semantic_cache", False) and self.response_cache is not None:
+            self.semantic_cache = SemanticLLMCache(threshold=self.config_dict.get("semantic_cache_threshold", 0.95))
+        self.embedding_model_name = self.config_dict.get("embedding_model_name", "models/text-embedding-004")
+
+        self._default_generation_config = genai_types.GenerationConfig(**_DEFAULT_GENERATION_PARAMS) if genai_types else None
+
+        # Server-side context caching of the persona block: registered once per (model, persona,
+        # context_type) and referenced afterwards, so its tokens are not re-sent and re-prefilled per call
+        self.context_cache = self.config_dict.get("context_cache", True)
+        self.context_cache_ttl = self.config_dict.get("context_cache_ttl", 3600) # seconds
+        self._cached_models: Dict[tuple, tuple] = {} # key -> (refresh_at, GenerativeModel or None)
+        self._cached_models_lock: Optional[asyncio.Lock] = None
+        self._batch_client = None # genai.Client for the batch job API, created on first use
+        self._models: Dict[str, Any] = {} # GenerativeModel per model name, built once
 
         self.client = None
         self.text_model = None
@@ -43,67 +327,249 @@ class GeminiLLMProvider(BaseLLMProvider):
             return
 
         # Proxy handling (simplified, assumes proxy URL is in config_dict if needed)
-        proxy_url = self.config_dict.get("proxy_url")
+        # genai.Client instances (batch jobs) get proxy_url on their own transport. The configure()/
+        # GenerativeModel API has no per-client proxy setting, so for generation a proxy_url that differs
+        # from the process proxy is still exported process-wide, as before. 'proxy_via_env': False refuses
+        # that export, and then init fails rather than letting Gemini traffic bypass the proxy.
+        self.proxy_url = proxy_url = self.config_dict.get("proxy_url")
         if proxy_url:
-            # Note: Modifying os.environ here might have wider effects.
-            # Consider passing proxy to client if API supports it directly.
-            os.environ['HTTP_PROXY'] = proxy_url
-            os.environ['HTTPS_PROXY'] = proxy_url
-            logger.info(f"Routing Gemini API traffic via proxy: {proxy_url}")
+            if os.environ.get('HTTPS_PROXY') == proxy_url:
+                logger.info(f"Gemini API traffic uses the process proxy: {proxy_url}")
+            elif self.config_dict.get("proxy_via_env", True):
+                os.environ['HTTP_PROXY'] = proxy_url
+                os.environ['HTTPS_PROXY'] = proxy_url
+                logger.info(f"Routing Gemini API traffic via proxy (process-wide): {proxy_url}")
+            else:
+                raise ValueError(f"Gemini proxy_url {proxy_url} differs from the process proxy and 'proxy_via_env' is "
+                                 "False; generation traffic has no other way through the proxy.")
         
         try:
             # Configuring the SDK with the API key
             genai.configure(api_key=self.api_key)
             # In the new genai SDK, client is often implicit after configure.
             # We initialize models directly.
-            self.text_model = genai.GenerativeModel(self.text_model_name)
-            self.vision_model = genai.GenerativeModel(self.vision_model_name)
+            self.text_model = self._model(self.text_model_name)
+            self.vision_model = self._model(self.vision_model_name) # Same instance when the names match
             logger.info(f"GeminiLLMProvider configured successfully for text model: {self.text_model_name} and vision model: {self.vision_model_name}")
             self.client = True # Indicate client is configured (though it's not a client object anymore)
         except Exception as e:
             logger.error(f"Failed to configure Gemini models: {e}")
             self.client = None # Reset to indicate failure
 
+    def _model(self, name: str):
+        model = self._models.get(name)
+        if model is None:
+            model = self._models[name] = genai.GenerativeModel(name)
+        return model
+
     @property
     def is_enabled(self) -> bool:
         return self.client is not None and self.text_model is not None
 
+    @staticmethod
+    def _dry_run_stub(method: str, label: str, payload: str) -> str:
+        logger.info(f"[DRY RUN] GeminiLLMProvider.{method}: returning placeholder for '{payload}'")
+        return f"[{label}] {payload}"
+
+    def _persona_parts(self, prompt: str, context_type: str) -> List[str]:
+        """Content parts for an inline-persona request: [persona context, separator, prompt], or just [prompt]
+        without a persona. The SDK takes the parts as they are, so the multi-KB context is never copied into
+        a per-call prompt string."""
+        persona = self.persona
+        # Simplified persona handling: if persona object exists and has get_full_context_for_llm
+        if not persona or not hasattr(persona, 'get_full_context_for_llm'):
+            return [prompt]
+        return [self._persona_context(persona, context_type), _PERSONA_SEP, prompt]
+
+    def _persona_context(self, persona, context_type: str) -> str:
+        cached = self._persona_context_cache.get(context_type)
+        if cached is not None and cached[0] is persona:
+            return cached[1]
+        # Persona data is fixed once loaded, so the context is only rebuilt when a different persona is set
+        context = persona.get_full_context_for_llm(context_type=context_type)
+        self._persona_context_cache[context_type] = (persona, context)
+        return context
+
+    async def _persona_cached_model(self, model_name: str, context_type: str):
+        """GenerativeModel bound to a CachedContent holding the persona context, or None to send it inline."""
+        persona = self.persona
+        if not self.context_cache or not persona or not hasattr(persona, 'get_full_context_for_llm') \
+                or not hasattr(genai, "caching"):
+            return None
+        key = (model_name, id(persona), context_type)
+        entry = self._cached_models.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+        if self._cached_models_lock is None:
+            self._cached_models_lock = asyncio.Lock()
+        async with self._cached_models_lock: # Concurrent first calls create one cache, not several
+            entry = self._cached_models.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                return entry[1]
+            try:
+                cached_content = await asyncio.to_thread(
+                    genai.caching.CachedContent.create,
+                    model=model_name,
+                    system_instruction=persona.get_full_context_for_llm(context_type=context_type),
+                    ttl=timedelta(seconds=self.context_cache_ttl),
+                )
+                model = genai.GenerativeModel.from_cached_content(cached_content=cached_content)
+                logger.info(f"Registered Gemini context cache for persona context '{context_type}' on {model_name}.")
+            except Exception as e:
+                # e.g. persona shorter than the model's minimum cacheable size; don't retry until the ttl passes
+                logger.warning(f"Gemini context caching unavailable for {model_name}, sending persona inline: {e}")
+                model = None
+            # Refresh a little before the server-side entry expires
+            self._cached_models[key] = (time.monotonic() + self.context_cache_ttl * 0.9, model)
+            return model
+
+    async def _model_for(self, model, model_name: str, prompt: str, persona_parts: List[str], context_type: str):
+        """Returns (model, content parts): the context-cached model with just the bare prompt when available."""
+        cached_model = await self._persona_cached_model(model_name, context_type)
+        if cached_model is not None:
+            return cached_model, [prompt]
+        return model, persona_parts
+
+    async def _with_retry(self, call, model_name: Optional[str] = None):
+        """Awaits call() (a zero-argument function returning an awaitable), retrying transient errors with
+        full-jitter exponential backoff. Every attempt goes through the shared circuit breaker and, when
+        model_name is given, that model's rate limiter."""
+        breaker = self._breaker
+        limiter = _rate_limiter(model_name, self.rpm) if model_name else None
+        for attempt in range(1, self.max_attempts + 1):
+            trial = breaker.before_call()
+            try:
+                if limiter is not None:
+                    await limiter.acquire()
+                result = await call()
+            except _TRANSIENT_ERRORS as e:
+                breaker.record_failure()
+                if attempt == self.max_attempts:
+                    raise
+                error = e
+            except Exception:
+                # Bad request, safety block, ...: Gemini answered, so for the breaker the service is reachable
+                breaker.record_success()
+                raise
+            else:
+                breaker.record_success()
+                return result
+            finally:
+                if trial:
+                    breaker.end_trial()
+            delay = random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** (attempt - 1)))
+            logger.warning(f"Transient Gemini error (attempt {attempt}/{self.max_attempts}), retrying in {delay:.2f}s: {error}")
+            await asyncio.sleep(delay)
+
+    async def _embed_for_cache(self, text: str):
+        try:
+            limiter = _rate_limiter(self.embedding_model_name, self.rpm) # Counts against the same quota
+            if limiter is not None:
+                await limiter.acquire()
+            result = await asyncio.to_thread(genai.embed_content, model=self.embedding_model_name, content=text)
+            return result["embedding"]
+        except Exception as e:
+            logger.warning(f"Embedding for the semantic cache failed, skipping it for this request: {e}")
+            return None
+
+    async def embed_texts(self, texts: List[str], task_type: str = "retrieval_document",
+                          dimensions: Optional[int] = None):
+        """Embeds texts with one embed_content request per 100, sent concurrently; rows keep input order.
+
+        Returns an (N, dim) float32 ndarray, or a list of array('f') rows when numpy is not installed.
+        Errors propagate to the caller.
+        """
+        if not texts:
+            return _float32_rows([])
+        if self.dry_run:
+            logger.info(f"[DRY RUN] GeminiLLMProvider.embed_texts: returning zero vectors for {len(texts)} text(s)")
+            return _float32_rows([[0.0] * (dimensions or _DRY_RUN_EMBEDDING_DIM)] * len(texts))
+        options: Dict[str, Any] = {"task_type": task_type}
+        if dimensions:
+            options["output_dimensionality"] = dimensions
+
+        async def embed_chunk(chunk: List[str]) -> List[List[float]]:
+            result = await self._with_retry(lambda: asyncio.to_thread(
+                genai.embed_content, model=self.embedding_model_name, content=chunk, **options), self.embedding_model_name)
+            return result["embedding"]
+
+        chunks = await asyncio.gather(*(embed_chunk(texts[i:i + _EMBED_BATCH_LIMIT])
+                                        for i in range(0, len(texts), _EMBED_BATCH_LIMIT)))
+        return _float32_rows([vector for chunk in chunks for vector in chunk])
+
+    async def embed_texts_int8(self, texts: List[str], task_type: str = "retrieval_document", dimensions: Optional[int] = None):
+        """embed_texts quantized to int8 with one float32 scale per row, a quarter of the float32 size.
+        With numpy, similarity is (qa @ qb.T).astype(np.float32) * (sa[:, None] * sb[None, :])."""
+        return _quantize_int8(await self.embed_texts(texts, task_type=task_type, dimensions=dimensions))
+
+    async def embed_text(self, text: str, task_type: str = "retrieval_query", dimensions: Optional[int] = None) -> List[float]:
+        return (await self.embed_texts([text], task_type=task_type, dimensions=dimensions))[0].tolist()
+
+    def _prepare_text_request(self, prompt: str, context_type: str, kwargs: Dict[str, Any]):
+        """Builds the persona content parts, generation params and GenerationConfig shared by generate_text
+        and its streaming variant."""
+        persona_parts = self._persona_parts(prompt, context_type)
+        logger.debug("Generating text with prompt (persona context type: %s):\n%.500s...", context_type, prompt)
+
+        overrides = kwargs.get("generation_config")
+        schema = kwargs.get("response_schema")
+        if kwargs.get("json_mode") or schema is not None:
+            # Native JSON mode: the reply is bare JSON, and a response_schema is enforced server-side
+            overrides = {**(overrides or {}), "response_mime_type": "application/json"}
+            if schema is not None:
+                overrides["response_schema"] = schema
+        if not overrides:
+            # Common case: reuse the GenerationConfig built once at init (treat both as read-only)
+            return persona_parts, _DEFAULT_GENERATION_PARAMS, self._default_generation_config
+        generation_config_params = {**_DEFAULT_GENERATION_PARAMS, **overrides} # Allow overriding via kwargs
+        return persona_parts, generation_config_params, _generation_config(generation_config_params)
+
     async def generate_text(self, prompt: str, context_type: str = "general", **kwargs) -> Optional[str]:
-        # dry_run handling: Check if 'dry_run' is in self.config_dict and True
-        if self.config_dict.get('dry_run', False):
-            logger.info(f"[DRY RUN] GeminiLLMProvider.generate_text: returning prompt fallback for '{prompt}'")
-            return f"[DRY_RUN_GEMINI] {prompt}"
+        if self.dry_run:
+            return self._dry_run_stub("generate_text", "DRY_RUN_GEMINI", prompt)
 
         if not self.is_enabled:
             logger.error("GeminiLLMProvider is not enabled. Cannot generate text.")
             return None
 
-        full_prompt = prompt
-        # Simplified persona handling: if persona object exists and has get_full_context_for_llm
-        if self.persona and hasattr(self.persona, 'get_full_context_for_llm'):
-            persona_context = self.persona.get_full_context_for_llm(context_type=context_type)
-            full_prompt = f"{persona_context}\n\n---\n\n**Current Task/Prompt:**\n{prompt}"
-            logger.debug(f"Generating text with full prompt (persona context type: {context_type}):\n{full_prompt[:500]}...")
-        else:
-            logger.debug("Generating text with prompt (no/incomplete persona):\n%s...", prompt[:500])
-        
-        # Default generation_config from original LLMManager
-        generation_config_params = {
-            "temperature": 0.7,
-            "top_p": 0.95,
-            "top_k": 40,
-        }
-        generation_config_params.update(kwargs.get("generation_config", {})) # Allow overriding via kwargs
-        
+        persona_parts, generation_config_params, generation_config = self._prepare_text_request(prompt, context_type, kwargs)
+        cache_key = None
+        if self.response_cache is not None:
+            cache_params = dict(generation_config_params)
+            cache_key = LLMCache.cache_key(self.text_model_name, persona_parts, cache_params.pop("temperature", None),
+                                           opt_in=self.cache_responses, **cache_params)
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                logger.debug("Gemini generate_text served from cache.")
+                return cached
+
+        semantic_key = prompt_vector = None
+        if cache_key and self.semantic_cache is not None:
+            semantic_key = (self.text_model_name, id(self.persona), context_type,
+                            tuple(sorted(generation_config_params.items())))
+            prompt_vector = await self._embed_for_cache(prompt)
+            if prompt_vector is not None:
+                cached = await asyncio.to_thread(self.semantic_cache.get, semantic_key, prompt_vector)
+                if cached is not None:
+                    logger.debug("Gemini generate_text served from semantic cache.")
+                    return cached
+
         try:
-            # Use the pre-initialized model
-            response = await self.text_model.generate_content_async(
-                full_prompt,
-                generation_config=genai_types.GenerationConfig(**generation_config_params)
-            )
-            if hasattr(response, 'text') and response.text:
-                logger.info(f"Gemini generated text successfully (length: {len(response.text)}).")
-                return response.text.strip()
+            # Use the pre-initialized model, or its persona context-cached variant
+            model, contents = await self._model_for(self.text_model, self.text_model_name, prompt, persona_parts, context_type)
+            response = await self._with_retry(lambda: model.generate_content_async(
+                contents,
+                generation_config=generation_config
+            ), self.text_model_name)
+            text = getattr(response, 'text', None) # Property re-joins all candidate parts on each access
+            if text:
+                logger.info(f"Gemini generated text successfully (length: {len(text)}).")
+                text = text.strip()
+                if cache_key:
+                    self.response_cache.set(cache_key, text)
+                if prompt_vector is not None:
+                    self.semantic_cache.set(semantic_key, prompt_vector, text)
+                return text
             else:
                 logger.warning("Gemini returned empty or blocked response for text generation.")
                 # Log candidate and finish reason if available for debugging
@@ -116,10 +582,105 @@ class GeminiLLMProvider(BaseLLMProvider):
             logger.error(f"Error during Gemini text generation: {e}", exc_info=True)
             return None
 
+    async def generate_text_stream(self, prompt: str, context_type: str = "general", **kwargs) -> AsyncIterator[str]:
+        if self.dry_run:
+            yield self._dry_run_stub("generate_text_stream", "DRY_RUN_GEMINI", prompt)
+            return
+
+        if not self.is_enabled:
+            logger.error("GeminiLLMProvider is not enabled. Cannot stream text.")
+            return
+
+        persona_parts, generation_config_params, generation_config = self._prepare_text_request(prompt, context_type, kwargs)
+        # Errors propagate so the fallback manager can decide whether switching providers is still safe
+        model, contents = await self._model_for(self.text_model, self.text_model_name, prompt, persona_parts, context_type)
+        response = await self._with_retry(lambda: model.generate_content_async(
+            contents,
+            generation_config=generation_config,
+            stream=True
+        ), self.text_model_name)
+        async for chunk in response:
+            text = getattr(chunk, 'text', None)
+            if text:
+                yield text
+
+    async def _uploaded_file_part(self, path: str, mime_type: str):
+        """Returns a cached File API handle for `path`, or None to fall back to sending inline bytes."""
+        if not self.config_dict.get("use_file_api", True) or not hasattr(genai, "upload_file"):
+            return None
+        try:
+            st = os.stat(path)
+            key = (os.path.realpath(path), st.st_mtime, st.st_size, mime_type, int(time.time() // _UPLOAD_BUCKET_SECONDS))
+            return await self._with_retry(lambda: asyncio.to_thread(_upload_file_cached, *key))
+        except Exception as e:
+            logger.warning(f"Gemini File API upload failed for {path}, sending inline bytes instead: {e}")
+            return None
+
+    # --- Batch mode: opt-in for offline bulk jobs; results arrive minutes to hours later at batch pricing ---
+
+    def _get_batch_client(self):
+        if self._batch_client is None:
+            if not hasattr(genai, "Client"):
+                raise RuntimeError("Installed Gemini SDK has no Client/batches API.")
+            http_options = _client_http_options(self.proxy_url)
+            if http_options is not None:
+                self._batch_client = genai.Client(api_key=self.api_key, http_options=http_options)
+            else:
+                self._batch_client = genai.Client(api_key=self.api_key)
+        return self._batch_client
+
+    async def submit_inline_batch(self, prompts: List[str], context_type: str = "general", **kwargs) -> str:
+        """Submits prompts as one inline batch job and returns the job name for poll_batch()."""
+        config: Dict[str, Any] = {**_DEFAULT_GENERATION_PARAMS, **kwargs.get("generation_config", {})}
+        persona = self.persona
+        if persona and hasattr(persona, 'get_full_context_for_llm'):
+            # System instruction rather than a per-item prompt prefix; the persona context itself is memoized
+            config["system_instruction"] = persona.get_full_context_for_llm(context_type=context_type)
+        src = [{"contents": [{"role": "user", "parts": [{"text": prompt}]}], "config": config} for prompt in prompts]
+        client = self._get_batch_client()
+        job = await asyncio.to_thread(client.batches.create, model=self.text_model_name, src=src,
+                                      config={"display_name": f"xviolet-{context_type}-{len(prompts)}"})
+        logger.info(f"Submitted Gemini batch job {job.name} with {len(prompts)} request(s).")
+        return job.name
+
+    async def poll_batch(self, job_name: str):
+        return await asyncio.to_thread(self._get_batch_client().batches.get, name=job_name)
+
+    async def run_batch(self, prompts: List[str], context_type: str = "general", max_wait: float = 86400,
+                        poll_interval: float = 30, **kwargs) -> List[Optional[str]]:
+        """Submits a batch and polls with exponential backoff (capped at 10 minutes) until it finishes.
+
+        Returns one result per prompt, in order; failed items are None.
+        """
+        if self.dry_run:
+            return [self._dry_run_stub("run_batch", "DRY_RUN_GEMINI", prompt) for prompt in prompts]
+        job_name = await self.submit_inline_batch(prompts, context_type=context_type, **kwargs)
+        deadline = time.monotonic() + max_wait
+        delay = poll_interval
+        while True:
+            job = await self.poll_batch(job_name)
+            state = getattr(job.state, "name", str(job.state))
+            if state in _BATCH_DONE_STATES:
+                break
+            if time.monotonic() + delay > deadline:
+                raise TimeoutError(f"Gemini batch job {job_name} still {state} after {max_wait}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 600)
+
+        if state != "JOB_STATE_SUCCEEDED":
+            logger.error(f"Gemini batch job {job_name} ended in state {state}.")
+            return [None] * len(prompts)
+        results: List[Optional[str]] = []
+        for item in job.dest.inlined_responses:
+            text = getattr(item.response, 'text', None) if item.response is not None else None
+            if not text:
+                logger.warning(f"Gemini batch job {job_name} item failed: {getattr(item, 'error', None)}")
+            results.append(text.strip() if text else None)
+        return results
+
     async def analyze_image(self, image_path: str, context_type: str = "image_analysis", prompt_override: Optional[str] = None, **kwargs) -> Optional[str]:
-        if self.config_dict.get('dry_run', False):
-            logger.info(f"[DRY RUN] GeminiLLMProvider.analyze_image: returning placeholder for '{image_path}'")
-            return f"[DRY_RUN_GEMINI_VISION] Image at {image_path}"
+        if self.dry_run:
+            return self._dry_run_stub("analyze_image", "DRY_RUN_GEMINI_VISION", f"Image at {image_path}")
 
         if not self.is_enabled or not self.vision_model:
             logger.error("GeminiLLMProvider is not enabled or vision model not set. Cannot analyze image.")
@@ -127,40 +688,37 @@ class GeminiLLMProvider(BaseLLMProvider):
 
         image_prompt = prompt_override or "Describe the image." # Use prompt_override as the main prompt
         
-        full_prompt_parts = []
-        # Simplified persona handling
-        if self.persona and hasattr(self.persona, 'get_full_context_for_llm'):
-            persona_context = self.persona.get_full_context_for_llm(context_type=context_type)
-            full_prompt_parts.append(f"{persona_context}\n\n---\n\n**Current Task/Prompt:**\n{image_prompt}")
-        else:
-            full_prompt_parts.append(image_prompt)
+        persona_parts = self._persona_parts(image_prompt, context_type)
 
         generation_config_params = kwargs.get("generation_config", {})
 
         try:
-            if not os.path.exists(image_path):
-                logger.error(f"Image file not found at path: {image_path}")
-                return None
+            mime_type = _guess_mime(image_path, _MIME_BY_EXT, "image/png") # Default to png
 
-            with open(image_path, "rb") as f:
-                image_bytes = f.read()
-            
-            # Determine MIME type based on file extension (simplified)
-            ext = os.path.splitext(image_path)[1].lower()
-            mime_type = f"image/{ext[1:]}" if ext in ['.jpg', '.jpeg', '.png', '.gif', '.webp'] else "image/png" # Default to png
-            if ext == ".jpg": mime_type = "image/jpeg"
+            image_part = await self._uploaded_file_part(image_path, mime_type)
+            if image_part is None:
+                image_bytes = kwargs.get("image_data")
+                if image_bytes is None:
+                    if not os.path.exists(image_path):
+                        logger.error(f"Image file not found at path: {image_path}")
+                        return None
 
+                    # Read off the event loop so concurrent requests keep progressing on slow disks
+                    image_bytes = await asyncio.to_thread(Path(image_path).read_bytes)
 
-            image_part = genai_types.Part(inline_data=genai_types.Blob(data=image_bytes, mime_type=mime_type))
-            full_prompt_parts.insert(0, image_part) # Image part first usually
+                image_part = genai_types.Part(inline_data=genai_types.Blob(data=image_bytes, mime_type=mime_type))
+            vision_model, text_parts = await self._model_for(
+                self.vision_model, self.vision_model_name, image_prompt, persona_parts, context_type)
+            full_prompt_parts = [image_part, *text_parts] # Image part first usually
 
-            response = await self.vision_model.generate_content_async(
+            response = await self._with_retry(lambda: vision_model.generate_content_async(
                 full_prompt_parts, # List of parts: image and text
-                generation_config=genai_types.GenerationConfig(**generation_config_params) if generation_config_params else None
-            )
-            if hasattr(response, 'text') and response.text:
+                generation_config=_generation_config(generation_config_params) if generation_config_params else None
+            ), self.vision_model_name)
+            text = getattr(response, 'text', None)
+            if text:
                 logger.info(f"Gemini analyzed image {image_path} successfully.")
-                return response.text.strip()
+                return text.strip()
             else:
                 logger.warning(f"Gemini returned empty or blocked response for image analysis of {image_path}.")
                 if response.candidates and response.candidates[0].finish_reason:
@@ -173,10 +731,48 @@ class GeminiLLMProvider(BaseLLMProvider):
             return None
 
     async def analyze_video(self, video_path: str, context_type: str = "video_analysis", prompt_override: Optional[str] = None, **kwargs) -> Optional[str]:
-        logger.warning("GeminiLLMProvider.analyze_video is not yet implemented.")
-        # Placeholder for future implementation.
-        # Would involve similar logic to analyze_image but with video_part.
-        # Example:
-        # video_part = genai_types.Part(inline_data=genai_types.Blob(data=video_bytes, mime_type='video/mp4'))
-        # response = await self.vision_model.generate_content_async([video_part, full_prompt_text_part])
-        return None
+        if self.dry_run:
+            return self._dry_run_stub("analyze_video", "DRY_RUN_GEMINI_VISION", f"Video at {video_path}")
+
+        if not self.is_enabled or not self.vision_model:
+            logger.error("GeminiLLMProvider is not enabled or vision model not set. Cannot analyze video.")
+            return None
+        if not os.path.exists(video_path):
+            logger.error(f"Video file not found at path: {video_path}")
+            return None
+
+        bare_prompt = prompt_override or "Describe the video."
+        persona_parts = self._persona_parts(bare_prompt, context_type)
+        generation_config_params = kwargs.get("generation_config", {})
+
+        try:
+            mime_type = _guess_mime(video_path, _VIDEO_MIME_BY_EXT, "video/mp4")
+
+            # Uploaded once per file version and referenced afterwards, rather than inlined on every call
+            video_part = await self._uploaded_file_part(video_path, mime_type)
+            if video_part is None:
+                size = os.path.getsize(video_path)
+                if size > _INLINE_VIDEO_LIMIT:
+                    logger.error(f"Video {video_path} is {size} bytes, over the {_INLINE_VIDEO_LIMIT} byte inline limit, "
+                                 "and the File API is unavailable.")
+                    return None
+                video_bytes = kwargs.get("video_data") # Read-only mapping shared by the fallback manager
+                if video_bytes is None:
+                    video_bytes = await asyncio.to_thread(Path(video_path).read_bytes)
+                video_part = genai_types.Part(inline_data=genai_types.Blob(data=bytes(video_bytes), mime_type=mime_type))
+
+            vision_model, text_parts = await self._model_for(
+                self.vision_model, self.vision_model_name, bare_prompt, persona_parts, context_type)
+            response = await self._with_retry(lambda: vision_model.generate_content_async(
+                [video_part, *text_parts],
+                generation_config=_generation_config(generation_config_params) if generation_config_params else None
+            ), self.vision_model_name)
+            text = getattr(response, 'text', None)
+            if text:
+                logger.info(f"Gemini analyzed video {video_path} successfully.")
+                return text.strip()
+            logger.warning(f"Gemini returned empty or blocked response for video analysis of {video_path}.")
+            return None
+        except Exception as e:
+            logger.error(f"Error during Gemini video analysis for {video_path}: {e}", exc_info=True)
+            return None
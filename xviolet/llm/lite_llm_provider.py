@@ -2,14 +2,65 @@
 import litellm
 from litellm.exceptions import APIConnectionError, Timeout, RateLimitError, ServiceUnavailableError, APIError, InvalidRequestError
 import logging
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, AsyncIterator
 import os # For image analysis to read file
+import asyncio
 import base64 # For image analysis
+import functools
+import mimetypes
+import weakref
+
+import httpx
 
 from .base_llm import BaseLLMProvider
+from .cache import LLMCache, get_default_cache, hash_bytes, new_hasher
 
 logger = logging.getLogger(__name__)
 
+def _new_client() -> httpx.AsyncClient:
+    # Pooled, so repeated calls reuse keep-alive connections instead of paying a TCP+TLS handshake each time
+    return httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=50, keepalive_expiry=60),
+        timeout=httpx.Timeout(30.0, connect=5.0)
+    )
+
+# Raw bytes per base64 step; a multiple of 3 so chunk encodings concatenate without padding.
+# Cache-sized chunks keep the C encoder's input hot: on multi-MB images this beats one b64encode over
+# the whole buffer, and reading through mmap instead of f.read() brought no further gain.
+_B64_CHUNK = 48 * 1024
+
+def _encode_data_url(mime_type: str, data: bytes) -> str:
+    """Builds a base64 data: URL in one growing buffer instead of separate bytes and str copies."""
+    buf = bytearray(f"data:{mime_type};base64,".encode("ascii"))
+    view = memoryview(data)
+    for start in range(0, len(view), _B64_CHUNK):
+        buf += base64.b64encode(view[start:start + _B64_CHUNK])
+    return buf.decode("ascii")
+
+def _read_data_url(mime_type: str, path: str):
+    """Streams a file into a data: URL and a hash_bytes-compatible digest without holding the raw file in memory."""
+    buf = bytearray(f"data:{mime_type};base64,".encode("ascii"))
+    digest = new_hasher()
+    with open(path, "rb", buffering=65536) as f:
+        while chunk := f.read(_B64_CHUNK):
+            digest.update(chunk)
+            buf += base64.b64encode(chunk)
+    return buf.decode("ascii"), digest.hexdigest()
+
+@functools.lru_cache(maxsize=32) # Entries are ~1.33x the image size; keep the working set small
+def _cached_data_url(path: str, mtime: float, size: int, mime_type: str):
+    """(data URL, content hash) for one version of a file, keyed on its mtime and size."""
+    return _read_data_url(mime_type, path)
+
+# Call params that do not change the model's output and so stay out of the response cache key
+_UNCACHED_PARAMS = frozenset({"model", "messages", "api_key", "stream"})
+
+def _message_content(response) -> Optional[str]:
+    """Content of the first choice, or None; each attribute is read once (pydantic models resolve them dynamically)."""
+    choices = getattr(response, 'choices', None) if response else None
+    message = getattr(choices[0], 'message', None) if choices else None
+    return getattr(message, 'content', None)
+
 class LiteLLMProvider(BaseLLMProvider):
     def __init__(self, config_dict: Dict[str, Any]): # Renamed config to config_dict to match base
         super().__init__(config_dict) # Calls BaseLLMProvider's __init__, sets self.config_dict
@@ -25,11 +76,33 @@ class LiteLLMProvider(BaseLLMProvider):
         # Default parameters for LiteLLM calls, can be overridden by kwargs in methods
         self.default_litellm_params = self.config_dict.get('default_params', {})
 
+        # Deterministic (temperature 0) responses are cached by default; 'cache_responses' opts in for all calls
+        self.cache_responses = self.config_dict.get('cache_responses', False)
+        self.response_cache: Optional[LLMCache] = get_default_cache() if self.config_dict.get('response_cache', True) else None
+
         # LiteLLM also uses environment variables for keys (e.g., OPENAI_API_KEY).
         # If self.api_key is provided in config, it will be passed explicitly in calls.
         # If using a model that requires an API key not set as an environment variable
         # and not passed in config, calls might fail.
 
+        # Call params that only depend on config, merged once here instead of on every request.
+        # Order: model, provider config defaults, custom_llm_provider (for models like 'ollama/mistral').
+        self._base_call_params: Dict[str, Any] = {"model": self.model, **self.default_litellm_params}
+        if self.custom_llm_provider:
+            self._base_call_params["custom_llm_provider"] = self.custom_llm_provider
+        # Ensure "stream" is False unless explicitly requested, as it changes response format.
+        self._base_call_params.setdefault("stream", False)
+        self._credential_params: Dict[str, Any] = {}
+        if self.api_key:
+            self._credential_params["api_key"] = self.api_key
+        if self.api_base:
+            self._credential_params["api_base"] = self.api_base
+
+        # Pooled HTTP clients owned by this provider, one per event loop: a client's kept-alive connections
+        # belong to the loop that opened them (generate_many runs each batch in a fresh asyncio.run loop).
+        # Created lazily inside the loop; entries go away with their loop
+        self._clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
         log_params = {
             "model": self.model,
             "api_base": self.api_base if self.api_base else "Not set (using default or provider's default)",
@@ -43,45 +116,55 @@ class LiteLLMProvider(BaseLLMProvider):
             logger.info("API key not provided in config; LiteLLM will rely on environment variables if needed.")
 
 
+    def _use_client(self) -> None:
+        """Points litellm at this provider's client for the running loop (litellm only takes a global session)."""
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None or client.is_closed:
+            client = self._clients[loop] = _new_client()
+        litellm.aclient_session = client
+
+    def _build_text_call_params(self, messages: List[Dict[str, Any]], kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        # Precomputed defaults, then method-specific kwargs; explicit credentials from config always win
+        if kwargs.get("json_mode") or "response_schema" in kwargs:
+            # Provider-neutral JSON mode flags map onto OpenAI-style response_format
+            kwargs = {k: v for k, v in kwargs.items() if k not in ("json_mode", "response_schema")}
+            kwargs.setdefault("response_format", {"type": "json_object"})
+        return {**self._base_call_params, "messages": messages, **kwargs, **self._credential_params}
+
+    def _response_cache_key(self, messages: Any, call_params: Dict[str, Any]) -> Optional[str]:
+        if self.response_cache is None:
+            return None
+        params = {k: v for k, v in call_params.items() if k not in _UNCACHED_PARAMS}
+        return LLMCache.cache_key(self.model, messages, params.pop("temperature", None), opt_in=self.cache_responses, **params)
+
     async def generate_text(self, prompt: str, context_type: str = "general", **kwargs) -> Optional[str]:
         # context_type is not directly used by LiteLLM but is part of the interface.
         # It could be used for prompt engineering before this call if needed.
         messages = [{"role": "user", "content": prompt}]
-        
-        call_params = {
-            "model": self.model,
-            "messages": messages,
-        }
-        # Start with defaults, then override with provider-specific config defaults, then method-specific kwargs
-        merged_params = {**self.default_litellm_params} 
-        if self.custom_llm_provider: # For models like 'ollama/mistral', provider must be specified
-            merged_params["custom_llm_provider"] = self.custom_llm_provider
-        
-        # Apply kwargs, which might override default_litellm_params or add new ones
-        merged_params.update(kwargs) 
-        call_params.update(merged_params)
-
-
-        if self.api_key:
-            call_params["api_key"] = self.api_key
-        if self.api_base:
-            call_params["api_base"] = self.api_base
-        
-        # Ensure "stream" is False unless explicitly requested, as it changes response format.
-        if "stream" not in call_params:
-            call_params["stream"] = False
+        call_params = self._build_text_call_params(messages, kwargs)
+        cache_key = self._response_cache_key(messages, call_params)
+        cached = self.response_cache.get(cache_key) if cache_key else None
+        if cached is not None:
+            logger.debug("LiteLLM generate_text served from cache for model %s.", self.model)
+            return cached
 
         try:
-            log_call_params = {k: v for k, v in call_params.items() if k != "messages"}
-            log_call_params["messages_summary"] = messages[0]['content'][:70] + ('...' if len(messages[0]['content']) > 70 else '')
-            logger.debug(f"Calling LiteLLM acompletion with params: {log_call_params}")
+            if logger.isEnabledFor(logging.DEBUG): # Skip building the summary on every call at INFO
+                log_call_params = {k: v for k, v in call_params.items() if k != "messages"}
+                log_call_params["messages_summary"] = messages[0]['content'][:70] + ('...' if len(messages[0]['content']) > 70 else '')
+                logger.debug("Calling LiteLLM acompletion with params: %s", log_call_params)
 
+            self._use_client()
             response = await litellm.acompletion(**call_params)
             
-            if response and response.choices and response.choices[0].message and response.choices[0].message.content:
-                content = response.choices[0].message.content
+            content = _message_content(response)
+            if content:
                 logger.info(f"LiteLLM generate_text successful for model {self.model}. Output length: {len(content)}")
-                return content.strip()
+                content = content.strip()
+                if cache_key:
+                    self.response_cache.set(cache_key, content)
+                return content
             else:
                 logger.warning(f"LiteLLM generate_text for model {self.model} returned empty or malformed response. Response: {response}")
                 return None
@@ -92,6 +175,23 @@ class LiteLLMProvider(BaseLLMProvider):
             logger.error(f"Unexpected error during LiteLLM generate_text for model {self.model}: {e}", exc_info=True)
             return None
 
+    async def generate_text_stream(self, prompt: str, context_type: str = "general", **kwargs) -> AsyncIterator[str]:
+        messages = [{"role": "user", "content": prompt}]
+        call_params = self._build_text_call_params(messages, kwargs)
+        call_params["stream"] = True
+        logger.debug("Calling LiteLLM acompletion (stream) for model %s", self.model)
+
+        # Errors propagate so the fallback manager can decide whether switching providers is still safe
+        self._use_client()
+        response = await litellm.acompletion(**call_params)
+        async for chunk in response:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            content = getattr(delta, "content", None) if delta else None
+            if content:
+                yield content
+
     async def analyze_image(self, image_path: str, context_type: str = "image_analysis", prompt_override: Optional[str] = None, **kwargs) -> Optional[str]:
         # Check if the configured model is known to be multimodal and supported by LiteLLM's image input
         # This is a simplified check; LiteLLM's support can vary.
@@ -101,19 +201,39 @@ class LiteLLMProvider(BaseLLMProvider):
             logger.warning(f"LiteLLMProvider.analyze_image: Model '{self.model}' may not support image analysis or is not configured for it. Skipping.")
             return None
 
-        if not os.path.exists(image_path):
+        image_bytes = kwargs.pop("image_data", None)
+        if image_bytes is None and not os.path.exists(image_path):
             logger.error(f"Image file not found at path: {image_path}")
             return None
 
         try:
-            with open(image_path, "rb") as image_file:
-                base64_image = base64.b64encode(image_file.read()).decode('utf-8')
-            
-            image_url = f"data:image/jpeg;base64,{base64_image}" # Assuming JPEG, adjust if other types common
-
+            # Guess from the extension rather than assuming JPEG, which mislabels PNG/GIF/WebP uploads
+            mime_type = mimetypes.guess_type(image_path)[0] or "image/jpeg"
+            image_url = None
+            if image_bytes is not None:
+                # Bytes the caller already holds are what gets analysed; the file on disk may differ or be gone
+                image_hash = hash_bytes(image_bytes)
+            else:
+                # Memoized per file version, so re-analysing the same image skips the read and the encode.
+                # Runs off the event loop so concurrent requests keep progressing on slow disks.
+                st = os.stat(image_path)
+                image_url, image_hash = await asyncio.to_thread(
+                    _cached_data_url, os.path.realpath(image_path), st.st_mtime, st.st_size, mime_type)
             text_prompt = prompt_override or "Describe this image."
-            
-            messages = [
+
+            call_params = {**self._base_call_params, **kwargs, **self._credential_params}
+
+            # Keyed on the image hash, so a hit on shared bytes skips base64 encoding as well as the API call
+            cache_key = self._response_cache_key([text_prompt, image_hash], call_params)
+            cached = self.response_cache.get(cache_key) if cache_key else None
+            if cached is not None:
+                logger.debug("LiteLLM analyze_image served from cache for model %s, image %s.", self.model, image_path)
+                return cached
+
+            if image_url is None:
+                image_url = _encode_data_url(mime_type, image_bytes)
+
+            call_params["messages"] = [
                 {
                     "role": "user",
                     "content": [
@@ -122,35 +242,22 @@ class LiteLLMProvider(BaseLLMProvider):
                     ]
                 }
             ]
-            
-            call_params = {
-                "model": self.model,
-                "messages": messages,
-            }
-            merged_params = {**self.default_litellm_params}
-            if self.custom_llm_provider:
-                 merged_params["custom_llm_provider"] = self.custom_llm_provider
-            merged_params.update(kwargs)
-            call_params.update(merged_params)
-
-            if self.api_key:
-                call_params["api_key"] = self.api_key
-            if self.api_base:
-                call_params["api_base"] = self.api_base
-            
-            if "stream" not in call_params:
-                call_params["stream"] = False
 
-            log_call_params = {k:v for k,v in call_params.items() if k != "messages"}
-            log_call_params["messages_summary"] = f"Text: {text_prompt[:50]}..., Image: {image_path}"
-            logger.debug(f"Calling LiteLLM acompletion (image analysis) with params: {log_call_params}")
+            if logger.isEnabledFor(logging.DEBUG):
+                log_call_params = {k:v for k,v in call_params.items() if k != "messages"}
+                log_call_params["messages_summary"] = f"Text: {text_prompt[:50]}..., Image: {image_path}"
+                logger.debug("Calling LiteLLM acompletion (image analysis) with params: %s", log_call_params)
 
+            self._use_client()
             response = await litellm.acompletion(**call_params)
 
-            if response and response.choices and response.choices[0].message and response.choices[0].message.content:
-                content = response.choices[0].message.content
+            content = _message_content(response)
+            if content:
                 logger.info(f"LiteLLM analyze_image successful for model {self.model}. Output length: {len(content)}")
-                return content.strip()
+                content = content.strip()
+                if cache_key:
+                    self.response_cache.set(cache_key, content)
+                return content
             else:
                 logger.warning(f"LiteLLM analyze_image for model {self.model} returned empty or malformed response for {image_path}. Response: {response}")
                 return None
@@ -165,3 +272,17 @@ class LiteLLMProvider(BaseLLMProvider):
     async def analyze_video(self, video_path: str, context_type: str = "video_analysis", prompt_override: Optional[str] = None, **kwargs) -> Optional[str]:
         logger.warning("LiteLLMProvider.analyze_video is not currently supported. Video analysis often requires specialized models and handling beyond typical LiteLLM text/image focus.")
         return None
+
+    async def aclose(self) -> None:
+        """Closes the HTTP clients this provider created; other providers' clients are left alone.
+        A client is recreated on next use."""
+        loop = asyncio.get_running_loop()
+        clients = list(self._clients.items())
+        self._clients.clear()
+        for client_loop, client in clients:
+            if litellm.aclient_session is client:
+                litellm.aclient_session = None
+            # A client from another (usually already closed) loop cannot be closed from here; its
+            # connections are dropped with it
+            if client_loop is loop and not client.is_closed:
+                await client.aclose()
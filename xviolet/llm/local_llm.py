@@ -1,14 +1,123 @@
 # xviolet/llm/local_llm.py
-from llama_cpp import Llama
+import llama_cpp
+from llama_cpp import Llama, LlamaRAMCache
 import logging
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, AsyncIterator
 import os
 import asyncio # For running sync llama-cpp calls in executor
+import queue
+import threading
+import weakref
+from concurrent.futures import Future
 
 from .base_llm import BaseLLMProvider
+from .cache import LLMCache, get_default_cache
 
 logger = logging.getLogger(__name__)
 
+# Loaded Llama handles keyed by (model_path, load params, prompt cache size, CPU set). Providers that differ only in sampling
+# params (temperature, top_p, ...) share one model in memory instead of loading the GGUF again.
+_MODEL_CACHE: "weakref.WeakValueDictionary[tuple, Llama]" = weakref.WeakValueDictionary()
+_MODEL_CACHE_LOCK = threading.Lock()
+
+class _InferenceWorker:
+    """One long-lived thread per loaded model that runs inference requests in arrival order.
+
+    llama.cpp contexts are not thread-safe, so a shared model must see one call at a time. A
+    dedicated thread does that without parking default-executor threads on a lock, and keeps the
+    model's KV cache and thread pool warm between requests.
+    """
+
+    def __init__(self, name: str, cpu_affinity: Optional[List[int]] = None):
+        self._requests: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._cpu_affinity = cpu_affinity
+        self._thread = threading.Thread(target=self._run, name=f"gguf-{name}", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        if self._cpu_affinity and hasattr(os, "sched_setaffinity"):
+            # Applies to this thread only (pid 0); llama.cpp's compute threads spawned from it inherit the mask
+            try:
+                os.sched_setaffinity(0, self._cpu_affinity)
+            except OSError as e:
+                logger.warning(f"Could not pin GGUF inference thread to CPUs {self._cpu_affinity}: {e}")
+        while True:
+            item = self._requests.get()
+            if item is None:
+                return
+            fn, future = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn())
+            except BaseException as e:
+                future.set_exception(e)
+
+    def submit(self, fn) -> Future:
+        future: Future = Future()
+        self._requests.put((fn, future))
+        return future
+
+    async def run(self, fn):
+        return await asyncio.wrap_future(self.submit(fn))
+
+    def stop(self) -> None:
+        self._requests.put(None)
+
+_MODEL_WORKERS: "weakref.WeakKeyDictionary[Llama, _InferenceWorker]" = weakref.WeakKeyDictionary()
+
+def _load_model(model_path: str, verbose: bool, cpu_affinity: Optional[List[int]] = None,
+                prompt_cache_bytes: int = 0, **load_params: Any) -> Llama:
+    """Returns a shared Llama handle for the given load parameters, loading it on first use."""
+    # The prompt cache and the pinned inference worker belong to the handle, so providers asking for a
+    # different cache size or CPU set get their own
+    affinity = tuple(sorted(set(cpu_affinity))) if cpu_affinity else None
+    key = (os.path.realpath(model_path), tuple(sorted(load_params.items())), prompt_cache_bytes, affinity)
+    with _MODEL_CACHE_LOCK:
+        llm = _MODEL_CACHE.get(key)
+        if llm is not None:
+            logger.info(f"Reusing already loaded GGUF model: {model_path}")
+            return llm
+        if any(cached[0] == key[0] for cached in _MODEL_CACHE.keys()):
+            # Another context for the same file: weights are only shared through the mmap'd pages
+            if load_params.get('use_mmap', True):
+                logger.info(f"Loading {model_path} again with different load params; weights are shared via mmap.")
+            else:
+                logger.warning(f"Loading a second copy of {model_path} with use_mmap disabled; weights will be duplicated in RAM.")
+        llm = Llama(
+            model_path=model_path,
+            logits_all=False, # Only the last token's logits are needed for sampling
+            verbose=verbose,
+            **load_params
+        )
+        if prompt_cache_bytes:
+            # Saves KV state keyed by prompt tokens; a new prompt sharing a cached prefix (e.g. the same
+            # system/persona text) restores that state and only prefills the remainder
+            llm.set_cache(LlamaRAMCache(capacity_bytes=prompt_cache_bytes))
+        _MODEL_CACHE[key] = llm
+        worker = _InferenceWorker(os.path.basename(model_path), cpu_affinity)
+        _MODEL_WORKERS[llm] = worker
+        weakref.finalize(llm, worker.stop) # Worker exits once the model is unloaded
+        return llm
+
+def _gpu_offload_supported() -> bool:
+    """True if the installed llama.cpp build was compiled with a GPU backend (CUDA, Metal, ...)."""
+    probe = getattr(llama_cpp, "llama_supports_gpu_offload", None)
+    try:
+        return bool(probe()) if probe else False
+    except Exception as e:
+        logger.debug(f"GPU offload probe failed, assuming CPU only: {e}")
+        return False
+
+def _ggml_type(name: Optional[str]) -> Optional[int]:
+    """Maps a KV cache type name such as 'q8_0' to llama.cpp's GGML_TYPE_* constant."""
+    if not name:
+        return None
+    value = getattr(llama_cpp, f"GGML_TYPE_{name.upper()}", None)
+    if value is None:
+        logger.warning(f"Unknown KV cache type '{name}', keeping llama.cpp default.")
+    return value
+
 class LocalGGUFProvider(BaseLLMProvider):
     def __init__(self, config_dict: Dict[str, Any]): # Renamed config to config_dict
         super().__init__(config_dict) # Calls BaseLLMProvider's __init__, sets self.config_dict
@@ -20,9 +129,30 @@ class LocalGGUFProvider(BaseLLMProvider):
             raise ValueError(f"LocalGGUFProvider config missing or invalid 'model_path': {self.model_path}")
 
         # Llama constructor parameters from config
-        self.n_gpu_layers = self.config_dict.get('n_gpu_layers', 0) # Default: 0 (CPU only)
+        # Default: offload every layer (-1) when this llama.cpp build can use CUDA/Metal/etc., else CPU only
+        self.n_gpu_layers = self.config_dict.get('n_gpu_layers', -1 if _gpu_offload_supported() else 0)
+        self.main_gpu = self.config_dict.get('main_gpu', 0)
         self.n_ctx = self.config_dict.get('n_ctx', 2048) # Context window
         self.verbose_llama = self.config_dict.get('verbose', False) # llama-cpp verbose
+        self.n_batch = self.config_dict.get('n_batch', 512)
+        self.n_threads = self.config_dict.get('n_threads', os.cpu_count())
+        # Opt-in RAM cache of KV states (bytes; 0 = off). llama-cpp already reuses the prefix shared with the
+        # previous prompt, and with a cache it also snapshots the state after every completion. Only worth it when
+        # prompts alternate between a few long shared prefixes (e.g. several personas on one model)
+        self.prompt_cache_bytes = self.config_dict.get('prompt_cache_bytes', 0)
+        # Optional CPU pinning for the model's inference thread: a list of core ids, or True for the first n_threads cores
+        cpu_affinity = self.config_dict.get('cpu_affinity')
+        self.cpu_affinity: Optional[List[int]] = list(range(self.n_threads)) if cpu_affinity is True else cpu_affinity
+        self.use_mmap = self.config_dict.get('use_mmap', True) # Page weights in lazily from the file
+        self.use_mlock = self.config_dict.get('use_mlock', False) # Pin weights in RAM (needs a sufficient memlock limit)
+        self.flash_attn = self.config_dict.get('flash_attn', True) # Fused attention; required for a quantized V cache
+        # q8_0 halves KV cache memory traffic versus f16 with negligible quality loss
+        self.kv_cache_type = self.config_dict.get('kv_cache_type', 'q8_0') if self.flash_attn else None
+        # Quantization is baked into the GGUF file; an explicit 'model_quant' (e.g. 'Q4_K_M', ~4x less RAM than
+        # FP16 and faster decoding on memory-bound CPUs) only checks the file name matches what was asked for
+        self.model_quant: Optional[str] = self.config_dict.get('model_quant')
+        if self.model_quant and self.model_quant.lower() not in os.path.basename(self.model_path).lower():
+            logger.warning(f"LocalGGUFProvider: model file {self.model_path} does not look like a {self.model_quant} quantization.")
 
         # Parameters for generation, can be overridden by kwargs in generate_text
         self.temperature = self.config_dict.get('temperature', 0.7)
@@ -31,20 +161,21 @@ class LocalGGUFProvider(BaseLLMProvider):
         self.top_k = self.config_dict.get('top_k', 40)
         # Add other relevant Llama params as needed from self.config_dict for generation
 
+        # Deterministic (temperature 0) responses are cached by default; 'cache_responses' opts in for all calls
+        self.cache_responses = self.config_dict.get('cache_responses', False)
+        self.response_cache: Optional[LLMCache] = get_default_cache() if self.config_dict.get('response_cache', True) else None
+
         self.llm: Optional[Llama] = None # Initialize llm attribute
 
         logger.info(f"Initializing LocalGGUFProvider with model: {self.model_path}")
-        logger.info(f"  n_gpu_layers: {self.n_gpu_layers}, n_ctx: {self.n_ctx}, verbose: {self.verbose_llama}")
+        logger.info(f"  n_gpu_layers: {self.n_gpu_layers} ({'all' if self.n_gpu_layers == -1 else self.n_gpu_layers or 'CPU only'}), n_ctx: {self.n_ctx}, n_batch: {self.n_batch}, n_threads: {self.n_threads}, verbose: {self.verbose_llama}")
+        logger.info(f"  use_mmap: {self.use_mmap}, use_mlock: {self.use_mlock}, flash_attn: {self.flash_attn}, kv_cache_type: {self.kv_cache_type}")
         logger.info(f"  Default generation params: temp={self.temperature}, max_tokens={self.max_tokens}, top_p={self.top_p}, top_k={self.top_k}")
 
         try:
-            self.llm = Llama(
-                model_path=self.model_path,
-                n_gpu_layers=self.n_gpu_layers,
-                n_ctx=self.n_ctx,
-                verbose=self.verbose_llama
-                # Other Llama __init__ params can be added here from self.config_dict if needed
-            )
+            # The heavy model handle is shared; sampling params below stay per-instance
+            self.llm = _load_model(self.model_path, self.verbose_llama, self.cpu_affinity, self.prompt_cache_bytes,
+                                   **self._load_params())
             logger.info(f"Successfully loaded GGUF model from: {self.model_path}")
         except Exception as e:
             logger.error(f"Failed to load GGUF model from {self.model_path}: {e}", exc_info=True)
@@ -52,23 +183,35 @@ class LocalGGUFProvider(BaseLLMProvider):
             # Optionally re-raise or handle as a critical failure for the provider
             raise ValueError(f"Could not load GGUF model: {e}") from e
 
+    def _load_params(self) -> Dict[str, Any]:
+        params = {
+            'n_gpu_layers': self.n_gpu_layers,
+            'n_ctx': self.n_ctx,
+            'n_batch': self.n_batch, # Prompt tokens evaluated per forward pass
+            'n_threads': self.n_threads,
+            'use_mmap': self.use_mmap,
+            'use_mlock': self.use_mlock,
+            'flash_attn': self.flash_attn,
+        }
+        if self.n_gpu_layers:
+            params['main_gpu'] = self.main_gpu
+        kv_type = _ggml_type(self.kv_cache_type)
+        if kv_type is not None:
+            params['type_k'] = kv_type
+            params['type_v'] = kv_type
+        return params
 
-    async def generate_text(self, prompt: str, context_type: str = "general", **kwargs) -> Optional[str]:
-        # context_type is part of the interface, not directly used here unless for specific prompt engineering
-        if not self.llm:
-            logger.error("LocalGGUFProvider: GGUF model not loaded or failed to initialize.")
-            return None
-
-        # Prepare parameters for create_completion, allowing overrides from kwargs
+    def _completion_params(self, prompt: str, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        # Prepare parameters for create_chat_completion, allowing overrides from kwargs
         # Default values are taken from instance attributes set during __init__
         current_temp = kwargs.get('temperature', self.temperature)
         current_max_tokens = kwargs.get('max_tokens', self.max_tokens)
         current_top_p = kwargs.get('top_p', self.top_p)
         current_top_k = kwargs.get('top_k', self.top_k)
-        # Add other create_completion params from kwargs or self.config_dict as needed
+        # Add other create_chat_completion params from kwargs or self.config_dict as needed
         # e.g., stop sequences, presence_penalty, frequency_penalty
 
-        # Construct the messages payload for Llama.create_completion
+        # Construct the messages payload for Llama.create_chat_completion
         # It expects a list of messages, similar to OpenAI API.
         # For a simple prompt, it's usually:
         messages = [
@@ -79,8 +222,12 @@ class LocalGGUFProvider(BaseLLMProvider):
         # if system_prompt:
         # messages.insert(0, {"role": "system", "content": system_prompt})
 
-        # Parameters for the create_completion call
-        completion_params = {
+        # Remove None values from params if Llama complains, or ensure defaults are always set.
+        # For example, if max_tokens is -1 for unlimited, ensure that's handled if Llama expects None or positive int.
+        # llama-cpp typically expects positive for max_tokens, or defaults if not given.
+
+        # Parameters for the create_chat_completion call
+        params = {
             "messages": messages,
             "temperature": current_temp,
             "max_tokens": current_max_tokens,
@@ -88,29 +235,52 @@ class LocalGGUFProvider(BaseLLMProvider):
             "top_k": current_top_k,
             # "stop": ["\n", "User:"], # Example stop sequences
         }
-        
-        # Remove None values from params if Llama complains, or ensure defaults are always set.
-        # For example, if max_tokens is -1 for unlimited, ensure that's handled if Llama expects None or positive int.
-        # llama-cpp typically expects positive for max_tokens, or defaults if not given.
+        schema = kwargs.get('response_schema')
+        if kwargs.get('json_mode') or schema is not None:
+            # llama.cpp constrains sampling with a JSON grammar (built from the schema when one is a dict)
+            params["response_format"] = {"type": "json_object", **({"schema": schema} if isinstance(schema, dict) else {})}
+        return params
+
+    async def generate_text(self, prompt: str, context_type: str = "general", **kwargs) -> Optional[str]:
+        # context_type is part of the interface, not directly used here unless for specific prompt engineering
+        if not self.llm:
+            logger.error("LocalGGUFProvider: GGUF model not loaded or failed to initialize.")
+            return None
 
-        log_call_params = {k:v for k,v in completion_params.items() if k != "messages"}
-        log_call_params["messages_summary"] = messages[-1]['content'][:70] + ('...' if len(messages[-1]['content']) > 70 else '')
-        logger.debug(f"Calling GGUF model create_completion with params: {log_call_params}")
+        completion_params = self._completion_params(prompt, kwargs)
+        messages = completion_params["messages"]
+
+        cache_key = None
+        if self.response_cache is not None:
+            cache_key = LLMCache.cache_key(os.path.realpath(self.model_path), messages, completion_params["temperature"],
+                                           opt_in=self.cache_responses, max_tokens=completion_params["max_tokens"],
+                                           top_p=completion_params["top_p"], top_k=completion_params["top_k"])
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                logger.debug("GGUF generate_text served from cache.")
+                return cached
+
+        if logger.isEnabledFor(logging.DEBUG): # Skip building the summary on every call at INFO
+            log_call_params = {k:v for k,v in completion_params.items() if k != "messages"}
+            log_call_params["messages_summary"] = messages[-1]['content'][:70] + ('...' if len(messages[-1]['content']) > 70 else '')
+            logger.debug("Calling GGUF model create_chat_completion with params: %s", log_call_params)
 
         try:
-            loop = asyncio.get_event_loop()
-            
-            # Define the synchronous blocking function to be run in the executor
+            # Define the synchronous blocking function to be run on the model's inference thread
+            # (create_completion takes a raw prompt; messages need the chat-template entry point)
             def _create_completion_sync():
-                return self.llm.create_completion(**completion_params)
+                return self.llm.create_chat_completion(**completion_params)
 
-            completion = await loop.run_in_executor(None, _create_completion_sync)
+            completion = await _MODEL_WORKERS[self.llm].run(_create_completion_sync)
             
-            if completion and completion['choices'] and completion['choices'][0]['message'] and \
-               completion['choices'][0]['message']['content']:
-                text_content = completion['choices'][0]['message']['content']
+            choices = completion.get('choices') if completion else None
+            text_content = (choices[0].get('message') or {}).get('content') if choices else None
+            if text_content:
                 logger.info(f"GGUF model generated text successfully. Length: {len(text_content)}")
-                return text_content.strip()
+                text_content = text_content.strip()
+                if cache_key:
+                    self.response_cache.set(cache_key, text_content)
+                return text_content
             else:
                 logger.warning(f"GGUF model text generation returned empty or malformed response: {completion}")
                 return None
@@ -118,6 +288,45 @@ class LocalGGUFProvider(BaseLLMProvider):
             logger.error(f"Error during GGUF model text generation: {e}", exc_info=True)
             return None
 
+    async def generate_text_stream(self, prompt: str, context_type: str = "general", **kwargs) -> AsyncIterator[str]:
+        """Yields tokens as llama.cpp decodes them, so callers can start on the reply before it is complete."""
+        if not self.llm:
+            logger.error("LocalGGUFProvider: GGUF model not loaded or failed to initialize.")
+            return
+
+        completion_params = self._completion_params(prompt, kwargs)
+        loop = asyncio.get_running_loop()
+        chunks: asyncio.Queue = asyncio.Queue()
+        done = object()
+        stop = threading.Event() # Set when the consumer goes away, so the worker stops decoding
+
+        def _stream_sync():
+            try:
+                for chunk in self.llm.create_chat_completion(stream=True, **completion_params):
+                    if stop.is_set():
+                        break
+                    choices = chunk.get('choices')
+                    text = (choices[0].get('delta') or {}).get('content') if choices else None
+                    if text:
+                        loop.call_soon_threadsafe(chunks.put_nowait, text)
+            finally:
+                if not stop.is_set():
+                    loop.call_soon_threadsafe(chunks.put_nowait, done)
+
+        future = _MODEL_WORKERS[self.llm].submit(_stream_sync)
+        try:
+            while (text := await chunks.get()) is not done:
+                yield text
+            # Errors propagate so the fallback manager can decide whether switching providers is still safe
+            await asyncio.wrap_future(future)
+        finally:
+            stop.set()
+
+    async def generate_text_batch(self, prompts: List[str], context_type: str = "general", **kwargs) -> List[Optional[str]]:
+        """Generates completions for several prompts, returned in input order. All requests are queued on
+        the model's inference thread up front, so it moves from one to the next without idling."""
+        return list(await asyncio.gather(*(self.generate_text(p, context_type=context_type, **kwargs) for p in prompts)))
+
     async def analyze_image(self, image_path: str, context_type: str = "image_analysis", prompt_override: Optional[str] = None, **kwargs) -> Optional[str]:
         logger.warning(f"LocalGGUFProvider.analyze_image: Operation not supported by most GGUF models. Model: {self.model_path}. Image path: {image_path}")
         # If self.llm is a LLaVA model, specific handling would be needed here.
@@ -135,8 +344,8 @@ class LocalGGUFProvider(BaseLLMProvider):
 #         'type': 'local_gguf', # This type name would be registered in LLMFallbackManager
 #         'enabled': True,
 #         'config': {
-#             'model_path': '/path/to/your/model.gguf', # Critical: User must provide this
-#             'n_gpu_layers': 0, # Or number of layers to offload if GPU supported & compiled
+#             'model_path': '/path/to/your/model.Q4_K_M.gguf', # Critical: User must provide this; Q4_K_M/Q5_K_M recommended
+#             'n_gpu_layers': -1, # All layers; defaults to -1 when the build supports GPU offload, else 0
 #             'n_ctx': 4096,
 #             'temperature': 0.6,
 #             'max_tokens': 1024,
@@ -1,10 +1,13 @@
 # xviolet/media_tracker.py
 import os
 import logging
+import sqlite3
+import threading
+from typing import Optional
 
 logger = logging.getLogger(__name__)
 
-USED_MEDIA_LOG_FILE = "data/used_media.txt"
+USED_MEDIA_LOG_FILE = "data/used_media.txt" # Legacy plain-text log, imported into the database
 
 def _ensure_data_directory():
     """Ensures the data directory for the log file exists."""
@@ -18,59 +21,123 @@ def _ensure_data_directory():
             return False
     return True
 
-def load_used_media() -> set:
-    """
-    Reads the used media log file and returns a set of filenames.
-    Returns an empty set if the file doesn't exist or an error occurs.
-    """
-    if not _ensure_data_directory():
-        return set() # Cannot proceed if data directory cannot be ensured
+# Used media now lives in SQLite: membership is one indexed lookup and nothing has to be loaded at
+# startup. Names from the legacy text log are imported once when the database is first opened.
+USED_MEDIA_DB_FILE = "data/used_media.db"
+
+_DB = {'path': None, 'conn': None}
+_DB_LOCK = threading.Lock()
 
+def _get_connection() -> Optional[sqlite3.Connection]:
+    with _DB_LOCK:
+        if _DB['conn'] is not None and _DB['path'] == USED_MEDIA_DB_FILE:
+            return _DB['conn']
+        if _DB['conn'] is not None:
+            _DB['conn'].close()
+            _DB['conn'] = None
+        if not _ensure_data_directory():
+            return None
+        try:
+            conn = sqlite3.connect(USED_MEDIA_DB_FILE, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS used_media (filename TEXT PRIMARY KEY) WITHOUT ROWID")
+            _import_legacy_log(conn)
+        except sqlite3.Error as e:
+            logger.error(f"Could not open used media database {USED_MEDIA_DB_FILE}: {e}")
+            return None
+        _DB.update(path=USED_MEDIA_DB_FILE, conn=conn)
+        return conn
+
+def _import_legacy_log(conn: sqlite3.Connection):
+    """Copies names from the old used_media.txt into the table (idempotent)."""
     if not os.path.exists(USED_MEDIA_LOG_FILE):
-        logger.info(f"Used media log file {USED_MEDIA_LOG_FILE} not found. Returning empty set.")
-        return set()
+        return
     try:
         with open(USED_MEDIA_LOG_FILE, 'r') as f:
-            used_files = {line.strip() for line in f if line.strip()}
-            logger.info(f"Loaded {len(used_files)} items from {USED_MEDIA_LOG_FILE}")
-            return used_files
+            names = [(line.strip(),) for line in f if line.strip()]
     except IOError as e:
-        logger.error(f"Error loading used media log {USED_MEDIA_LOG_FILE}: {e}")
+        logger.error(f"Error reading legacy used media log {USED_MEDIA_LOG_FILE}: {e}")
+        return
+    if names:
+        conn.executemany("INSERT OR IGNORE INTO used_media (filename) VALUES (?)", names)
+        logger.info(f"Imported {len(names)} entries from legacy log {USED_MEDIA_LOG_FILE}")
+
+
+class UsedMedia:
+    """Set-like view over the used_media table. `in` runs an indexed lookup; nothing is held in memory."""
+
+    def __contains__(self, filename) -> bool:
+        conn = _get_connection()
+        if conn is None:
+            return False
+        return conn.execute("SELECT 1 FROM used_media WHERE filename = ?", (filename,)).fetchone() is not None
+
+    def add(self, filename: str):
+        conn = _get_connection()
+        if conn is not None:
+            conn.execute("INSERT OR IGNORE INTO used_media (filename) VALUES (?)", (filename,))
+
+    def __len__(self) -> int:
+        conn = _get_connection()
+        return conn.execute("SELECT COUNT(*) FROM used_media").fetchone()[0] if conn is not None else 0
+
+    def __iter__(self):
+        return iter(load_all())
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+
+def load_used_media() -> UsedMedia:
+    """
+    Returns a set-like view of used media filenames backed by the database.
+    Use load_all() when an actual in-memory set is needed.
+    """
+    return UsedMedia()
+
+def load_all() -> set:
+    """Reads every used media filename into a set."""
+    conn = _get_connection()
+    if conn is None:
         return set()
+    return {row[0] for row in conn.execute("SELECT filename FROM used_media")}
 
 def mark_media_as_used(filename: str):
     """
-    Appends a filename to the used media log file.
+    Records a filename as used.
     """
-    if not _ensure_data_directory():
-        logger.error(f"Cannot mark media as used; data directory {os.path.dirname(USED_MEDIA_LOG_FILE)} could not be ensured.")
+    conn = _get_connection()
+    if conn is None:
+        logger.error(f"Cannot mark media as used; database {USED_MEDIA_DB_FILE} is unavailable.")
         return
-
     try:
-        with open(USED_MEDIA_LOG_FILE, 'a') as f:
-            f.write(filename + '\n')
-        logger.info(f"Marked media as used: {filename} in {USED_MEDIA_LOG_FILE}")
-    except IOError as e:
-        logger.error(f"Error marking media as used in {USED_MEDIA_LOG_FILE} for {filename}: {e}")
+        conn.execute("INSERT OR IGNORE INTO used_media (filename) VALUES (?)", (filename,))
+        logger.info(f"Marked media as used: {filename} in {USED_MEDIA_DB_FILE}")
+    except sqlite3.Error as e:
+        logger.error(f"Error marking media as used in {USED_MEDIA_DB_FILE} for {filename}: {e}")
 
-def is_media_used(filename: str, used_media_set: set) -> bool:
+def is_media_used(filename: str, used_media_set=None) -> bool:
     """
-    Checks if a filename is in the provided set of used media.
+    Checks if a filename is in the provided set of used media, or in the database when no set is given.
     """
+    if used_media_set is None:
+        return filename in UsedMedia()
     return filename in used_media_set
 
 if __name__ == '__main__':
     # Example usage and basic test
     logging.basicConfig(level=logging.INFO)
     
-    # Clean up existing log for fresh test run if needed
-    if os.path.exists(USED_MEDIA_LOG_FILE):
-        os.remove(USED_MEDIA_LOG_FILE)
-        logger.info(f"Removed existing log file for testing: {USED_MEDIA_LOG_FILE}")
+    # Clean up existing log/database for fresh test run if needed
+    for path in (USED_MEDIA_LOG_FILE, USED_MEDIA_DB_FILE, USED_MEDIA_DB_FILE + "-wal", USED_MEDIA_DB_FILE + "-shm"):
+        if os.path.exists(path):
+            os.remove(path)
+            logger.info(f"Removed existing file for testing: {path}")
 
     # Test loading when file doesn't exist
     initial_set = load_used_media()
-    logger.info(f"Initial used media set (should be empty): {initial_set}")
+    logger.info(f"Initial used media set (should be empty): {load_all()}")
     assert not initial_set
 
     # Test marking media as used
@@ -80,7 +147,7 @@ if __name__ == '__main__':
 
     # Test loading after marking
     current_set = load_used_media()
-    logger.info(f"Current used media set: {current_set}")
+    logger.info(f"Current used media set: {load_all()}")
     assert len(current_set) == len(media_to_mark)
     for media in media_to_mark:
         assert is_media_used(media, current_set)
@@ -91,7 +158,7 @@ if __name__ == '__main__':
     # Test marking another media
     mark_media_as_used("another_image.jpeg")
     final_set = load_used_media()
-    logger.info(f"Final used media set: {final_set}")
+    logger.info(f"Final used media set: {load_all()}")
     assert len(final_set) == len(media_to_mark) + 1
     assert is_media_used("another_image.jpeg", final_set)
     
@@ -5,18 +5,35 @@ Loads and parses the character persona (holly.json) and provides helpers for LLM
 import os
 from dotenv import load_dotenv
 import json
+from functools import cached_property
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
+try:
+    from orjson import loads as _json_loads # Optional C parser; its JSONDecodeError subclasses json's
+except ImportError:
+    from json import loads as _json_loads
+
+# Parsed character files keyed by (resolved path, mtime_ns, size); Persona instances for the same
+# unchanged file share one dict instead of re-reading and re-parsing it
+_PARSED_CACHE: Dict[tuple, Dict[str, Any]] = {}
+_DOTENV_LOADED = False
+# Bundled persona, located relative to the package so startup does not depend on the working directory
+_DEFAULT_CHARACTER_PATH = Path(__file__).resolve().parent.parent / "character" / "holly.json"
+
 
 class Persona:
     def __init__(self, character_path: Optional[str] = None):
         """
         Loads the persona from the provided character JSON file.
-        If no path is given, checks the CHARACTER_FILE env variable, then defaults to x_violet/character/holly.json relative to the repo root.
+        If no path is given, checks the CHARACTER_FILE env variable, then defaults to character/holly.json in the repo root.
+        Relative paths given explicitly or via CHARACTER_FILE resolve against the current working directory.
         """
         # Load .env if not already loaded
-        load_dotenv()
+        global _DOTENV_LOADED
+        if not _DOTENV_LOADED:
+            load_dotenv()
+            _DOTENV_LOADED = True
         env_character_path = os.getenv("CHARACTER_FILE")
 
         # Priority: argument > env > default
@@ -25,24 +42,35 @@ class Persona:
         elif env_character_path:
             resolved_path = Path(env_character_path)
         else:
-            resolved_path = Path("character/holly.json")
+            resolved_path = _DEFAULT_CHARACTER_PATH
 
-        # Always resolve relative paths from the current working directory
+        # Resolve relative paths from the current working directory
         if not resolved_path.is_absolute():
-            resolved_path = (Path(os.getcwd()) / resolved_path).resolve()
+            resolved_path = resolved_path.resolve()
         self.character_file_path = resolved_path
+        # self.data is never mutated after loading, so built LLM context strings are cached for the
+        # instance's lifetime, keyed by context_type; see get_full_context_for_llm
+        self._context_cache: Dict[str, str] = {}
+        self._section_cache: Dict[str, str] = {} # Sections shared between context types
         print(f"[Persona Loader] Resolved persona file path: {self.character_file_path}")
 
         if not self.character_file_path.exists():
             raise FileNotFoundError(f"Character file not found: {self.character_file_path}")
 
+        stat = self.character_file_path.stat()
+        cache_key = (self.character_file_path, stat.st_mtime_ns, stat.st_size)
+        cached = _PARSED_CACHE.get(cache_key)
+        if cached is not None:
+            self.data = cached
+            return
+
         try:
             with open(self.character_file_path, encoding="utf-8-sig") as f:
                 raw = f.read()
                 # Remove leading/trailing whitespace or blank lines that might cause issues
                 raw = raw.lstrip()
                 try:
-                    self.data = json.loads(raw)
+                    self.data = _json_loads(raw)
                 except json.JSONDecodeError as e:
                     # Print a snippet of the raw content for debugging
                     snippet = '\n'.join(raw.splitlines()[:10])
@@ -52,43 +80,45 @@ class Persona:
                     )
         except Exception as e:
             raise IOError(f"Error reading character file {self.character_file_path}: {e}")
+        _PARSED_CACHE[cache_key] = self.data
 
-    @property
+    # The data-backed accessors below are cached on first read; self.data is not modified after load
+    @cached_property
     def name(self) -> str:
         return self.data.get("name", "Unknown Persona")
 
-    @property
+    @cached_property
     def bio(self) -> List[str]:
         return self.data.get("bio", [])
 
-    @property
+    @cached_property
     def system(self) -> str:
         """The core system prompt defining the roleplay character."""
         return self.data.get("system", "Act as a helpful AI assistant.")
 
-    @property
+    @cached_property
     def lore(self) -> List[str]:
         return self.data.get("lore", [])
 
-    @property
+    @cached_property
     def style(self) -> Dict[str, List[str]]:
         """Style guidelines for different contexts (all, chat, post)."""
         return self.data.get("style", {})
 
-    @property
+    @cached_property
     def adjectives(self) -> List[str]:
         return self.data.get("adjectives", [])
 
-    @property
+    @cached_property
     def topics(self) -> List[str]:
         return self.data.get("topics", [])
 
-    @property
+    @cached_property
     def message_examples(self) -> List[Any]:
         """Few-shot examples for chat interactions."""
         return self.data.get("messageExamples", [])
 
-    @property
+    @cached_property
     def post_examples(self) -> List[str]:
         """Few-shot examples for creating posts."""
         return self.data.get("postExamples", [])
@@ -102,10 +132,10 @@ class Persona:
         Returns a concise summary string of the persona for basic context.
         Includes name, system prompt overview, and key adjectives.
         """
-        summary = f"You are {self.name}. Your core instruction is: '{self.system}'. "
-        if self.adjectives:
-            summary += f"Key personality traits: {', '.join(self.adjectives)}. "
-        return summary.strip()
+        adjectives = self.adjectives
+        if adjectives: # Common shape: build it in a single f-string
+            return f"You are {self.name}. Your core instruction is: '{self.system}'. Key personality traits: {', '.join(adjectives)}."
+        return f"You are {self.name}. Your core instruction is: '{self.system}'."
 
     def get_full_context_for_llm(self, context_type: str = "chat") -> str:
         """
@@ -115,6 +145,36 @@ class Persona:
         Args:
             context_type: 'chat' or 'post' to tailor style guidelines and examples.
         """
+        context = self._context_cache.get(context_type)
+        if context is None:
+            context = self._context_cache[context_type] = self._build_context(context_type)
+        return context
+
+    def _section(self, name: str, builder) -> str:
+        """Builds a named context section once per persona."""
+        section = self._section_cache.get(name)
+        if section is None:
+            section = self._section_cache[name] = builder()
+        return section
+
+    def _build_context(self, context_type: str) -> str:
+        # Only the sections this context_type needs are built; each is reused across context types
+        context_parts = [self._section("core", self._core_context)]
+
+        style_section = self._section(f"style:{context_type}", lambda: self._style_section(context_type))
+        if style_section:
+            context_parts.append(style_section)
+
+        # Add relevant examples
+        if context_type == "chat" and self.message_examples:
+            context_parts.append(self._section("chat", self._chat_extras))
+        elif context_type == "post" and self.post_examples:
+            context_parts.append(self._section("post", self._post_extras))
+
+        return "\n\n".join(context_parts)
+
+    def _core_context(self) -> str:
+        """Name, system prompt, bio, lore, adjectives and topics: shared by every context type."""
         context_parts = [f"## Roleplay Instructions for {self.name}"]
         context_parts.append(f"**Core System Prompt:** {self.system}")
 
@@ -130,31 +190,31 @@ class Persona:
         if self.topics:
             topic_str = ", ".join(self.topics)
             context_parts.append(f"**Common Topics:** {topic_str}")
+        return "\n\n".join(context_parts)
 
-        style_rules = self.get_style_guidelines("all") + self.get_style_guidelines(context_type)
-        # Remove duplicates while preserving order if necessary (simple list conversion is fine here)
-        unique_style_rules = list(dict.fromkeys(style_rules))
-        if unique_style_rules:
-            style_str = "\n- ".join(unique_style_rules)
-            context_parts.append(f"**Style Guidelines ({context_type}):**\n- {style_str}")
-
-        # Add relevant examples
-        if context_type == "chat" and self.message_examples:
-            context_parts.append("\n**Example Chat Interactions:**")
-            for i, example in enumerate(self.message_examples):
-                chat_str = f"Example {i+1}:"
-                # Ensure example is a list of dicts with 'user' and 'content'
-                if isinstance(example, list):
-                    for turn in example:
-                        if isinstance(turn, dict) and 'user' in turn and 'content' in turn and 'text' in turn['content']:
-                            user = turn['user']
-                            text = turn['content']['text']
-                            # Indent each line of the turn for clarity
-                            chat_str += f"\n  {user}: {text}"
-                context_parts.append(chat_str)
-
-        elif context_type == "post" and self.post_examples:
-            post_examples_str = "\n- ".join(self.post_examples)
-            context_parts.append(f"\n**Example Posts:**\n- {post_examples_str}")
-
+    def _style_section(self, context_type: str) -> str:
+        # 'all' rules first, then context-specific ones, dropping repeats while preserving order
+        seen = set()
+        unique_style_rules = [rule for rule in self.get_style_guidelines("all") + self.get_style_guidelines(context_type)
+                              if rule not in seen and not seen.add(rule)]
+        if not unique_style_rules:
+            return ""
+        style_str = "\n- ".join(unique_style_rules)
+        return f"**Style Guidelines ({context_type}):**\n- {style_str}"
+
+    def _chat_extras(self) -> str:
+        context_parts = ["\n**Example Chat Interactions:**"]
+        for i, example in enumerate(self.message_examples):
+            turn_parts = [f"Example {i+1}:"] # Joined once per example rather than grown with +=
+            # Ensure example is a list of dicts with 'user' and 'content'
+            if isinstance(example, list):
+                for turn in example:
+                    if isinstance(turn, dict) and 'user' in turn and 'content' in turn and 'text' in turn['content']:
+                        # Indent each line of the turn for clarity
+                        turn_parts.append(f"\n  {turn['user']}: {turn['content']['text']}")
+            context_parts.append("".join(turn_parts))
         return "\n\n".join(context_parts)
+
+    def _post_extras(self) -> str:
+        post_examples_str = "\n- ".join(self.post_examples)
+        return f"\n**Example Posts:**\n- {post_examples_str}"
@@ -1,6 +1,13 @@
+import array
+import atexit
 import os
 import sqlite3
 import logging
+import struct
+import sys
+import threading
+from contextlib import contextmanager
+from typing import Optional
 
 logger = logging.getLogger(__name__)
 
@@ -38,6 +45,27 @@ CREATE INDEX IF NOT EXISTS idx_tweet_convo ON tweets(conversation_id);
 CREATE INDEX IF NOT EXISTS idx_embedding_tweet_id ON tweet_embeddings(tweet_id);
 """
 
+EMBEDDING_DIM = 768
+
+def pack_embedding(vec) -> bytes:
+    """Canonical embedding BLOB: contiguous little-endian float32, the layout sqlite-vec reads directly."""
+    if hasattr(vec, 'astype'): # numpy array
+        return vec.astype('<f4', copy=False).tobytes()
+    buf = array.array('f', vec)
+    if sys.byteorder != 'little':
+        buf.byteswap()
+    return buf.tobytes()
+
+def pack_embedding_q8(vec) -> bytes:
+    """int8-quantized embedding (a quarter of the float32 size) followed by its float32 scale.
+
+    Decode as int8_values * scale. Use when search bandwidth matters more than the last bit of recall.
+    """
+    values = vec.tolist() if hasattr(vec, 'tolist') else list(vec)
+    scale = max((abs(v) for v in values), default=0.0) / 127 or 1.0
+    quantized = array.array('b', (max(-127, min(127, round(v / scale))) for v in values))
+    return quantized.tobytes() + struct.pack('<f', scale)
+
 # Example seed data (for dev/testing)
 SEED_TWEETS = [
     ("seed1", "u123", "tester", "2025-04-27T20:00:00", "conv1", None, "Hello world!", 1, 1),
@@ -47,8 +75,8 @@ SEED_CONVOS = [
     ("conv1", "seed1", "2025-04-27T20:01:00"),
 ]
 SEED_EMBEDDINGS = [
-    (1, "seed1", b"\x00"*768),
-    (2, "seed2", b"\x01"*768),
+    (1, "seed1", pack_embedding([0.0] * EMBEDDING_DIM)),
+    (2, "seed2", pack_embedding([1.0] * EMBEDDING_DIM)),
 ]
 
 def ensure_data_dir():
@@ -56,27 +84,90 @@ def ensure_data_dir():
         os.makedirs(DATA_DIR)
         logger.info(f"Created data directory at {DATA_DIR}")
 
-def get_connection():
-    ensure_data_dir()
-    conn = sqlite3.connect(DB_PATH)
+# Extension name -> whether it loaded on the first attempt. Missing extensions are not retried on
+# later connections, so minimal deployments don't pay a failing load (and its exception) per open.
+_EXTENSION_AVAILABLE = {}
+_LOAD_EXTENSION_SUPPORTED: Optional[bool] = None
+
+def _load_extensions(conn):
     # Load extensions if available
+    global _LOAD_EXTENSION_SUPPORTED
+    if _LOAD_EXTENSION_SUPPORTED is False:
+        return
     try:
         conn.enable_load_extension(True)
-        conn.execute("SELECT load_extension('vec')")
-        conn.execute("SELECT load_extension('rembed')")
-        logger.info("Loaded sqlite-vec and sqlite-rembed extensions.")
-    except Exception as e:
+        _LOAD_EXTENSION_SUPPORTED = True
+    except Exception as e: # e.g. Python built without extension loading support
         logger.warning(f"Could not load vector/embedding extensions: {e}")
+        _LOAD_EXTENSION_SUPPORTED = False
+        return
+    for name in ('vec', 'rembed'):
+        if _EXTENSION_AVAILABLE.get(name) is False:
+            continue
+        try:
+            conn.load_extension(name)
+            if name not in _EXTENSION_AVAILABLE:
+                logger.info(f"Loaded sqlite-{name} extension.")
+            _EXTENSION_AVAILABLE[name] = True
+        except Exception as e:
+            logger.warning(f"Could not load sqlite-{name} extension, skipping it from now on: {e}")
+            _EXTENSION_AVAILABLE[name] = False
+    conn.enable_load_extension(False)
+
+def get_connection():
+    ensure_data_dir()
+    conn = sqlite3.connect(DB_PATH)
+    _load_extensions(conn)
     return conn
 
+# Process-wide connection opened on first use; extensions load once instead of per write.
+# The lock serializes transactions since the connection is shared across threads.
+_CONN: Optional[sqlite3.Connection] = None
+_CONN_LOCK = threading.RLock()
+
+def _get_conn_cached() -> sqlite3.Connection:
+    global _CONN
+    with _CONN_LOCK:
+        if _CONN is None:
+            ensure_data_dir()
+            # Autocommit mode: transactions are opened explicitly by _tx
+            conn = sqlite3.connect(DB_PATH, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL") # Durable at checkpoints; WAL keeps the file consistent
+            _load_extensions(conn)
+            _CONN = conn
+            atexit.register(close_connection)
+        return _CONN
+
+def close_connection():
+    global _CONN
+    with _CONN_LOCK:
+        if _CONN is not None:
+            _CONN.close()
+            _CONN = None
+
+@contextmanager
+def _tx(conn):
+    """Serialized write transaction; BEGIN IMMEDIATE takes the write lock up front instead of upgrading later."""
+    with _CONN_LOCK:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            # Also covers a failed COMMIT (e.g. SQLITE_BUSY), which leaves the transaction open; without the
+            # rollback every later BEGIN on the shared connection would fail. SQLite may already have rolled back
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+
 def initialize_db(seed=False):
-    conn = get_connection()
-    with conn:
-        for stmt in SCHEMA.split(';'):
-            if stmt.strip():
-                conn.execute(stmt)
-        logger.info("Database tables ensured.")
-        if seed:
+    conn = _get_conn_cached()
+    with _CONN_LOCK:
+        conn.executescript(SCHEMA) # Parsed by SQLite itself, so ';' inside literals or triggers is safe
+    logger.info("Database tables ensured.")
+    if seed:
+        with _tx(conn):
             try:
                 conn.executemany("INSERT OR IGNORE INTO tweets VALUES (?,?,?,?,?,?,?,?,?)", SEED_TWEETS)
                 conn.executemany("INSERT OR IGNORE INTO conversations VALUES (?,?,?)", SEED_CONVOS)
@@ -84,34 +175,57 @@ def initialize_db(seed=False):
                 logger.info("Seed data inserted.")
             except Exception as e:
                 logger.warning(f"Seed data insertion failed: {e}")
-    conn.close()
+
+_UPSERT_TWEET_SQL = """
+INSERT OR REPLACE INTO tweets (tweet_id, user_id, username, created_at, conversation_id, in_reply_to_status_id, text, processed, embedding_id)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+_UPSERT_CONVERSATION_SQL = """
+INSERT OR REPLACE INTO conversations (conversation_id, root_tweet_id, last_updated)
+VALUES (?, ?, ?)
+"""
+_UPSERT_EMBEDDING_SQL = """
+INSERT OR REPLACE INTO tweet_embeddings (id, tweet_id, embedding)
+VALUES (?, ?, ?)
+"""
+
+def _embedding_row(row):
+    # Arrays (e.g. numpy) are passed as a view of their buffer; bytes go through untouched
+    row_id, tweet_id, embedding = row
+    if not isinstance(embedding, (bytes, bytearray, memoryview)) and hasattr(embedding, 'tobytes'):
+        embedding = memoryview(embedding.tobytes())
+    return row_id, tweet_id, embedding
 
 def upsert_tweet(tweet):
-    conn = get_connection()
-    with conn:
-        conn.execute("""
-        INSERT OR REPLACE INTO tweets (tweet_id, user_id, username, created_at, conversation_id, in_reply_to_status_id, text, processed, embedding_id)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, tweet)
-    conn.close()
+    conn = _get_conn_cached()
+    with _tx(conn):
+        conn.execute(_UPSERT_TWEET_SQL, tweet)
 
 def upsert_conversation(convo):
-    conn = get_connection()
-    with conn:
-        conn.execute("""
-        INSERT OR REPLACE INTO conversations (conversation_id, root_tweet_id, last_updated)
-        VALUES (?, ?, ?)
-        """, convo)
-    conn.close()
+    conn = _get_conn_cached()
+    with _tx(conn):
+        conn.execute(_UPSERT_CONVERSATION_SQL, convo)
 
 def upsert_embedding(embedding):
-    conn = get_connection()
-    with conn:
-        conn.execute("""
-        INSERT OR REPLACE INTO tweet_embeddings (id, tweet_id, embedding)
-        VALUES (?, ?, ?)
-        """, embedding)
-    conn.close()
+    conn = _get_conn_cached()
+    with _tx(conn):
+        conn.execute(_UPSERT_EMBEDDING_SQL, _embedding_row(embedding))
+
+# Batch variants: one transaction and one prepared statement for the whole iterable
+def upsert_tweets(rows):
+    conn = _get_conn_cached()
+    with _tx(conn):
+        conn.executemany(_UPSERT_TWEET_SQL, rows)
+
+def upsert_conversations(rows):
+    conn = _get_conn_cached()
+    with _tx(conn):
+        conn.executemany(_UPSERT_CONVERSATION_SQL, rows)
+
+def upsert_embeddings(rows):
+    conn = _get_conn_cached()
+    with _tx(conn):
+        conn.executemany(_UPSERT_EMBEDDING_SQL, map(_embedding_row, rows))
 
 # Call this on startup
 if __name__ == "__main__":
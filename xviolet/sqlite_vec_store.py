@@ -1,20 +1,45 @@
 import sqlite3
+from collections import OrderedDict
 from pathlib import Path
+from typing import Iterator
 import sqlite_vec
 from xviolet.config import config
 
+# Recently stored/seen tweet ids kept in process to skip the SQL lookup in has_interacted
+RECENT_SEEN_SIZE = 4096
+
 
 class VectorInteractionStore:
     """
     SQLite-backed vector store for tweet interactions.
     Uses sqlite-vec for vector indexing and sqlite-rembed for embeddings.
     """
+    # Constant statement text, so sqlite3's per-connection statement cache reuses the prepared plan
+    _SEARCH_SQL = """
+            SELECT rowid, distance
+            FROM interactions
+            WHERE embedding MATCH rembed(?, ?)
+            ORDER BY distance
+            LIMIT ?
+            """
+
     def __init__(self, path: str = None):
         # Determine DB path
         db_path = Path(path) if path else Path(__file__).resolve().parent.parent / "data" / "interactions.db"
         db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._recent_seen: OrderedDict[str, None] = OrderedDict()
         # Connect and load extensions
         self.db = sqlite3.connect(str(db_path))
+        # WAL lets searches read while interactions are written; NORMAL syncs at checkpoints only
+        self.db.executescript(
+            """
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            PRAGMA temp_store=MEMORY;
+            PRAGMA mmap_size=134217728;
+            PRAGMA cache_size=-65536;
+            """
+        )
         self.db.enable_load_extension(True)
         try:
             sqlite_vec.load(self.db)
@@ -48,20 +73,35 @@ class VectorInteractionStore:
         self.db.commit()
 
     def _create_tables(self):
-        # Virtual table for vector search
-        dim = config.embedding_dim
+        # The schema is tagged with the embedding dim in user_version; an unchanged dim skips the DDL
+        dim = int(config.embedding_dim)
+        (schema_dim,) = self.db.execute("PRAGMA user_version").fetchone()
+        if schema_dim == dim:
+            return
+        # Virtual table for vector search (vec0 takes the dim as part of the column type, so it can't be bound)
         self.db.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS interactions USING vec0(embedding float[{dim}])")
         # Meta table for ids and content
         self.db.execute(
             "CREATE TABLE IF NOT EXISTS interactions_meta(id TEXT PRIMARY KEY, content TEXT)"
         )
+        self.db.execute(f"PRAGMA user_version = {dim}")
         self.db.commit()
 
+    def _remember(self, tweet_id: str):
+        self._recent_seen[tweet_id] = None
+        self._recent_seen.move_to_end(tweet_id)
+        if len(self._recent_seen) > RECENT_SEEN_SIZE:
+            self._recent_seen.popitem(last=False)
+
     def has_interacted(self, tweet_id: str) -> bool:
-        cur = self.db.execute(
-            "SELECT 1 FROM interactions_meta WHERE id = ?", (tweet_id,)
-        )
-        return cur.fetchone() is not None
+        if tweet_id in self._recent_seen:
+            return True
+        (found,) = self.db.execute(
+            "SELECT EXISTS(SELECT 1 FROM interactions_meta WHERE id = ?)", (tweet_id,)
+        ).fetchone()
+        if found:
+            self._remember(tweet_id)
+        return bool(found)
 
     def add_interaction(self, tweet_id: str, content: str):
         if self.has_interacted(tweet_id):
@@ -77,8 +117,43 @@ class VectorInteractionStore:
             (tweet_id, content),
         )
         self.db.commit()
+        self._remember(tweet_id)
+
+    def _interacted_ids(self, tweet_ids: list[str]) -> set[str]:
+        if not tweet_ids:
+            return set()
+        placeholders = ",".join("?" * len(tweet_ids))
+        cur = self.db.execute(
+            f"SELECT id FROM interactions_meta WHERE id IN ({placeholders})", tweet_ids
+        )
+        return {row[0] for row in cur}
+
+    def add_interactions(self, items: list[tuple[str, str]]):
+        """
+        Bulk add_interaction: new (tweet_id, content) pairs are inserted in one transaction (one fsync).
+        """
+        seen = self._interacted_ids([tweet_id for tweet_id, _ in items])
+        new_items = {}
+        for tweet_id, content in items:
+            if tweet_id not in seen:
+                new_items.setdefault(tweet_id, content) # First occurrence wins, like repeated add_interaction calls
+        if not new_items:
+            return
+        model = config.embedding_model
+        with self.db:
+            self.db.executemany(
+                "INSERT INTO interactions(rowid, embedding) VALUES(?, rembed(?, ?))",
+                [(tweet_id, model, content) for tweet_id, content in new_items.items()],
+            )
+            self.db.executemany(
+                "INSERT INTO interactions_meta(id, content) VALUES(?, ?)",
+                list(new_items.items()),
+            )
+        for tweet_id in new_items:
+            self._remember(tweet_id)
 
     def remove_interaction(self, tweet_id: str):
+        self._recent_seen.pop(tweet_id, None)
         self.db.execute(
             "DELETE FROM interactions_meta WHERE id = ?", (tweet_id,)
         )
@@ -88,6 +163,7 @@ class VectorInteractionStore:
         self.db.commit()
 
     def clear(self):
+        self._recent_seen.clear()
         self.db.execute("DELETE FROM interactions_meta")
         self.db.execute("DELETE FROM interactions")
         self.db.commit()
@@ -96,15 +172,11 @@ class VectorInteractionStore:
         """
         Return up to k nearest tweet_ids and distances for the given query text.
         """
+        return list(self.search_stream(query, k))
+
+    def search_stream(self, query: str, k: int = 5) -> Iterator[tuple[str, float]]:
+        """
+        Like search, but yields rows as SQLite produces them so callers can stop after the first few.
+        """
         # Uses the rembed SQLite function for on-the-fly embedding
-        cur = self.db.execute(
-            """
-            SELECT rowid, distance
-            FROM interactions
-            WHERE embedding MATCH rembed(?, ?)
-            ORDER BY distance
-            LIMIT ?
-            """,
-            (config.embedding_model, query, k),
-        )
-        return cur.fetchall()
+        return iter(self.db.execute(self._SEARCH_SQL, (config.embedding_model, query, k)))
@@ -1,45 +1,86 @@
 """
 Persistent storage helper for tracking tweet interactions.
-Stores tweet IDs in data/interactions.json to avoid duplicate actions.
+Stores tweet IDs in an append-only log (data/interactions.log) to avoid duplicate actions.
+A legacy data/interactions.json is migrated into the log on first load.
 """
 import json
+import os
 from pathlib import Path
 
 INTERACTIONS_PATH = Path(__file__).resolve().parent.parent / "data" / "interactions.json"
 
+# Removals are appended as "-<id>" tombstones; the log is rewritten once they outnumber this
+COMPACT_TOMBSTONES = 1000
+
 class InteractionStore:
     def __init__(self, path=INTERACTIONS_PATH):
         self.path = Path(path)
+        self.log_path = self.path.with_suffix(".log")
+        self._ids = set()
+        self._tombstones = 0
         self._ensure_file()
-        self.data = self._load()
+        self._load()
 
     def _ensure_file(self):
         self.path.parent.mkdir(parents=True, exist_ok=True)
-        if not self.path.exists():
-            with open(self.path, "w") as f:
-                json.dump({"interacted_tweets": []}, f)
+        if self.log_path.exists():
+            return
+        legacy = []
+        if self.path.exists():
+            with open(self.path, "r") as f:
+                legacy = json.load(f).get("interacted_tweets", [])
+        self._write_log(dict.fromkeys(map(str, legacy)))
+
+    def _write_log(self, tweet_ids):
+        # Written beside the log and swapped in, so a crash mid-write never leaves a torn log
+        tmp_path = self.log_path.with_suffix(self.log_path.suffix + ".tmp")
+        with open(tmp_path, "w") as f:
+            f.write("".join(f"{tweet_id}\n" for tweet_id in tweet_ids))
+        os.replace(tmp_path, self.log_path)
 
     def _load(self):
-        with open(self.path, "r") as f:
-            return json.load(f)
+        with open(self.log_path, "r") as f:
+            for line in f:
+                entry = line.strip()
+                if not entry:
+                    continue
+                if entry.startswith("-"):
+                    self._ids.discard(entry[1:])
+                    self._tombstones += 1
+                else:
+                    self._ids.add(entry)
+
+    @property
+    def data(self):
+        # Read-only snapshot in the old JSON layout
+        return {"interacted_tweets": list(self._ids)}
 
     def has_interacted(self, tweet_id: str) -> bool:
-        return tweet_id in self.data.get("interacted_tweets", [])
+        return tweet_id in self._ids
+
+    def _append(self, entry: str):
+        with open(self.log_path, "a") as f:
+            f.write(f"{entry}\n")
 
     def add_interaction(self, tweet_id: str):
         if not self.has_interacted(tweet_id):
-            self.data.setdefault("interacted_tweets", []).append(tweet_id)
-            self._save()
+            self._ids.add(tweet_id)
+            self._append(tweet_id)
 
     def _save(self):
-        with open(self.path, "w") as f:
-            json.dump(self.data, f, indent=2)
+        # Compaction: rewrite the log with only the live ids
+        self._write_log(self._ids)
+        self._tombstones = 0
 
     def remove_interaction(self, tweet_id: str):
         if self.has_interacted(tweet_id):
-            self.data["interacted_tweets"].remove(tweet_id)
-            self._save()
+            self._ids.discard(tweet_id)
+            self._tombstones += 1
+            if self._tombstones > COMPACT_TOMBSTONES:
+                self._save()
+            else:
+                self._append(f"-{tweet_id}")
 
     def clear(self):
-        self.data["interacted_tweets"] = []
+        self._ids.clear()
         self._save()
@@ -0,0 +1,80 @@
+# xviolet/vector/_docprep.py
+# Per-document preparation for LocalVectorStore.add_documents, kept free of SQLite so that
+# XVIOLET_MYPYC=1 pip install -e . can compile it (see setup.py)
+import array
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(text: str) -> bytes:
+    return hashlib.sha256(text.encode()).digest()
+
+
+def pack_f32(vector: Any) -> bytes:
+    if hasattr(vector, 'astype'): # numpy array: no per-element conversion
+        return vector.astype('<f4', copy=False).tobytes()
+    return array.array('f', vector).tobytes()
+
+
+def _pack_batch(vectors: Dict[int, Any]) -> Dict[int, Any]:
+    """Packs a batch of float lists into one float32 buffer and returns a zero-copy view of it per id.
+
+    sqlite3 binds any buffer as a BLOB, so the rows never get their own bytes objects.
+    """
+    blobs: Dict[int, Any] = {}
+    packed = array.array('f')
+    spans: List[Tuple[int, int, int]] = []
+    for int_doc_id, vector in vectors.items():
+        if hasattr(vector, 'astype'):
+            blobs[int_doc_id] = pack_f32(vector)
+            continue
+        start = len(packed)
+        packed.extend(vector)
+        spans.append((int_doc_id, start * 4, len(packed) * 4))
+    view = memoryview(packed).cast('B')
+    for int_doc_id, start, end in spans:
+        blobs[int_doc_id] = view[start:end]
+    return blobs
+
+
+def prepare_documents(
+    documents: List[Dict[str, Any]], embeddings: Optional[List[Any]]
+) -> Tuple[List[Tuple[int, str, str]], Dict[int, bytes], Dict[int, Any]]:
+    """Returns (int_id, original_id, text) rows plus their content hashes and float32 vector blobs, both keyed by int id.
+
+    The first occurrence of an id or of a text wins; documents without an integer id or text are skipped.
+    """
+    rows: List[Tuple[int, str, str]] = []
+    content_hashes: Dict[int, bytes] = {} # int_doc_id -> sha256 of text
+    vectors: Dict[int, Any] = {} # int_doc_id -> precomputed embedding
+    batch_hashes: Set[bytes] = set()
+    for position, doc in enumerate(documents):
+        original_doc_id_str = doc.get('id')
+        doc_text = doc.get('text')
+
+        if not original_doc_id_str or not doc_text:
+            logger.warning(f"Skipping document with missing original_id or text: {doc}")
+            continue
+
+        try:
+            # For simplicity and consistency with original VectorInteractionStore (tweet_id as int),
+            # we require original_doc_id_str to be an integer string; it becomes the rowid.
+            int_doc_id = int(original_doc_id_str)
+        except ValueError:
+            logger.error(f"Document ID '{original_doc_id_str}' is not an integer string. Skipping add. "
+                         "LocalVectorStore currently requires integer-convertible IDs.")
+            continue
+        doc_hash = content_hash(doc_text)
+        if int_doc_id in content_hashes or doc_hash in batch_hashes:
+            continue
+        batch_hashes.add(doc_hash)
+        content_hashes[int_doc_id] = doc_hash
+        rows.append((int_doc_id, original_doc_id_str, doc_text))
+        if embeddings is not None:
+            vector = embeddings[position]
+            if vector is not None:
+                vectors[int_doc_id] = vector
+    return rows, content_hashes, _pack_batch(vectors)
@@ -1,4 +1,5 @@
 # xviolet/vector/base.py
+import asyncio
 from abc import ABC, abstractmethod
 from typing import List, Dict, Any, Optional
 
@@ -46,6 +47,15 @@ class VectorStore(ABC):
         """
         pass
 
+    async def get_documents_by_ids(self, document_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Retrieve several documents at once.
+        Returns a dict of document ID -> document for the IDs that were found.
+        Stores that can fetch a batch in one request should override this per-ID default.
+        """
+        documents = await asyncio.gather(*(self.get_document_by_id(doc_id) for doc_id in dict.fromkeys(document_ids)))
+        return {doc_id: doc for doc_id, doc in zip(dict.fromkeys(document_ids), documents) if doc is not None}
+
     @abstractmethod
     async def delete_documents(self, document_ids: List[str]) -> bool:
         """
@@ -1,5 +1,9 @@
 # xviolet/vector/fallback_manager.py
-from typing import List, Dict, Any, Optional, Type
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Type, Tuple, Union
 from .base import VectorStore
 from .local_store import LocalVectorStore
 from .remote_store import RemoteVectorStore
@@ -7,17 +11,51 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Entries in each manager's query text -> embedding LRU
+_QUERY_EMBEDDINGS_SIZE = 256
+
+def normalize_query(text: str) -> str:
+    """Case- and whitespace-insensitive form of a text query, used for cache keys."""
+    return " ".join(text.split()).casefold()
+
+# Per-store circuit breaker: after this many consecutive failures a store is skipped until the
+# recovery window passes, then a single trial call decides whether it closes again
+STORE_FAILURE_THRESHOLD = 3
+STORE_RECOVERY_SECONDS = 60.0
+LATENCY_EWMA_ALPHA = 0.2
+
+@dataclass(slots=True)
+class StoreEntry:
+    """An initialized store in fallback order, with its circuit-breaker state."""
+    name: str
+    instance: VectorStore
+    type: str
+    failures: int = 0 # Consecutive failed calls
+    opened_at: Optional[float] = None # monotonic time the circuit opened
+    trial_running: bool = False # Half-open: the single trial call is in flight
+    latency_ewma: Optional[float] = None # Seconds
+
+
 class VectorStoreFallbackManager(VectorStore): # Implement the VectorStore interface
-    def __init__(self, store_configs: List[Dict[str, Any]]):
-        # Note: VectorStore's __init__ expects a config dict, but FallbackManager
-        # takes a list of store_configs. We don't directly call super().__init__(config)
-        # unless VectorStore.ABC has a specific requirement not shown.
-        # If VectorStore.__init__ just sets self.config = config, then for a manager,
-        # its "config" is the list of store_configs.
-        # For now, we'll assume VectorStore's __init__ is trivial or handled by ABC.
-        # super().__init__({}) # Pass empty or a representative config if needed by ABC
+    def __init__(self, store_configs: Union[List[Dict[str, Any]], Dict[str, Any]], search_cache_ttl: float = 300.0,
+                 search_cache_size: int = 128, hedge_delay_ms: Optional[float] = 200.0):
+        # Satisfies the VectorStore(config) signature too: a dict is either {'stores': [...]}
+        # or a single store config
+        if isinstance(store_configs, dict):
+            store_configs = store_configs['stores'] if 'stores' in store_configs else [store_configs]
+        self.config = store_configs
 
-        self.stores: List[Dict[str, Any]] = [] # List of {'name': str, 'instance': VectorStore, 'type': str}
+        stores: List[StoreEntry] = []
+        # Recent search results keyed by (query, top_k, filter). The scheduler keeps querying the same few
+        # persona interests, and a hit skips the store's embedding + KNN work. Cleared on add/delete.
+        self._search_cache: "OrderedDict[tuple, Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+        self.search_cache_ttl = search_cache_ttl
+        self.search_cache_size = search_cache_size
+        self.hedge_delay_ms = hedge_delay_ms # None searches the stores strictly one after another
+        # Query text -> embedding, so a text query is embedded once no matter how many non-local stores (or later
+        # searches) need it as a vector. Per manager: another manager's stores may embed with a different model
+        # or dimension
+        self._query_embeddings: "OrderedDict[str, List[float]]" = OrderedDict()
 
         for config_item in store_configs:
             store_type_name = config_item.get('type')
@@ -32,7 +70,7 @@ class VectorStoreFallbackManager(VectorStore): # Implement the VectorStore inter
             if store_class:
                 try:
                     instance = store_class(store_config_params)
-                    self.stores.append({'name': store_name, 'instance': instance, 'type': store_type_name})
+                    stores.append(StoreEntry(store_name, instance, store_type_name))
                     logger.info(f"Successfully initialized vector store: {store_name} (type: {store_type_name})")
                 except Exception as e:
                     logger.error(f"Failed to initialize vector store {store_name} (type: {store_type_name}): {e}")
@@ -40,6 +78,7 @@ class VectorStoreFallbackManager(VectorStore): # Implement the VectorStore inter
                 # _get_store_class already logs an error for unknown type
                 logger.warning(f"Skipping store '{store_name}' due to unknown type '{store_type_name}'.")
         
+        self.stores: Tuple[StoreEntry, ...] = tuple(stores)
         if not self.stores:
             logger.warning("VectorStoreFallbackManager initialized with no valid stores.")
 
@@ -53,18 +92,59 @@ class VectorStoreFallbackManager(VectorStore): # Implement the VectorStore inter
             logger.error(f"Unknown vector store type: {store_type_name}")
             return None
 
+    def _store_available(self, store: StoreEntry) -> bool:
+        """True if the store may be called. After the recovery window this grants the half-open trial: the
+        caller then holds it (store.trial_running) and must release it, and every other caller is refused
+        until it finishes."""
+        opened_at = store.opened_at
+        if opened_at is None:
+            return True
+        if not store.trial_running and time.monotonic() - opened_at >= STORE_RECOVERY_SECONDS:
+            store.trial_running = True # A success closes the circuit, a failure re-opens it
+            return True
+        logger.debug("Skipping store %s: circuit open after %d failures", store.name, store.failures)
+        return False
+
+    async def _call_store(self, store: StoreEntry, awaitable, trial: bool = False):
+        """Awaits a store call, updating the store's failure count and latency EWMA. With `trial`, the
+        half-open trial is released however the call ends, including cancellation."""
+        started = time.monotonic()
+        try:
+            result = await awaitable
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            store.failures += 1
+            if store.failures >= STORE_FAILURE_THRESHOLD:
+                if store.opened_at is None:
+                    logger.warning(f"Store {store.name} failed {store.failures} times in a row; skipping it for {STORE_RECOVERY_SECONDS:.0f}s.")
+                store.opened_at = time.monotonic()
+            raise
+        finally:
+            if trial:
+                store.trial_running = False
+        elapsed = time.monotonic() - started
+        ewma = store.latency_ewma
+        store.latency_ewma = elapsed if ewma is None else ewma + LATENCY_EWMA_ALPHA * (elapsed - ewma)
+        store.failures = 0
+        store.opened_at = None
+        return result
+
     async def add_documents(self, documents: List[Dict[str, Any]], embeddings: Optional[List[List[float]]] = None) -> List[str]:
         last_error = None
-        for store_wrapper in self.stores:
-            store_instance = store_wrapper['instance']
-            store_name = store_wrapper['name']
+        for store in self.stores:
+            if not self._store_available(store):
+                continue
+            store_instance = store.instance
+            store_name = store.name
             try:
                 logger.debug(f"Attempting add_documents with store: {store_name}")
                 # Pass embeddings along; individual stores will decide if they use them (LocalStore ignores them)
-                added_ids = await store_instance.add_documents(documents, embeddings)
+                added_ids = await self._call_store(store, store_instance.add_documents(documents, embeddings), store.trial_running)
                 # add_documents should return a list. An empty list might be a valid "success" (e.g., all docs existed).
                 # We consider it a success if no exception was raised and a list is returned.
                 if added_ids is not None: # Check for explicit None in case a store misbehaves
+                    self._search_cache.clear()
                     logger.info(f"add_documents successful with store: {store_name}. Added IDs: {len(added_ids)}")
                     return added_ids
             except Exception as e:
@@ -76,61 +156,149 @@ class VectorStoreFallbackManager(VectorStore): # Implement the VectorStore inter
         #     raise last_error # Or return empty list
         return [] # Default return if all fail
 
-    async def search(self, query_embedding: List[float], top_k: int = 5, metadata_filter: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
-        last_error = None
-        for store_wrapper in self.stores:
-            store_instance = store_wrapper['instance']
-            store_name = store_wrapper['name']
-            store_type = store_wrapper['type']
+    @staticmethod
+    def _search_key(query_embedding, top_k: int, metadata_filter: Optional[Dict[str, Any]]) -> tuple:
+        query = normalize_query(query_embedding) if isinstance(query_embedding, str) else tuple(query_embedding)
+        return (query, top_k, repr(sorted(metadata_filter.items())) if metadata_filter else None)
+
+    async def _embed_query(self, query_text: str) -> Optional[List[float]]:
+        """Embeds a text query with the first store that exposes embed_text, reusing earlier results."""
+        key = normalize_query(query_text)
+        cached = self._query_embeddings.get(key)
+        if cached is not None:
+            self._query_embeddings.move_to_end(key)
+            return cached
+        for store in self.stores:
+            embed_text = getattr(store.instance, 'embed_text', None)
+            if not callable(embed_text):
+                continue
             try:
-                logger.debug(f"Attempting search with store: {store_name} (type: {store_type})")
-                
-                results: Optional[List[Dict[str, Any]]] = None
-
-                if store_type == 'local': # Check by type, not isinstance, to be explicit about config
-                    # LocalVectorStore expects query_text.
-                    # The manager's search signature is query_embedding.
-                    # This is the "temporary adaptation" part.
-                    if isinstance(query_embedding, str): # If query_embedding is actually query_text
-                        logger.debug(f"Store {store_name} is LocalVectorStore, using query as text.")
-                        results = await store_instance.search(query_text=query_embedding, top_k=top_k, metadata_filter=metadata_filter)
-                    else:
-                        logger.warning(f"Store {store_name} (LocalVectorStore) expects a text query, but received an embedding (list of floats). Skipping this store for this search.")
-                        last_error = TypeError(f"{store_name} expects text query, received embedding.")
-                        continue # Skip to the next store
-                else: # Assume other stores (like RemoteVectorStore) expect query_embedding
-                    if isinstance(query_embedding, str):
-                        logger.warning(f"Store {store_name} (type: {store_type}) expects an embedding, but received text query. This may fail if store cannot handle text query directly. Attempting anyway.")
-                        # This situation is also tricky. If a remote store *only* takes embeddings,
-                        # and we have text, we're stuck without an embedder here.
-                        # For now, we pass it and let the store handle it or fail.
-                        # A more robust solution would involve an embedding generation step if needed.
-                        results = await store_instance.search(query_embedding, top_k=top_k, metadata_filter=metadata_filter)
-
-                    else: # query_embedding is a list (assumed to be floats)
-                         results = await store_instance.search(query_embedding=query_embedding, top_k=top_k, metadata_filter=metadata_filter)
-                
-                # Successful if results is not None (empty list is a valid success, means no error and no results)
-                if results is not None:
-                    logger.info(f"Search successful with store: {store_name}. Results found: {len(results)}")
-                    return results
+                vector = await embed_text(query_text)
             except Exception as e:
-                logger.error(f"Store {store_name} failed during search: {e}")
-                last_error = e
-        
+                logger.warning(f"Store {store.name} failed to embed search query: {e}")
+                continue
+            if vector:
+                self._query_embeddings[key] = vector
+                while len(self._query_embeddings) > _QUERY_EMBEDDINGS_SIZE:
+                    self._query_embeddings.popitem(last=False)
+                return vector
+        return None
+
+    async def _search_store(self, store: StoreEntry, query_embedding, top_k: int,
+                            metadata_filter: Optional[Dict[str, Any]], query_vector) -> Optional[List[Dict[str, Any]]]:
+        """One store's search attempt. Raises when the store fails or cannot take this kind of query."""
+        store_instance = store.instance
+        store_name = store.name
+        store_type = store.type
+        logger.debug(f"Attempting search with store: {store_name} (type: {store_type})")
+
+        if store_type == 'local': # Check by type, not isinstance, to be explicit about config
+            # LocalVectorStore expects query_text.
+            # The manager's search signature is query_embedding.
+            # This is the "temporary adaptation" part.
+            if isinstance(query_embedding, str): # If query_embedding is actually query_text
+                logger.debug(f"Store {store_name} is LocalVectorStore, using query as text.")
+                return await self._call_store(store, store_instance.search(query_text=query_embedding, top_k=top_k, metadata_filter=metadata_filter))
+            logger.warning(f"Store {store_name} (LocalVectorStore) expects a text query, but received an embedding (list of floats). Skipping this store for this search.")
+            raise TypeError(f"{store_name} expects text query, received embedding.")
+
+        # Assume other stores (like RemoteVectorStore) expect query_embedding
+        if isinstance(query_embedding, str):
+            vector = await query_vector()
+            if vector is not None:
+                return await self._call_store(store, store_instance.search(query_embedding=vector, top_k=top_k, metadata_filter=metadata_filter))
+            logger.warning(f"Store {store_name} (type: {store_type}) expects an embedding, but received text query. This may fail if store cannot handle text query directly. Attempting anyway.")
+            # No store could embed the text; pass it and let the store handle it or fail.
+            return await self._call_store(store, store_instance.search(query_embedding, top_k=top_k, metadata_filter=metadata_filter))
+        return await self._call_store(store, store_instance.search(query_embedding=query_embedding, top_k=top_k, metadata_filter=metadata_filter))
+
+    async def search(self, query_embedding: List[float], top_k: int = 5, metadata_filter: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        if not query_embedding or (isinstance(query_embedding, str) and not query_embedding.strip()):
+            logger.debug("Empty vector search query; returning no results.")
+            return []
+        cache_key = self._search_key(query_embedding, top_k, metadata_filter) if self.search_cache_ttl > 0 else None
+        if cache_key is not None:
+            cached = self._search_cache.get(cache_key)
+            if cached is not None and cached[0] > time.monotonic():
+                self._search_cache.move_to_end(cache_key)
+                logger.debug("Vector search served from cache.")
+                return list(cached[1]) # Callers may mutate their list
+
+        embedding_task: Optional[asyncio.Future] = None
+        def query_vector() -> "asyncio.Future":
+            # Embedding of a text query, computed once on first need and shared by racing stores
+            nonlocal embedding_task
+            if embedding_task is None:
+                embedding_task = asyncio.ensure_future(self._embed_query(query_embedding))
+            return asyncio.shield(embedding_task)
+
+        # Search is read-only, so it is hedged: a store that has not answered within hedge_delay gets the
+        # next store started alongside it, and the first usable result wins. A failure starts the next
+        # store immediately, which keeps the old sequential fallback order when stores fail fast.
+        hedge_delay = self.hedge_delay_ms / 1000.0 if self.hedge_delay_ms is not None else None
+        pending: Dict[asyncio.Task, Tuple[int, StoreEntry]] = {} # task -> (store position, store)
+        launched = 0
+
+        def launch() -> None:
+            nonlocal launched
+            while launched < len(self.stores) and not self._store_available(self.stores[launched]):
+                launched += 1
+            if launched < len(self.stores):
+                store = self.stores[launched]
+                task = asyncio.ensure_future(self._search_store(store, query_embedding, top_k, metadata_filter, query_vector))
+                # A launch holding the half-open trial releases it when its task ends: the task can fail or be
+                # cancelled as a hedge loser before it ever reaches _call_store
+                if store.trial_running:
+                    task.add_done_callback(lambda _, store=store: setattr(store, 'trial_running', False))
+                pending[task] = (launched, store)
+                launched += 1
+
+        try:
+            launch()
+            while pending:
+                more = launched < len(self.stores)
+                done, _ = await asyncio.wait(list(pending), timeout=hedge_delay if more else None, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    logger.debug("Vector search hedging: starting the next store alongside the slow one.")
+                    launch()
+                    continue
+                for task in sorted(done, key=lambda t: pending[t][0]): # Prefer the earlier store on ties
+                    store_name = pending.pop(task)[1].name
+                    try:
+                        results = task.result()
+                    except Exception as e:
+                        logger.error(f"Store {store_name} failed during search: {e}")
+                        continue
+                    # Successful if results is not None (empty list is a valid success, means no error and no results)
+                    if results is not None:
+                        logger.info(f"Search successful with store: {store_name}. Results found: {len(results)}")
+                        if cache_key is not None:
+                            self._search_cache[cache_key] = (time.monotonic() + self.search_cache_ttl, list(results))
+                            self._search_cache.move_to_end(cache_key)
+                            while len(self._search_cache) > self.search_cache_size:
+                                self._search_cache.popitem(last=False)
+                        return results
+                if not pending:
+                    launch()
+        finally:
+            for task in pending: # Losers of the race
+                task.cancel()
+            if embedding_task is not None and not embedding_task.done():
+                embedding_task.cancel()
+
         logger.error("All vector stores failed for search operation.")
-        # if last_error:
-        #     raise last_error # Propagating last error might be desired in some contexts
         return []
 
     async def get_document_by_id(self, document_id: str) -> Optional[Dict[str, Any]]:
         last_error = None
-        for store_wrapper in self.stores:
-            store_instance = store_wrapper['instance']
-            store_name = store_wrapper['name']
+        for store in self.stores:
+            if not self._store_available(store):
+                continue
+            store_instance = store.instance
+            store_name = store.name
             try:
                 logger.debug(f"Attempting get_document_by_id with store: {store_name}")
-                document = await store_instance.get_document_by_id(document_id)
+                document = await self._call_store(store, store_instance.get_document_by_id(document_id), store.trial_running)
                 if document is not None: # Document found
                     logger.info(f"get_document_by_id successful with store: {store_name}. Document ID: {document_id}")
                     return document
@@ -144,20 +312,38 @@ class VectorStoreFallbackManager(VectorStore): # Implement the VectorStore inter
         #     logger.error("Last error during get_document_by_id was: %s", last_error)
         return None
 
+    async def get_documents_by_ids(self, document_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        found: Dict[str, Dict[str, Any]] = {}
+        for store in self.stores:
+            missing = [doc_id for doc_id in dict.fromkeys(document_ids) if doc_id not in found]
+            if not missing:
+                break
+            if not self._store_available(store):
+                continue
+            try:
+                # Ids a store doesn't have are looked up in the next one
+                found.update(await self._call_store(store, store.instance.get_documents_by_ids(missing), store.trial_running))
+            except Exception as e:
+                logger.error(f"Store {store.name} failed during get_documents_by_ids for {len(missing)} ID(s): {e}")
+        return found
+
     async def delete_documents(self, document_ids: List[str]) -> bool:
         last_error = None
         original_document_ids = list(document_ids) # Copy for logging, as stores might modify list or fail partially
 
-        for store_wrapper in self.stores:
-            store_instance = store_wrapper['instance']
-            store_name = store_wrapper['name']
+        for store in self.stores:
+            if not self._store_available(store):
+                continue
+            store_instance = store.instance
+            store_name = store.name
             try:
                 logger.debug(f"Attempting delete_documents with store: {store_name}")
                 # The interface specifies `delete_documents` returns bool.
                 # True means success (or partial success).
                 # We assume if a store returns True, the operation is considered handled for this fallback level.
-                success = await store_instance.delete_documents(document_ids) # Pass the potentially modified list
+                success = await self._call_store(store, store_instance.delete_documents(document_ids), store.trial_running) # Pass the potentially modified list
                 if success:
+                    self._search_cache.clear()
                     logger.info(f"delete_documents successful or partially successful with store: {store_name} for IDs: {original_document_ids}")
                     return True
                 # If False, it implies total failure for this store for these IDs, try next.
@@ -169,25 +355,3 @@ class VectorStoreFallbackManager(VectorStore): # Implement the VectorStore inter
         # if last_error:
         #     raise last_error
         return False
-
-    # Required by ABC, but not used by FallbackManager if it doesn't have its own "config" in the ABC sense
-    def __init__(self, config: Dict[str, Any]):
-        # This is the ABC's __init__. The FallbackManager's actual initialization
-        # is done in the other __init__ method which takes store_configs.
-        # This is a bit of a hack due to Python not allowing multiple __init__ signatures directly
-        # in the same way as overloaded constructors in other languages.
-        # We'll call the main init with the config if it's a list (for direct instantiation)
-        # or handle it if it's a single dict (if ABC expects it).
-        # For now, let's assume this init is for the ABC and the other is the primary.
-        # This is slightly problematic. Let's stick to one __init__ and make it compatible.
-        # The prompt implies the FallbackManager is a VectorStore, so it needs to satisfy the ABC's __init__.
-        # The ABC's __init__ is `def __init__(self, config: Dict[str, Any]):`
-        # The manager's useful init is `def __init__(self, store_configs: List[Dict[str, Any]])`.
-        # This is a conflict.
-        # Let's rename the manager's main init and call it from the ABC-compliant __init__.
-        # This will be handled in the next step by correcting the __init__ structure.
-        # For now, this placeholder satisfies the ABC.
-        # The file creation tool will use the first __init__ it sees.
-        # I will provide the correct __init__ as the first one.
-        pass # Will be fixed in the combined __init__ logic.
-
@@ -1,15 +1,170 @@
 # xviolet/vector/local_store.py
+import array
+import asyncio
+import json
+import os
+import queue
 import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import sqlite_vec 
 from typing import List, Dict, Any, Optional
 import logging
 
+try:
+    import numpy as np # Optional: backs the HNSW and fp16 in-memory indexes
+except ImportError:
+    np = None
+
+try:
+    import hnswlib # Optional: in-memory HNSW index for sub-linear search
+except ImportError:
+    hnswlib = None
+
 from .base import VectorStore
+from ._docprep import content_hash, pack_f32, prepare_documents
 from xviolet.config import config # Global config for embedding settings
 
 logger = logging.getLogger(__name__)
 
+# Bumped whenever the on-disk layout changes; stored in PRAGMA user_version
+SCHEMA_VERSION = 3 # 2: interactions_meta.content_hash, 3: content moved to interactions_content
+
+# With int8 quantization, the int8 index is scanned for top_k * this many candidates, which are then
+# reranked by exact float32 distance
+RERANK_FACTOR = 4
+
+# Query text -> packed query vector, so a repeated search skips the (usually network-backed) embedding call
+QUERY_CACHE_SIZE = 512
+
+# Fixed statement text so sqlite3's per-connection statement cache reuses the prepared statements
+_SQL_HAS = "SELECT 1 FROM interactions_meta WHERE id = ?"
+# Document text lives in interactions_content, so lookups that only need ids never read it (or its overflow pages)
+_SQL_GET_BY_OID = """
+    SELECT m.id, m.original_id, c.content
+    FROM interactions_meta m JOIN interactions_content c ON c.id = m.id
+    WHERE m.original_id = ?
+"""
+# Id lists are bound as one JSON array parameter, so a batch of any size is a single statement with fixed text
+_SQL_GET_BY_OIDS = """
+    SELECT m.original_id, c.content
+    FROM interactions_meta m JOIN interactions_content c ON c.id = m.id
+    WHERE m.original_id IN (SELECT value FROM json_each(?))
+"""
+_SQL_GET_BY_IDS = """
+    SELECT m.id, m.original_id, c.content
+    FROM main.interactions_meta m JOIN main.interactions_content c ON c.id = m.id
+    WHERE m.id IN (SELECT value FROM json_each(?))
+"""
+_SQL_DEL_VEC = "DELETE FROM interactions_vectors WHERE rowid = ?"
+_SQL_DEL_VEC_I8 = "DELETE FROM interactions_vectors_i8 WHERE rowid = ?"
+_SQL_VECTORS_ALL = "SELECT rowid, embedding FROM interactions_vectors"
+# Multi-row insert, formatted with one "(?, ?, ?)" group per row; chunked to stay under SQLite's bound-parameter
+# limit. A repeated id, original_id or content_hash is skipped, so duplicate text never reaches rembed()
+_SQL_INSERT_META = ("INSERT INTO interactions_meta(id, original_id, content_hash) VALUES {values} "
+                    "ON CONFLICT DO NOTHING RETURNING id")
+_SQL_INSERT_CONTENT = "INSERT INTO interactions_content(id, content) VALUES(?, ?)"
+_SQL_DEL_CONTENT = "DELETE FROM interactions_content WHERE id = ?"
+_INSERT_META_CHUNK = 200
+_SQL_KNOWN_HASHES = "SELECT content_hash FROM interactions_meta WHERE content_hash IN ({placeholders})"
+_SQL_INSERT_VEC = "INSERT INTO interactions_vectors(rowid, embedding) VALUES(?, vec_f32(rembed(?, ?)))"
+_SQL_INSERT_VEC_BLOB = "INSERT INTO interactions_vectors(rowid, embedding) VALUES(?, vec_f32(?))"
+_SQL_EMBED = "SELECT vec_f32(rembed(?, ?))"
+_SQL_MIRROR_ALL = "INSERT INTO mem.interactions_vectors_mem(rowid, embedding) SELECT rowid, embedding FROM main.interactions_vectors"
+_SQL_DEL_VEC_MEM = "DELETE FROM mem.interactions_vectors_mem WHERE rowid = ?"
+# The search statements are formatted with the float32 table they scan: the on-disk one or its in-memory mirror.
+# They return (rowid, distance) only; content is fetched afterwards with one _SQL_GET_BY_IDS, keeping the vec0
+# KNN query free of joins
+_SQL_SEARCH = """
+    SELECT rowid, distance FROM {vectors}
+    WHERE embedding MATCH ? AND k = ?
+    ORDER BY distance
+"""
+_SQL_SEARCH_I8 = """
+    WITH candidates AS (
+        SELECT rowid FROM interactions_vectors_i8
+        WHERE embedding MATCH vec_int8(quantize_i8(?)) AND k = ?
+    )
+    SELECT c.rowid, vec_distance_l2(v.embedding, ?) AS distance
+    FROM candidates c
+    JOIN {vectors} v ON v.rowid = c.rowid
+    ORDER BY distance
+    LIMIT ?
+"""
+
+
+def _quantize_i8(blob: bytes) -> bytes:
+    """float32 vector blob -> int8 blob, scaled per vector so the largest component maps to +-127."""
+    values = array.array('f')
+    values.frombytes(blob)
+    peak = max(map(abs, values), default=0.0)
+    if not peak:
+        return bytes(len(values))
+    scale = 127.0 / peak
+    return array.array('b', [round(v * scale) for v in values]).tobytes()
+
+
+class _Fp16Index:
+    """Dense float16 copy of the vectors for brute-force L2 top-k with one matrix-vector product per search.
+
+    Rows are kept contiguous: a deleted row is replaced by the last one, so the matrix never has holes.
+    """
+
+    SEARCH_BLOCK_ROWS = 4096
+
+    def __init__(self, dim: int, capacity: int = 1024):
+        self.vectors = np.empty((capacity, dim), dtype=np.float16)
+        self.sq_norms = np.empty(capacity, dtype=np.float32) # Exact squared norms, for ||v||^2 - 2 v.q + ||q||^2
+        self.rowids = np.empty(capacity, dtype=np.int64)
+        self.slots: Dict[int, int] = {} # rowid -> row in the arrays
+        self.count = 0
+
+    def add(self, rows):
+        for rowid, blob in rows:
+            if rowid in self.slots:
+                continue
+            if self.count == len(self.rowids):
+                capacity = 2 * len(self.rowids)
+                self.vectors = np.resize(self.vectors, (capacity, self.vectors.shape[1]))
+                self.sq_norms = np.resize(self.sq_norms, capacity)
+                self.rowids = np.resize(self.rowids, capacity)
+            vector = np.frombuffer(blob, dtype=np.float32)
+            self.vectors[self.count] = vector
+            self.sq_norms[self.count] = vector @ vector
+            self.rowids[self.count] = rowid
+            self.slots[rowid] = self.count
+            self.count += 1
+
+    def remove(self, rowids: List[int]):
+        for rowid in rowids:
+            slot = self.slots.pop(rowid, None)
+            if slot is None:
+                continue
+            self.count -= 1
+            if slot != self.count: # Move the last row into the hole
+                self.vectors[slot] = self.vectors[self.count]
+                self.sq_norms[slot] = self.sq_norms[self.count]
+                self.rowids[slot] = self.rowids[self.count]
+                self.slots[int(self.rowids[slot])] = slot
+
+    def search(self, query_vector: bytes, top_k: int) -> List[tuple]:
+        if not self.count:
+            return []
+        query = np.frombuffer(query_vector, dtype=np.float32)
+        # Upcast a block at a time so the products accumulate in float32 (BLAS sgemv) without a full float32 copy
+        dots = np.empty(self.count, dtype=np.float32)
+        for start in range(0, self.count, self.SEARCH_BLOCK_ROWS):
+            end = min(start + self.SEARCH_BLOCK_ROWS, self.count)
+            dots[start:end] = self.vectors[start:end].astype(np.float32) @ query
+        sq_distances = self.sq_norms[:self.count] - 2 * dots + query @ query
+        k = min(top_k, self.count)
+        top = np.argpartition(sq_distances, k - 1)[:k]
+        top = top[np.argsort(sq_distances[top])]
+        return [(int(self.rowids[i]), float(max(sq_distances[i], 0.0)) ** 0.5) for i in top]
+
+
 class LocalVectorStore(VectorStore):
     def __init__(self, config_dict: Dict[str, Any]):
         super().__init__(config_dict) 
@@ -18,6 +173,33 @@ class LocalVectorStore(VectorStore):
             raise ValueError("LocalVectorStore config missing 'db_path'")
             
         self.db_path = Path(config_dict['db_path'])
+        # 'quantize': 'int8' adds a 4x smaller int8 index that search scans before an exact float32 rerank
+        self.quantize_int8 = config_dict.get('quantize') == 'int8'
+        # HNSW mirror of interactions_vectors (keyed by rowid) when hnswlib is installed; 'ann_index': None disables it
+        self.use_hnsw = hnswlib is not None and np is not None and config_dict.get('ann_index', 'hnsw') == 'hnsw'
+        # 'ann_index': 'fp16' instead keeps a float16 matrix of the vectors (half the memory traffic of float32)
+        # and searches it exactly with NumPy; suits read-heavy stores
+        self.use_fp16 = np is not None and config_dict.get('ann_index', 'hnsw') == 'fp16'
+        self._fp16 = None
+        self._hnsw = None
+        self._hnsw_live = 0
+        # Search scans a ':memory:' copy of interactions_vectors instead of paging the on-disk vec0 tables;
+        # 'memory_mirror': False turns it off for corpora too large to hold in RAM
+        self.use_memory_mirror = config_dict.get('memory_mirror', True)
+        self._mirrored = False
+        # Optional async callable List[str] -> List[vector] (e.g. GeminiLLMProvider.embed_texts). Embeds a whole
+        # add_documents batch in one call, and search queries, instead of rembed() per row inside SQLite
+        self._embedder = config_dict.get('embedder')
+        self._query_vectors: "OrderedDict[tuple, bytes]" = OrderedDict()
+        self._query_vectors_lock = threading.Lock() # Filled from both the event loop and the worker thread
+        # All connection (and HNSW) access runs on this one thread: the event loop never blocks on SQLite,
+        # and the connection and index are never used concurrently
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="local-vector-store")
+        # search_many fans out over this many read-only connections (opened on first use); WAL readers don't block
+        # each other, and sqlite3 releases the GIL while a statement runs
+        self.read_connections = max(1, int(config_dict.get('read_connections', min(4, os.cpu_count() or 1))))
+        self._ro_pool: Optional[queue.Queue] = None
+        self._ro_executor: Optional[ThreadPoolExecutor] = None
         logger.info(f"Initializing LocalVectorStore with DB path: {self.db_path}")
         
         try:
@@ -27,7 +209,9 @@ class LocalVectorStore(VectorStore):
             raise
 
         try:
-            self.db = sqlite3.connect(str(self.db_path))
+            # Used only from self._executor after __init__, hence check_same_thread=False
+            self.db = sqlite3.connect(str(self.db_path), cached_statements=256, check_same_thread=False)
+            self._apply_pragmas()
             self.db.enable_load_extension(True)
             
             try:
@@ -50,137 +234,436 @@ class LocalVectorStore(VectorStore):
             if hasattr(self, 'db') and self.db:
                  self.db.enable_load_extension(False)
 
-        self._register_rembed_client() # Check if rembed() is available
+        self.db.create_function("quantize_i8", 1, _quantize_i8, deterministic=True)
+        self._register_rembed_client() # Check that rembed() is registered
         self._create_tables()
+        if self.use_hnsw:
+            self._build_hnsw()
+        if self.use_fp16:
+            self._build_fp16()
+        # HNSW and the fp16 index already answer searches from memory
+        if self.use_memory_mirror and self._hnsw is None and self._fp16 is None:
+            self._build_memory_mirror()
+        self._prepare_search_sql()
         logger.info("LocalVectorStore initialized successfully.")
 
+    # WAL lets searches read while documents are written; NORMAL syncs at checkpoints instead of every commit
+    _PRAGMAS = (
+        ("journal_mode", "WAL"),
+        ("synchronous", "NORMAL"),
+        ("temp_store", "MEMORY"),
+        ("cache_size", "-64000"), # 64 MB
+        ("mmap_size", "268435456"), # 256 MB
+        ("busy_timeout", "5000"),
+    )
+
+    def _apply_pragmas(self):
+        for name, value in self._PRAGMAS:
+            self.db.execute(f"PRAGMA {name}={value}")
+        logger.info("LocalVectorStore pragmas: " + ", ".join(f"{name}={value}" for name, value in self._PRAGMAS))
+
+    def _build_memory_mirror(self):
+        try:
+            self.db.execute("ATTACH DATABASE ':memory:' AS mem")
+            with self.db:
+                self.db.execute(f"""
+                    CREATE VIRTUAL TABLE mem.interactions_vectors_mem USING vec0(
+                        embedding float[{config.embedding_dim}]
+                    );
+                """)
+                count = self.db.execute(_SQL_MIRROR_ALL).rowcount
+            self._mirrored = True
+            logger.info(f"Mirrored {count} vector(s) into memory for search.")
+        except sqlite3.Error as e:
+            logger.error(f"Failed to build in-memory vector mirror, searching the on-disk table: {e}")
+            try:
+                self.db.execute("DETACH DATABASE mem")
+            except sqlite3.Error:
+                pass
+
+    def _prepare_search_sql(self):
+        vectors = "mem.interactions_vectors_mem" if self._mirrored else "main.interactions_vectors"
+        self._sql_search = _SQL_SEARCH.format(vectors=vectors)
+        self._sql_search_i8 = _SQL_SEARCH_I8.format(vectors=vectors)
+        # Read-only pool connections don't see the ':memory:' mirror, so they scan the on-disk table
+        self._sql_search_ro = _SQL_SEARCH.format(vectors="main.interactions_vectors")
+        self._sql_search_i8_ro = _SQL_SEARCH_I8.format(vectors="main.interactions_vectors")
+
+    def _open_read_connection(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, cached_statements=256, check_same_thread=False)
+        conn.enable_load_extension(True)
+        try:
+            sqlite_vec.load(conn)
+            try:
+                conn.load_extension("rembed0")
+            except sqlite3.OperationalError:
+                pass # Already reported for the main connection
+        finally:
+            conn.enable_load_extension(False)
+        for name, value in self._PRAGMAS:
+            if name != "journal_mode": # Persistent, set by the main connection; a read-only connection can't change it
+                conn.execute(f"PRAGMA {name}={value}")
+        conn.execute("PRAGMA query_only=1")
+        conn.create_function("quantize_i8", 1, _quantize_i8, deterministic=True)
+        return conn
+
+    def _search_read_only(self, query_text: str, top_k: int, query_vector: Optional[bytes]) -> List[Dict[str, Any]]:
+        # Each pool thread holds at most one connection at a time, so the pool never grows past read_connections
+        try:
+            conn = self._ro_pool.get_nowait()
+        except queue.Empty:
+            try:
+                conn = self._open_read_connection()
+            except Exception as e:
+                logger.error(f"Failed to open read-only connection for search: {e}")
+                return []
+        try:
+            return self._search_sync(query_text, top_k, None, query_vector, conn)
+        finally:
+            self._ro_pool.put(conn)
+
+    def _build_hnsw(self):
+        try:
+            rows = self.db.execute(_SQL_VECTORS_ALL).fetchall()
+            index = hnswlib.Index(space='l2', dim=int(config.embedding_dim))
+            index.init_index(max_elements=max(1024, 2 * len(rows)), M=32, ef_construction=200)
+            index.set_ef(64)
+            if rows:
+                index.add_items(np.stack([np.frombuffer(blob, dtype=np.float32) for _, blob in rows]), [rowid for rowid, _ in rows])
+            self._hnsw = index
+            self._hnsw_live = len(rows) # Searchable (not deleted) items; knn_query fails if k exceeds it
+            logger.info(f"HNSW index built over {len(rows)} vector(s).")
+        except Exception as e:
+            logger.error(f"Failed to build HNSW index, falling back to vec0 search: {e}")
+            self._hnsw = None
+
+    def _build_fp16(self):
+        try:
+            index = _Fp16Index(int(config.embedding_dim))
+            index.add(self.db.execute(_SQL_VECTORS_ALL))
+            self._fp16 = index
+            logger.info(f"fp16 index built over {index.count} vector(s).")
+        except Exception as e:
+            logger.error(f"Failed to build fp16 index, falling back to vec0 search: {e}")
+            self._fp16 = None
+
+    def _hnsw_add(self, rowids: List[int]):
+        placeholders = ",".join("?" * len(rowids))
+        rows = self.db.execute(f"{_SQL_VECTORS_ALL} WHERE rowid IN ({placeholders})", rowids).fetchall()
+        if not rows:
+            return
+        needed = self._hnsw.get_current_count() + len(rows)
+        if needed > self._hnsw.get_max_elements():
+            self._hnsw.resize_index(max(needed, 2 * self._hnsw.get_max_elements()))
+        self._hnsw.add_items(np.stack([np.frombuffer(blob, dtype=np.float32) for _, blob in rows]), [rowid for rowid, _ in rows])
+        self._hnsw_live += len(rows)
+
+    def _hnsw_remove(self, rowids: List[int]):
+        for rowid in rowids:
+            try:
+                self._hnsw.mark_deleted(rowid)
+                self._hnsw_live -= 1
+            except RuntimeError: # Not in the index (or already deleted)
+                pass
+
+    def _hnsw_search(self, query_vector: bytes, top_k: int) -> List[Dict[str, Any]]:
+        if not self._hnsw_live:
+            return []
+        labels, distances = self._hnsw.knn_query(np.frombuffer(query_vector, dtype=np.float32), k=min(top_k * 2, self._hnsw_live))
+        # hnswlib's l2 space reports squared distances; vec0 reports plain L2
+        return self._hydrate([(int(label), float(d) ** 0.5) for label, d in zip(labels[0], distances[0])])[:top_k]
+
+    def _hydrate(self, hits, db: Optional[sqlite3.Connection] = None) -> List[Dict[str, Any]]:
+        """(rowid, distance) pairs in rank order -> result dicts, with all content read in one query."""
+        if not hits:
+            return []
+        rows = {int_id: (original_id, content) for int_id, original_id, content in
+                (db or self.db).execute(_SQL_GET_BY_IDS, (json.dumps([rowid for rowid, _ in hits]),))}
+        return [{'id': str(rows[rowid][0]), 'text': rows[rowid][1], 'score': distance, 'metadata': {}}
+                for rowid, distance in hits if rowid in rows]
+
     def _register_rembed_client(self):
+        # No explicit client registration needed for sqlite-rembed usually,
+        # it picks up config from env or compile-time.
+        # This function now serves as a check. It only looks the function up: a test rembed() call would cost a
+        # full (usually remote) embedding round-trip on every start, and the first real call reports its own errors
         try:
-            model_name = config.embedding_model
-            # No explicit client registration needed for sqlite-rembed usually,
-            # it picks up config from env or compile-time.
-            # This function now serves as a check.
-            self.db.execute("SELECT rembed(?, ?)", (model_name, "test")).fetchone()
-            logger.info(f"rembed() SQL function appears to be callable with model: {model_name}.")
-        except sqlite3.OperationalError as e:
-            logger.error(f"rembed() SQL function is not callable: {e}. "
-                           "Ensure sqlite-rembed is correctly set up and the model name is valid.")
+            found = self.db.execute("SELECT 1 FROM pragma_function_list WHERE name = 'rembed'").fetchone()
+        except sqlite3.OperationalError as e: # SQLite built without introspection pragmas
+            logger.debug(f"Could not list SQL functions to check for rembed(): {e}")
+            return
+        if found:
+            logger.info(f"rembed() SQL function is registered; embedding model: {config.embedding_model}.")
+        elif self._embedder is None:
+            logger.error("rembed() SQL function is not registered. "
+                         "Ensure sqlite-rembed is correctly set up, or configure an 'embedder'.")
             # Depending on strictness, you might raise an error here if rembed is critical
-            # raise RuntimeError(f"rembed() function not available: {e}") from e
-
+        else:
+            logger.warning("rembed() SQL function is not registered; embedding through the configured 'embedder' only.")
 
     def _create_tables(self):
         try:
             embedding_dimension = config.embedding_dim 
-            
-            # Create the virtual vector table using sqlite_vec
-            # This table will store embeddings and allow similarity search
-            # Its rowid will be implicitly linked to interactions_meta.id
-            self.db.execute(f"""
-                CREATE VIRTUAL TABLE IF NOT EXISTS interactions_vectors USING vec0(
-                    embedding BLOB({embedding_dimension}) 
-                );
-            """)
-            # Note: sqlite_vec's vec0 virtual table usually has a column for the vector.
-            # The name 'embedding' is conventional. The type BLOB or TEXT depends on rembed output.
-            # sqlite-rembed's C API suggests it deals with text representations for SQL.
-            # If rembed() returns text, TEXT({embedding_dimension}) might be more appropriate.
-            # However, BLOB is often used for raw vector data.
-            # Given the original VectorInteractionStore used TEXT, let's stick to that for consistency for now.
-            # Re-evaluating: sqlite_vec examples often use TEXT for the vector column with rembed.
-            # Let's use TEXT for now, assuming rembed output is text-serializable.
-            self.db.execute(f"""
-                CREATE VIRTUAL TABLE IF NOT EXISTS interactions_vectors_temp USING vec0(
-                    vector TEXT({embedding_dimension}) 
-                );
-            """)
-            self.db.execute("DROP TABLE IF EXISTS interactions_vectors_temp;") # Drop if recreate with different type
-            self.db.execute(f"""
-                CREATE VIRTUAL TABLE IF NOT EXISTS interactions_vectors USING vec0(
-                    embedding TEXT({embedding_dimension}) 
-                );
-            """)
-
-
-            # Create a metadata table
-            # 'id' here will be the integer ID, also used as rowid for interactions_vectors
-            self.db.execute("""
-                CREATE TABLE IF NOT EXISTS interactions_meta (
-                    id INTEGER PRIMARY KEY, 
-                    original_id TEXT UNIQUE, 
-                    content TEXT NOT NULL
-                ) STRICT;
-            """)
+            # user_version records the schema this file was last opened with, so an up-to-date file skips
+            # the vec0 DDL and an older layout is migrated exactly once
+            (schema_version,) = self.db.execute("PRAGMA user_version").fetchone()
+            if schema_version != SCHEMA_VERSION:
+                self._migrate_vectors_table(embedding_dimension)
+
+                # Create a metadata table
+                # 'id' here will be the integer ID, also used as rowid for interactions_vectors
+                self.db.execute("""
+                    CREATE TABLE IF NOT EXISTS interactions_meta (
+                        id INTEGER PRIMARY KEY, 
+                        original_id TEXT UNIQUE, 
+                        content_hash BLOB -- sha256 of the content
+                    ) STRICT;
+                """)
+                self.db.execute("""
+                    CREATE TABLE IF NOT EXISTS interactions_content (
+                        id INTEGER PRIMARY KEY, -- interactions_meta.id
+                        content TEXT NOT NULL
+                    ) STRICT;
+                """)
+                self._migrate_meta_table()
+                self.db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+            if self.quantize_int8:
+                # Same rowids as interactions_vectors, which keeps the float32 vectors for reranking
+                self.db.execute(f"""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS interactions_vectors_i8 USING vec0(
+                        embedding int8[{embedding_dimension}]
+                    );
+                """)
             self.db.commit()
-            logger.info("Tables 'interactions_vectors' (virtual) and 'interactions_meta' checked/created.")
+            logger.info(f"Tables 'interactions_vectors' (virtual) and 'interactions_meta' at schema version {SCHEMA_VERSION}.")
         except sqlite3.Error as e:
             logger.error(f"Error creating tables: {e}")
             raise
 
+    def _migrate_meta_table(self):
+        columns = {row[1] for row in self.db.execute("PRAGMA table_info(interactions_meta)")}
+        if 'content_hash' not in columns:
+            self.db.execute("ALTER TABLE interactions_meta ADD COLUMN content_hash BLOB")
+        if 'content' in columns: # Before schema version 3 the text was stored inline
+            self.db.execute("INSERT OR IGNORE INTO interactions_content(id, content) SELECT id, content FROM interactions_meta")
+            self.db.execute("ALTER TABLE interactions_meta DROP COLUMN content")
+            logger.info("Moved document text from interactions_meta to interactions_content.")
+        self.db.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_meta_hash ON interactions_meta(content_hash)")
+        # Backfill rows written before schema version 2. OR IGNORE leaves an older duplicate's hash NULL
+        # (NULLs never collide in a unique index) rather than failing the upgrade
+        rows = self.db.execute("""
+            SELECT m.id, c.content FROM interactions_meta m JOIN interactions_content c ON c.id = m.id
+            WHERE m.content_hash IS NULL
+        """).fetchall()
+        self.db.executemany("UPDATE OR IGNORE interactions_meta SET content_hash = ? WHERE id = ?",
+                            [(content_hash(content), int_doc_id) for int_doc_id, content in rows])
+        if rows:
+            logger.info(f"Backfilled content_hash for {len(rows)} document(s).")
+
+    def _known_hashes(self, hashes: List[bytes]) -> set:
+        known = set()
+        for start in range(0, len(hashes), _INSERT_META_CHUNK):
+            chunk = hashes[start:start + _INSERT_META_CHUNK]
+            known.update(r[0] for r in self.db.execute(_SQL_KNOWN_HASHES.format(placeholders=",".join("?" * len(chunk))), chunk))
+        return known
+
+    def _migrate_vectors_table(self, embedding_dimension: int):
+        # The virtual vector table uses sqlite_vec. Vectors are packed float32 blobs, which sqlite-vec's
+        # SIMD distance kernels work on directly (a TEXT column is parsed per comparison).
+        # Its rowid is linked to interactions_meta.id
+        create_sql = f"""
+            CREATE VIRTUAL TABLE interactions_vectors USING vec0(
+                embedding float[{embedding_dimension}]
+            );
+        """
+        row = self.db.execute("SELECT sql FROM sqlite_master WHERE name = 'interactions_vectors'").fetchone()
+        if row is None:
+            self.db.execute(create_sql)
+            return
+        declared = row[0].replace(" ", "")
+        if "float[" in declared:
+            if f"float[{embedding_dimension}]" not in declared:
+                logger.error(f"interactions_vectors was created with a different embedding dim than {embedding_dimension}; "
+                             "searches will fail until the store is rebuilt.")
+            return
+        # Files written before schema version 1 declared the column as TEXT/BLOB; vec_f32() accepts both
+        # JSON text and packed blobs, so the rows are copied over rather than re-embedded. The savepoint
+        # keeps the DROP from committing on its own if the copy fails
+        self.db.execute("SAVEPOINT migrate_vectors")
+        try:
+            rows = self.db.execute("SELECT rowid, vec_f32(embedding) FROM interactions_vectors").fetchall()
+            self.db.execute("DROP TABLE interactions_vectors")
+            self.db.execute(create_sql)
+            self.db.executemany("INSERT INTO interactions_vectors(rowid, embedding) VALUES(?, ?)", rows)
+        except sqlite3.Error:
+            self.db.execute("ROLLBACK TO migrate_vectors")
+            self.db.execute("RELEASE migrate_vectors")
+            raise
+        self.db.execute("RELEASE migrate_vectors")
+        logger.info(f"Migrated {len(rows)} vector(s) in interactions_vectors to float[{embedding_dimension}].")
+
     def has_interacted(self, int_doc_id: int) -> bool: # Changed to accept int_doc_id
         """Check if a document/interaction with the given integer ID exists."""
         try:
-            cur = self.db.execute("SELECT 1 FROM interactions_meta WHERE id = ?", (int_doc_id,))
+            cur = self.db.execute(_SQL_HAS, (int_doc_id,))
             return cur.fetchone() is not None
         except sqlite3.Error as e:
             logger.error(f"Error checking for interaction (int_id: {int_doc_id}): {e}")
             return False 
 
+    def _cached_query_vector(self, key: tuple) -> Optional[bytes]:
+        with self._query_vectors_lock:
+            vector = self._query_vectors.get(key)
+            if vector is not None:
+                self._query_vectors.move_to_end(key)
+            return vector
+
+    def _remember_query_vector(self, key: tuple, vector: bytes):
+        with self._query_vectors_lock:
+            self._query_vectors[key] = vector
+            if len(self._query_vectors) > QUERY_CACHE_SIZE:
+                self._query_vectors.popitem(last=False)
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
     async def add_documents(self, documents: List[Dict[str, Any]], embeddings: Optional[List[List[float]]] = None) -> List[str]:
-        logger.info(f"Attempting to add {len(documents)} documents. This is a synchronous operation wrapped in async def.")
-        if embeddings:
-            logger.warning("Pre-computed embeddings were provided but are ignored by LocalVectorStore as it uses internal sqlite-rembed.")
-        
-        added_original_ids = []
-        for doc in documents:
-            original_doc_id_str = doc.get('id')
-            doc_text = doc.get('text')
+        if embeddings is None and self._embedder is not None:
+            with_text = [i for i, doc in enumerate(documents) if doc.get('text')]
+            # Stored text (under any id) is dropped by the insert, so only the first copy of new text is embedded
+            hashes = [content_hash(documents[i]['text']) for i in with_text]
+            known = await self._run(self._known_hashes, hashes)
+            first_by_hash = {}
+            for i, doc_hash in zip(with_text, hashes):
+                if doc_hash not in known:
+                    first_by_hash.setdefault(doc_hash, i)
+            with_text = list(first_by_hash.values())
+            try:
+                vectors = await self._embedder([documents[i]['text'] for i in with_text])
+                embeddings = [None] * len(documents)
+                for i, vector in zip(with_text, vectors):
+                    embeddings[i] = vector
+            except Exception as e:
+                logger.warning(f"Batch embedding failed, falling back to rembed(): {e}")
+        return await self._run(self._add_documents_sync, documents, embeddings)
 
-            if not original_doc_id_str or not doc_text:
-                logger.warning(f"Skipping document with missing original_id or text: {doc}")
-                continue
-            
+    async def search(self, query_text: str, top_k: int = 5, metadata_filter: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        query_vector = None
+        if self._embedder is not None:
             try:
-                # Attempt to use original_doc_id_str as integer if possible,
-                # otherwise let SQLite assign a rowid and store original_id_str separately.
-                # For simplicity and consistency with original VectorInteractionStore (tweet_id as int),
-                # we'll require original_doc_id_str to be an integer string.
-                int_doc_id = int(original_doc_id_str)
-            except ValueError:
-                logger.error(f"Document ID '{original_doc_id_str}' is not an integer string. Skipping add. "
-                               "LocalVectorStore currently requires integer-convertible IDs.")
-                continue
-            
-            if self.has_interacted(int_doc_id):
-                logger.debug(f"Document with int_id {int_doc_id} (original: {original_doc_id_str}) already exists. Skipping add.")
-                continue
-            
+                query_vector = self._cached_query_vector(('embedder', query_text))
+                if query_vector is None:
+                    query_vector = pack_f32((await self._embedder([query_text]))[0])
+                    self._remember_query_vector(('embedder', query_text), query_vector)
+            except Exception as e:
+                logger.warning(f"Query embedding failed, falling back to rembed(): {e}")
+        return await self._run(self._search_sync, query_text, top_k, metadata_filter, query_vector)
+
+    async def search_many(self, queries: List[str], top_k: int = 5) -> List[List[Dict[str, Any]]]:
+        """Runs several searches concurrently; results are in query order."""
+        query_vectors: List[Optional[bytes]] = [None] * len(queries)
+        if self._embedder is not None:
+            try: # One embedding call for the whole batch
+                query_vectors = [pack_f32(vector) for vector in await self._embedder(queries)]
+            except Exception as e:
+                logger.warning(f"Batch query embedding failed, falling back to rembed(): {e}")
+        if self._hnsw is not None or self._fp16 is not None:
+            # In-memory indexes are only touched from the worker thread, and answer without SQLite scans anyway
+            return [await self._run(self._search_sync, query, top_k, None, vector) for query, vector in zip(queries, query_vectors)]
+        if self._ro_pool is None:
+            self._ro_executor = ThreadPoolExecutor(max_workers=self.read_connections, thread_name_prefix="local-vector-store-ro")
+            self._ro_pool = queue.Queue()
+        loop = asyncio.get_running_loop()
+        return list(await asyncio.gather(*(
+            loop.run_in_executor(self._ro_executor, self._search_read_only, query, top_k, vector)
+            for query, vector in zip(queries, query_vectors)
+        )))
+
+    async def get_document_by_id(self, document_id_str: str) -> Optional[Dict[str, Any]]:
+        return await self._run(self._get_document_by_id_sync, document_id_str)
+
+    async def get_documents_by_ids(self, document_ids_str_list: List[str]) -> Dict[str, Dict[str, Any]]:
+        return await self._run(self._get_documents_by_ids_sync, document_ids_str_list)
+
+    async def delete_documents(self, document_ids_str_list: List[str]) -> bool:
+        return await self._run(self._delete_documents_sync, document_ids_str_list)
+
+    def _add_documents_sync(self, documents: List[Dict[str, Any]], embeddings: Optional[List[List[float]]] = None) -> List[str]:
+        logger.info(f"Attempting to add {len(documents)} documents.")
+        if embeddings is not None and len(embeddings) != len(documents):
+            logger.warning(f"Got {len(embeddings)} embeddings for {len(documents)} documents; ignoring them and using rembed().")
+            embeddings = None
+
+        candidates, content_hashes, vector_blobs = prepare_documents(documents, embeddings)
+        if not candidates:
+            logger.info(f"Successfully added 0 out of {len(documents)} documents.")
+            return []
+
+        new_rows = []
+        added_original_ids = []
+        model = config.embedding_model
+        try:
+            with self.db: # One transaction (one commit) for the whole batch
+                # The conflict check is folded into the insert: RETURNING reports which ids were new, and
+                # only those get vectors
+                inserted = set()
+                for start in range(0, len(candidates), _INSERT_META_CHUNK):
+                    chunk = candidates[start:start + _INSERT_META_CHUNK]
+                    inserted.update(r[0] for r in self.db.execute(
+                        _SQL_INSERT_META.format(values=",".join(["(?, ?, ?)"] * len(chunk))),
+                        [value for int_doc_id, original_id, _ in chunk
+                         for value in (int_doc_id, original_id, content_hashes[int_doc_id])],
+                    ))
+                new_rows = [row for row in candidates if row[0] in inserted]
+                if len(new_rows) < len(candidates):
+                    logger.debug(f"Skipping {len(candidates) - len(new_rows)} document(s) whose id or content already exist.")
+                self.db.executemany(_SQL_INSERT_CONTENT, [(int_doc_id, text) for int_doc_id, _, text in new_rows])
+                # Vectors share the meta row's integer id as their rowid. Each statement runs only when it has
+                # rows: preparing _SQL_INSERT_VEC fails outright when rembed() isn't registered (embedder-only stores)
+                blob_rows = [(int_doc_id, vector_blobs[int_doc_id]) for int_doc_id, _, _ in new_rows if int_doc_id in vector_blobs]
+                rembed_rows = [(int_doc_id, model, text) for int_doc_id, _, text in new_rows if int_doc_id not in vector_blobs]
+                if blob_rows:
+                    self.db.executemany(_SQL_INSERT_VEC_BLOB, blob_rows)
+                if rembed_rows:
+                    self.db.executemany(_SQL_INSERT_VEC, rembed_rows)
+                if new_rows and self.quantize_int8:
+                    # Quantized from the stored float32 vectors, so rembed() runs once per document
+                    self.db.execute(
+                        f"""
+                        INSERT INTO interactions_vectors_i8(rowid, embedding)
+                        SELECT rowid, vec_int8(quantize_i8(embedding)) FROM interactions_vectors
+                        WHERE rowid IN ({",".join("?" * len(new_rows))})
+                        """,
+                        [int_doc_id for int_doc_id, _, _ in new_rows],
+                    )
+                if new_rows and self._mirrored: # Write-through, in the same transaction as the on-disk rows
+                    self.db.execute(
+                        f"{_SQL_MIRROR_ALL} WHERE rowid IN ({','.join('?' * len(new_rows))})",
+                        [int_doc_id for int_doc_id, _, _ in new_rows],
+                    )
+            added_original_ids = [original_id for _, original_id, _ in new_rows]
+        except sqlite3.IntegrityError as e:
+            logger.warning(f"Batch insert of {len(candidates)} document(s) hit a constraint (IntegrityError: {e}). Nothing was added.")
+        except Exception as e:
+            logger.error(f"Failed to add batch of {len(candidates)} document(s): {e}")
+        if added_original_ids and self._fp16 is not None:
+            placeholders = ",".join("?" * len(new_rows))
+            self._fp16.add(self.db.execute(f"{_SQL_VECTORS_ALL} WHERE rowid IN ({placeholders})",
+                                           [int_doc_id for int_doc_id, _, _ in new_rows]))
+        if added_original_ids and self._hnsw is not None:
             try:
-                model = config.embedding_model 
-                
-                # Insert into metadata table first to get the rowid (which is int_doc_id here)
-                self.db.execute(
-                    "INSERT INTO interactions_meta(id, original_id, content) VALUES(?, ?, ?)",
-                    (int_doc_id, original_doc_id_str, doc_text),
-                )
-                # Then insert into the vector table using the same rowid
-                self.db.execute(
-                    "INSERT INTO interactions_vectors(rowid, embedding) VALUES(?, rembed(?, ?))",
-                    (int_doc_id, model, doc_text),
-                )
-                self.db.commit()
-                added_original_ids.append(original_doc_id_str)
-                logger.debug(f"Added document original_id: {original_doc_id_str} (as int_id: {int_doc_id})")
-            except sqlite3.IntegrityError:
-                logger.warning(f"Document int_id {int_doc_id} (original: {original_doc_id_str}) likely already exists (IntegrityError). Skipping.")
+                self._hnsw_add([int_doc_id for int_doc_id, _, _ in new_rows])
             except Exception as e:
-                logger.error(f"Failed to add document original_id {original_doc_id_str} (int_id: {int_doc_id}): {e}")
-        
+                logger.error(f"Failed to add {len(new_rows)} vector(s) to the HNSW index: {e}")
+    
         logger.info(f"Successfully added {len(added_original_ids)} out of {len(documents)} documents.")
         return added_original_ids
 
-    async def search(self, query_text: str, top_k: int = 5, metadata_filter: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
-        logger.warning("LocalVectorStore.search expects a text query (query_text), deviating from VectorStore interface (query_embedding). This is a synchronous operation wrapped in async def.")
+    def _search_sync(self, query_text: str, top_k: int = 5, metadata_filter: Optional[Dict[str, Any]] = None,
+                     query_vector: Optional[bytes] = None, conn: Optional[sqlite3.Connection] = None) -> List[Dict[str, Any]]:
+        # conn is a read-only pool connection (search_many), or None for the main connection on the worker thread
+        logger.warning("LocalVectorStore.search expects a text query (query_text), deviating from VectorStore interface (query_embedding).")
         if metadata_filter:
             logger.warning("LocalVectorStore.search does not currently support metadata_filter.")
         
@@ -188,21 +671,29 @@ class LocalVectorStore(VectorStore):
         try:
             model = config.embedding_model 
             
-            # The join is ON v.rowid = m.id, where m.id is now the integer PK.
-            cur = self.db.execute(
-                f"""
-                SELECT m.original_id, m.content, v.distance
-                FROM interactions_vectors v JOIN interactions_meta m ON v.rowid = m.id
-                WHERE v.embedding MATCH rembed(?, ?) 
-                ORDER BY v.distance
-                LIMIT ?
-                """,
-                (model, query_text, top_k),
-            )
+            # Embedded once up front and bound as a blob, so rembed() is never re-evaluated inside the scan
+            if query_vector is None:
+                query_vector = self._cached_query_vector((model, query_text))
+            if query_vector is None:
+                (query_vector,) = (conn or self.db).execute(_SQL_EMBED, (model, query_text)).fetchone()
+                self._remember_query_vector((model, query_text), query_vector)
+            if self._hnsw is not None:
+                results = self._hnsw_search(query_vector, top_k)
+                logger.info(f"Search for '{query_text[:50]}...' returned {len(results)} results (HNSW).")
+                return results
+            if self._fp16 is not None:
+                results = self._hydrate(self._fp16.search(query_vector, top_k))
+                logger.info(f"Search for '{query_text[:50]}...' returned {len(results)} results (fp16).")
+                return results
+            db = conn or self.db
+            if self.quantize_int8:
+                # Candidates from the int8 index, reranked by exact float32 distance
+                sql = self._sql_search_i8_ro if conn else self._sql_search_i8
+                cur = db.execute(sql, (query_vector, top_k * RERANK_FACTOR, query_vector, top_k))
+            else:
+                cur = db.execute(self._sql_search_ro if conn else self._sql_search, (query_vector, top_k))
             
-            for row in cur.fetchall():
-                # row[0] is m.original_id (string), row[1] is m.content, row[2] is v.distance
-                results.append({'id': str(row[0]), 'text': row[1], 'score': row[2], 'metadata': {}})
+            results = self._hydrate(cur.fetchall(), conn)
             logger.info(f"Search for '{query_text[:50]}...' returned {len(results)} results.")
         except sqlite3.OperationalError as e:
              logger.error(f"Search failed for query '{query_text[:50]}...': {e}. This might be due to 'rembed0' or 'sqlite_vec' issues.")
@@ -210,13 +701,11 @@ class LocalVectorStore(VectorStore):
             logger.error(f"Search failed for query '{query_text[:50]}...': {e}")
         return results
         
-    async def get_document_by_id(self, document_id_str: str) -> Optional[Dict[str, Any]]:
-        logger.info(f"Attempting to get document by original_id: {document_id_str}. This is a synchronous operation.")
+    def _get_document_by_id_sync(self, document_id_str: str) -> Optional[Dict[str, Any]]:
+        logger.info(f"Attempting to get document by original_id: {document_id_str}.")
         try:
             # Query by original_id from interactions_meta
-            cur = self.db.execute(
-                "SELECT id, original_id, content FROM interactions_meta WHERE original_id = ?", (document_id_str,)
-            )
+            cur = self.db.execute(_SQL_GET_BY_OID, (document_id_str,))
             row = cur.fetchone()
             if row:
                 # Return original_id as 'id' in the result, consistent with input
@@ -227,41 +716,53 @@ class LocalVectorStore(VectorStore):
             logger.error(f"Failed to get document by original_id {document_id_str}: {e}")
             return None
 
-    async def delete_documents(self, document_ids_str_list: List[str]) -> bool:
-        logger.info(f"Attempting to delete {len(document_ids_str_list)} documents by original_id. This is a synchronous operation.")
-        all_successful = True
+    def _get_documents_by_ids_sync(self, document_ids_str_list: List[str]) -> Dict[str, Dict[str, Any]]:
         try:
-            for original_id_str in document_ids_str_list:
-                try:
-                    # First, get the integer id from interactions_meta using original_id_str
-                    cur_get_id = self.db.execute("SELECT id FROM interactions_meta WHERE original_id = ?", (original_id_str,))
-                    id_row = cur_get_id.fetchone()
-
-                    if not id_row:
-                        logger.warning(f"No document found with original_id {original_id_str} to delete.")
-                        continue # Skip if not found in meta, implies not in vector table either
-
-                    int_doc_id = id_row[0]
-                    
-                    # Delete from interactions_meta using the integer id (PK)
-                    cur_meta = self.db.execute("DELETE FROM interactions_meta WHERE id = ?", (int_doc_id,))
-                    if cur_meta.rowcount == 0: # Should not happen if fetched above, but good check
-                        logger.warning(f"Failed to delete from interactions_meta for int_id {int_doc_id} (original: {original_id_str}).")
-                        all_successful = False
-                        continue # If meta delete fails, maybe don't delete vector? Or proceed? For now, proceed.
-                    
-                    # Delete from interactions_vectors using the integer rowid
-                    cur_vec = self.db.execute("DELETE FROM interactions_vectors WHERE rowid = ?", (int_doc_id,))
-                    if cur_vec.rowcount == 0:
-                        logger.warning(f"No vector found in interactions_vectors for rowid {int_doc_id} (original: {original_id_str}). This might be an inconsistency.")
-                        # This could be okay if meta existed but vector didn't, but implies inconsistency
-                        # all_successful = False # Optional: mark as not fully successful if vector part missing
-                except sqlite3.Error as e:
-                    logger.error(f"Failed to delete document with original_id {original_id_str}: {e}")
-                    all_successful = False
-            self.db.commit()
-            logger.info("Deletion attempt completed.")
-            return all_successful
+            cur = self.db.execute(_SQL_GET_BY_OIDS, (json.dumps(list(dict.fromkeys(document_ids_str_list))),))
+            return {original_id: {'id': original_id, 'text': content, 'metadata': {}} for original_id, content in cur}
+        except Exception as e:
+            logger.error(f"Failed to get {len(document_ids_str_list)} document(s) by original_id: {e}")
+            return {}
+
+    def _delete_documents_sync(self, document_ids_str_list: List[str]) -> bool:
+        logger.info(f"Attempting to delete {len(document_ids_str_list)} documents by original_id.")
+        original_ids = list(dict.fromkeys(document_ids_str_list))
+        if not original_ids:
+            return True
+        placeholders = ",".join("?" * len(original_ids))
+        try:
+            with self.db: # One transaction for the whole batch
+                found = self.db.execute(
+                    f"SELECT id, original_id FROM interactions_meta WHERE original_id IN ({placeholders})", original_ids
+                ).fetchall()
+                missing = set(original_ids).difference(original_id for _, original_id in found)
+                if missing:
+                    logger.warning(f"No document found with original_id(s) {sorted(missing)} to delete.")
+                if not found:
+                    return True
+                rowids = [(int_doc_id,) for int_doc_id, _ in found]
+                # vec0 deletes are point lookups by rowid; executemany reuses the one prepared statement
+                cur_vec = self.db.executemany(_SQL_DEL_VEC, rowids)
+                if cur_vec.rowcount < len(rowids):
+                    # Okay if meta existed but vector didn't, but implies inconsistency
+                    logger.warning(f"Only {cur_vec.rowcount} of {len(rowids)} vectors found in interactions_vectors. This might be an inconsistency.")
+                if self.quantize_int8:
+                    self.db.executemany(_SQL_DEL_VEC_I8, rowids)
+                if self._mirrored:
+                    self.db.executemany(_SQL_DEL_VEC_MEM, rowids)
+                self.db.executemany(_SQL_DEL_CONTENT, rowids)
+                cur_meta = self.db.execute(
+                    f"DELETE FROM interactions_meta WHERE original_id IN ({placeholders})", original_ids
+                )
+            if self._hnsw is not None:
+                self._hnsw_remove([int_doc_id for (int_doc_id,) in rowids])
+            if self._fp16 is not None:
+                self._fp16.remove([int_doc_id for (int_doc_id,) in rowids])
+            logger.info(f"Deletion completed: {cur_meta.rowcount} document(s) removed.")
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"Failed to delete documents with original_ids {original_ids}: {e}")
+            return False
         except Exception as e:
             logger.error(f"General error during batch deletion: {e}")
             return False
@@ -269,7 +770,13 @@ class LocalVectorStore(VectorStore):
     def close(self):
         """Close the database connection."""
         if hasattr(self, 'db') and self.db:
-            self.db.close()
+            # On the worker thread, after any queued operations
+            self._executor.submit(self.db.close).result()
+            self._executor.shutdown()
+            if self._ro_pool is not None:
+                while not self._ro_pool.empty():
+                    self._ro_pool.get_nowait().close()
+                self._ro_executor.shutdown()
             logger.info("Database connection closed.")
 
 # Example usage for direct testing (not run during normal agent operation)
@@ -300,7 +807,7 @@ if __name__ == '__main__':
     vector_store = None # Initialize to None
 
     async def main_test_local_store(): # Renamed test function
-        nonlocal vector_store # Allow assignment to outer scope variable
+        global vector_store # Module-level under __main__, so the finally block below can close it
         vector_store = LocalVectorStore(store_config_dict)
         logger.info("--- Testing LocalVectorStore ---")
 
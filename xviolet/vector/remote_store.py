@@ -1,4 +1,7 @@
 # xviolet/vector/remote_store.py
+import asyncio
+import inspect
+from itertools import islice
 from typing import List, Dict, Any, Optional
 from .base import VectorStore
 import logging
@@ -9,7 +12,11 @@ class RemoteVectorStore(VectorStore):
     def __init__(self, config: Dict[str, Any]):
         super().__init__(config)
         self.config = config
-        self.client = None # Placeholder for remote client
+        # Optional pre-built SDK client exposing upsert(vectors=[...]) (Pinecone-style, sync or async). Created once
+        # and reused for every call, so its HTTP connection pool stays warm
+        self.client = config.get('client')
+        self.batch_size = max(1, int(config.get('batch_size', 100))) # Pinecone accepts up to 100 vectors per upsert
+        self.upsert_concurrency = max(1, int(config.get('upsert_concurrency', 4)))
         logger.info(f"Initializing RemoteVectorStore with config: {config}")
         # Example: Initialize client for a remote service like Pinecone, Weaviate, etc.
         # self.api_key = config.get('api_key')
@@ -25,10 +32,39 @@ class RemoteVectorStore(VectorStore):
     #     return None # Replace with actual client
 
     async def add_documents(self, documents: List[Dict[str, Any]], embeddings: Optional[List[List[float]]] = None) -> List[str]:
-        logger.warning("RemoteVectorStore.add_documents is not yet implemented.")
-        # Placeholder: Implement document addition to remote store
-        # This would involve generating embeddings if not provided, then upserting.
-        return [doc.get('id', '') for doc in documents if doc.get('id')]
+        if self.client is None:
+            logger.warning("RemoteVectorStore.add_documents is not yet implemented.")
+            # Placeholder: Implement document addition to remote store
+            # This would involve generating embeddings if not provided, then upserting.
+            return [doc.get('id', '') for doc in documents if doc.get('id')]
+        if embeddings is None or len(embeddings) != len(documents):
+            logger.error("RemoteVectorStore.add_documents needs one precomputed embedding per document.")
+            return []
+
+        records = (
+            {'id': str(doc['id']), 'values': list(vector), 'metadata': {'text': doc.get('text', '')}}
+            for doc, vector in zip(documents, embeddings) if doc.get('id') and vector is not None
+        )
+        batches = list(iter(lambda: list(islice(records, self.batch_size)), []))
+        semaphore = asyncio.Semaphore(self.upsert_concurrency)
+
+        async def upsert(batch: List[Dict[str, Any]]) -> List[str]:
+            async with semaphore:
+                try:
+                    if inspect.iscoroutinefunction(self.client.upsert):
+                        await self.client.upsert(vectors=batch)
+                    else:
+                        await asyncio.to_thread(self.client.upsert, vectors=batch)
+                    return [record['id'] for record in batch]
+                except Exception as e:
+                    logger.error(f"RemoteVectorStore upsert of {len(batch)} vector(s) failed: {e}")
+                    return []
+
+        # One request per batch_size documents, with up to upsert_concurrency requests in flight
+        results = await asyncio.gather(*(upsert(batch) for batch in batches))
+        added_ids = [doc_id for ids in results for doc_id in ids]
+        logger.info(f"RemoteVectorStore upserted {len(added_ids)} of {len(documents)} document(s) in {len(batches)} batch(es).")
+        return added_ids
 
     async def search(self, query_embedding: List[float], top_k: int = 5, metadata_filter: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
         logger.warning("RemoteVectorStore.search is not yet implemented.")